@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+# Largest batch the backbone runs in one forward pass.
+BACKBONE_MAX_BATCH_SIZE = int(os.getenv('BACKBONE_MAX_BATCH_SIZE', 16))
+# How long the first request in a batch may wait for company (milliseconds).
+BACKBONE_MAX_WAIT_MS = float(os.getenv('BACKBONE_MAX_WAIT_MS', 5.0))
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=BACKBONE_MAX_BATCH_SIZE, max_wait_ms=BACKBONE_MAX_WAIT_MS, name='micro-batcher'):
+        """
+        Gather single items submitted by concurrent request threads into batches.
+
+        A batch is dispatched once it holds `max_batch_size` items or the oldest item has
+        waited `max_wait_ms`, whichever comes first. `batch_fn(items)` must return one
+        result per item, in order; each result is handed back to the thread that submitted it.
+
+        With max_batch_size=1 (or max_wait_ms<=0) items are run inline on the caller's thread.
+
+        Parameters:
+            batch_fn (callable): list of items -> list of results.
+            max_batch_size (int): Upper bound on items per batch.
+            max_wait_ms (float): Upper bound on queueing delay added to a request.
+            name (str): Name of the dispatcher thread.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def inline(self):
+        return self.max_batch_size == 1 or self.max_wait <= 0
+
+    def _ensure_thread(self):
+        # Threads don't survive fork(), so a forked worker starts its own dispatcher.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result."""
+        future = Future()
+        if self.inline:
+            try:
+                future.set_result(self.batch_fn([item])[0])
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_thread()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one item and block until its result is ready."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop requests whose caller already gave up.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'queued': self._queue.qsize(),
+        }
+
+
+def make_backbone_batcher(backbone_model, **kwargs):
+    """
+    MicroBatcher around `ResNet.extract_features`.
+
+    Items are preprocessed (1, 3, 224, 224) face tensors; each result is the ReLU'd
+    (1, 512) feature row as a numpy array, same as the unbatched route produced.
+    """
+    def extract_batch(faces):
+        with torch.no_grad():
+            features = torch.nn.functional.relu(backbone_model.extract_features(torch.cat(faces)))
+        features = features.detach().cpu().numpy()
+        return [features[i:i + 1] for i in range(len(faces))]
+
+    kwargs.setdefault('name', 'backbone-batcher')
+    return MicroBatcher(extract_batch, **kwargs)
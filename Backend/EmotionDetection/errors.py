@@ -0,0 +1,6 @@
+class PipelineError(Exception):
+    def __init__(self, message, status=400):
+        """A frame the pipeline can't classify; `status` is the HTTP code the route answers with."""
+        super().__init__(message)
+        self.message = message
+        self.status = status
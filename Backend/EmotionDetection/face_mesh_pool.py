@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import mediapipe as mp
+
+mp_face_mesh = mp.solutions.face_mesh
+
+# One FaceMesh graph per request thread that can be inside the detector at once.
+DEFAULT_POOL_SIZE = int(os.getenv('FACE_MESH_POOL_SIZE', os.cpu_count() or 4))
+# How long a request waits for a free FaceMesh before giving up (seconds).
+DEFAULT_CHECKOUT_TIMEOUT = float(os.getenv('FACE_MESH_CHECKOUT_TIMEOUT', 5.0))
+
+FACE_MESH_SETTINGS = {
+    # Instances are shared between students, so never carry tracking state
+    # from one request's frame over to another request.
+    'static_image_mode': True,
+    'max_num_faces': 1,
+    'refine_landmarks': False,
+    'min_detection_confidence': 0.5,
+    'min_tracking_confidence': 0.5,
+}
+
+
+class FaceMeshPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT, **face_mesh_kwargs):
+        """
+        Pool of long-lived MediaPipe FaceMesh graphs that request threads check out per frame.
+
+        Graphs are built lazily, so a process that never sees a webcam frame never pays for one.
+
+        Parameters:
+            size (int): Maximum number of FaceMesh graphs alive at once (one per concurrent worker thread).
+            checkout_timeout (float): Seconds to wait for a free graph before raising queue.Empty.
+            face_mesh_kwargs: Overrides for FACE_MESH_SETTINGS.
+        """
+        if size < 1:
+            raise ValueError("FaceMesh pool size must be at least 1")
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.face_mesh_kwargs = {**FACE_MESH_SETTINGS, **face_mesh_kwargs}
+        self._idle = queue.LifoQueue()  # LIFO keeps the most recently used (warm) graph busy
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @property
+    def created(self):
+        """Number of FaceMesh graphs currently owned by the pool."""
+        return self._created
+
+    def _ensure_process(self):
+        # A graph's worker threads don't survive fork(), so a forked process starts with
+        # an empty pool instead of inheriting its parent's graphs
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._created = 0
+                    self._pid = os.getpid()
+
+    def _acquire(self, timeout):
+        self._ensure_process()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return mp_face_mesh.FaceMesh(**self.face_mesh_kwargs)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def _discard(self, face_mesh):
+        with self._lock:
+            self._created -= 1
+        try:
+            face_mesh.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Borrow a FaceMesh for the duration of a `with` block.
+
+        A graph that raised while in use is closed instead of returned, so a broken
+        graph never serves the next request.
+
+        Raises:
+            queue.Empty: If no graph became free within the timeout.
+        """
+        face_mesh = self._acquire(self.checkout_timeout if timeout is None else timeout)
+        try:
+            yield face_mesh
+        except BaseException:
+            self._discard(face_mesh)
+            raise
+        else:
+            self._idle.put(face_mesh)
+
+    def warm_up(self, count=None):
+        """Build up to `count` graphs ahead of traffic (defaults to the full pool)."""
+        count = self.size if count is None else min(count, self.size)
+        graphs = []
+        try:
+            while len(graphs) < count:
+                graphs.append(self._acquire(timeout=0))
+        except queue.Empty:
+            pass  # the rest are already checked out by live requests
+        finally:
+            for face_mesh in graphs:
+                self._idle.put(face_mesh)
+        return self._created
+
+    def close(self):
+        """Close every idle graph. Graphs still checked out are closed when discarded."""
+        while True:
+            try:
+                face_mesh = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(face_mesh)
+
+
+face_mesh_pool = FaceMeshPool()
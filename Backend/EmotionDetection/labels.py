@@ -0,0 +1,3 @@
+# Output classes of the Aff-Wild2 LSTM, by index. Kept free of heavy imports so
+# routes that only need the names don't load torch.
+DICT_EMO = {0: 'Neutral', 1: 'Happiness', 2: 'Sadness', 3: 'Surprise', 4: 'Fear', 5: 'Disgust', 6: 'Anger'}
@@ -1,15 +1,15 @@
 import os
-import numpy as np
-import cv2
-import mediapipe as mp
+import threading
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from PIL import Image
-from torchvision import transforms
 import math  # Import the math module
 
+from EmotionDetection.optimize import INFERENCE_MODE, prepare_backbone, prepare_lstm
+
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+# Intra-op threads per process; unset, the CPUs are divided between the serving processes
+TORCH_THREADS = os.getenv('EMOTION_TORCH_THREADS')
 
 class Bottleneck(nn.Module):
     expansion = 4
@@ -41,12 +41,22 @@ class Conv2dSame(torch.nn.Conv2d):
     def calc_same_pad(self, i: int, k: int, s: int, d: int) -> int:
         return max((math.ceil(i / s) - 1) * s + (k - 1) * d + 1 - i, 0)
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        ih, iw = x.size()[-2:]
+    def same_pad(self, ih: int, iw: int) -> list:
+        # Every frame is 224x224, so remember the padding for the last input size
+        cached = getattr(self, '_same_pad_cache', None)
+        if cached is not None and cached[0] == (ih, iw):
+            return cached[1]
         pad_h = self.calc_same_pad(i=ih, k=self.kernel_size[0], s=self.stride[0], d=self.dilation[0])
         pad_w = self.calc_same_pad(i=iw, k=self.kernel_size[1], s=self.stride[1], d=self.dilation[1])
-        if pad_h > 0 or pad_w > 0:
-            x = F.pad(x, [pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2])
+        pad = [pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2]
+        self._same_pad_cache = ((ih, iw), pad)
+        return pad
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        ih, iw = x.size()[-2:]
+        pad = self.same_pad(ih, iw)
+        if any(pad):
+            x = F.pad(x, pad)
         return F.conv2d(x, self.weight, self.bias, self.stride, self.padding, self.dilation, self.groups)
 
 class ResNet(nn.Module):
@@ -115,11 +125,78 @@ class LSTMPyTorch(nn.Module):
         x = self.fc(x[:, -1, :])
         x = self.softmax(x)
         return x
-# Update the model loading code
-pth_backbone_model = ResNet50(7, channels=3)
-pth_backbone_model.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'FER_static_ResNet50_AffectNet.pt')))
-pth_backbone_model.eval()
-
-pth_LSTM_model = LSTMPyTorch()
-pth_LSTM_model.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'FER_dinamic_LSTM_Aff-Wild2.pt')))
-pth_LSTM_model.eval()
\ No newline at end of file
+
+    def step(self, x, state=None):
+        """
+        Advance the LSTM by a single frame, carrying (h, c) between calls.
+
+        Parameters:
+            x (Tensor): Backbone features for one frame, shape (batch, 512).
+            state (tuple): ((h1, c1), (h2, c2)) returned by the previous step, or None to start fresh.
+
+        Returns:
+            (Tensor, tuple): Class probabilities (batch, 7) and the state to pass to the next step.
+        """
+        state1, state2 = state if state is not None else (None, None)
+        x, state1 = self.lstm1(x.unsqueeze(1), state1)
+        x, state2 = self.lstm2(x, state2)
+        x = self.fc(x[:, -1, :])
+        x = self.softmax(x)
+        return x, (state1, state2)
+# Checkpoints are loaded on first use, not at import, so auth-only processes and
+# tests never pay for them. Call load_models() (or EmotionPipeline.warm_up) to load eagerly.
+_models = None
+_models_lock = threading.Lock()
+
+def load_models():
+    """
+    Load both checkpoints once per process, thread-safely, prepared for EMOTION_INFERENCE_MODE.
+
+    Returns:
+        (backbone, lstm): The ResNet50 backbone and the Aff-Wild2 LSTM, in eval mode.
+    """
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                backbone = ResNet50(7, channels=3)
+                backbone.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'FER_static_ResNet50_AffectNet.pt')))
+                backbone.eval()
+
+                lstm = LSTMPyTorch()
+                lstm.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'FER_dinamic_LSTM_Aff-Wild2.pt')))
+                lstm.eval()
+
+                # Swap in the optimized variants selected by EMOTION_INFERENCE_MODE (default: eager fp32)
+                _models = (prepare_backbone(backbone, INFERENCE_MODE), prepare_lstm(lstm, INFERENCE_MODE))
+    return _models
+
+def models_loaded():
+    return _models is not None
+
+def available_cpus():
+    """CPUs this process may run on (its affinity mask, e.g. a container's cpuset), not the machine's."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def configure_threads(processes=1):
+    """
+    Size torch's intra-op pool for one of `processes` serving processes: EMOTION_TORCH_THREADS
+    if set, else an equal share of the available CPUs. By default every process would start
+    one thread per CPU, and N workers would oversubscribe the machine N times.
+
+    Returns:
+        int: The thread count set.
+    """
+    threads = int(TORCH_THREADS) if TORCH_THREADS else max(1, available_cpus() // max(1, processes))
+    torch.set_num_threads(threads)
+    return threads
+
+def __getattr__(name):
+    # `from EmotionDetection.model import pth_backbone_model` keeps working, loading on first access
+    if name == 'pth_backbone_model':
+        return load_models()[0]
+    if name == 'pth_LSTM_model':
+        return load_models()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,175 @@
+import copy
+import os
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+# 'eager':     the fp32 modules as loaded
+# 'script':    conv-BN folded, same-padding frozen, backbone traced and frozen with TorchScript
+# 'quantized': int8 dynamic quantization of the LSTMs and Linear layers
+# 'static':    'quantized' plus int8 static (FX) quantization of the backbone convolutions
+INFERENCE_MODE = os.getenv('EMOTION_INFERENCE_MODE', 'eager')
+INFERENCE_MODES = ('eager', 'script', 'quantized', 'static')
+INPUT_SHAPE = (1, 3, 224, 224)
+BGR_MEAN = torch.tensor([91.4953, 103.8827, 131.0912]).view(1, 3, 1, 1)
+
+
+class StaticPadConv2d(nn.Module):
+    """A Conv2dSame whose padding was computed once for a fixed input size."""
+    def __init__(self, conv, pad):
+        super().__init__()
+        self.pad = nn.ZeroPad2d(pad)
+        self.conv = nn.Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride,
+                              padding=0, dilation=conv.dilation, groups=conv.groups, bias=conv.bias is not None)
+        self.conv.load_state_dict(conv.state_dict())
+        self.train(conv.training)
+
+    def forward(self, x):
+        return self.conv(self.pad(x))
+
+
+class _FeatureExtractor(nn.Module):
+    """Exposes ResNet.extract_features as forward(), which FX tracing requires."""
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, x):
+        return self.backbone.extract_features(x)
+
+
+def freeze_same_padding(backbone, input_size=INPUT_SHAPE[-2:]):
+    """
+    Replace the Conv2dSame stem with fixed ZeroPad2d + Conv2d for `input_size` frames,
+    and turn padding='same' on the stride-1 block convolutions into explicit numbers
+    (quantized convolutions only accept numeric padding).
+    """
+    for module in backbone.modules():
+        if isinstance(module, nn.Conv2d) and module.padding == 'same' and all(k % 2 for k in module.kernel_size):
+            module.padding = tuple(d * (k - 1) // 2 for k, d in zip(module.kernel_size, module.dilation))
+    conv = backbone.conv_layer_s2_same
+    if isinstance(conv, StaticPadConv2d):
+        return backbone
+    ih, iw = input_size
+    pad_h = conv.calc_same_pad(i=ih, k=conv.kernel_size[0], s=conv.stride[0], d=conv.dilation[0])
+    pad_w = conv.calc_same_pad(i=iw, k=conv.kernel_size[1], s=conv.stride[1], d=conv.dilation[1])
+    backbone.conv_layer_s2_same = StaticPadConv2d(conv, (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2))
+    return backbone
+
+
+def _fold(module, conv_name, bn_name):
+    conv, bn = getattr(module, conv_name), getattr(module, bn_name)
+    if isinstance(bn, nn.Identity):
+        return
+    target = conv.conv if isinstance(conv, StaticPadConv2d) else conv
+    fused = fuse_conv_bn_eval(target, bn)
+    if isinstance(conv, StaticPadConv2d):
+        conv.conv = fused
+    else:
+        setattr(module, conv_name, fused)
+    setattr(module, bn_name, nn.Identity())
+
+
+def fold_batch_norms(backbone):
+    """Fold every eval-mode BatchNorm2d of the ResNet into the convolution before it."""
+    _fold(backbone, 'conv_layer_s2_same', 'batch_norm1')
+    for layer in (backbone.layer1, backbone.layer2, backbone.layer3, backbone.layer4):
+        for block in layer:
+            for i in (1, 2, 3):
+                _fold(block, f'conv{i}', f'batch_norm{i}')
+            if block.i_downsample is not None:
+                _fold(block.i_downsample, '0', '1')
+    return backbone
+
+
+def _bottleneck_forward(block, x):
+    # Same as Bottleneck.forward without the clone and in-place add, which FX can't quantize.
+    identity = x
+    x = block.relu(block.batch_norm1(block.conv1(x)))
+    x = block.relu(block.batch_norm2(block.conv2(x)))
+    x = block.batch_norm3(block.conv3(x))
+    if block.i_downsample is not None:
+        identity = block.i_downsample(identity)
+    return block.relu(x + identity)
+
+
+def _prepare_blocks_for_fx(backbone):
+    for layer in (backbone.layer1, backbone.layer2, backbone.layer3, backbone.layer4):
+        for block in layer:
+            block.forward = _bottleneck_forward.__get__(block)
+
+
+def random_calibration_batches(count=8, batch_size=4, seed=0):
+    """Uniform random pixels pushed through the backbone's mean subtraction."""
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.randint(0, 256, (batch_size, 3, 224, 224), generator=generator).float() - BGR_MEAN
+            for _ in range(count)]
+
+
+def quantize_backbone_static(backbone, calibration_batches=None):
+    """
+    Int8 static quantization of the backbone convolutions with FX graph mode.
+
+    Returns a module whose forward() is extract_features. Activation ranges are
+    calibrated on `calibration_batches` (preprocessed face tensors); without real
+    faces the ranges come from random pixels, which costs some accuracy.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    backbone = freeze_same_padding(copy.deepcopy(backbone).eval())
+    _prepare_blocks_for_fx(backbone)
+    engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    example = torch.zeros(INPUT_SHAPE)
+    prepared = prepare_fx(_FeatureExtractor(backbone), get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches or random_calibration_batches():
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+class _ForwardAsExtractFeatures(nn.Module):
+    """Gives a forward()-only module the extract_features() method the route calls."""
+    def __init__(self, module):
+        super().__init__()
+        self.module = module
+
+    def forward(self, x):
+        return self.module(x)
+
+    def extract_features(self, x):
+        return self.module(x)
+
+
+def prepare_backbone(backbone, mode=INFERENCE_MODE, calibration_batches=None):
+    """Return a copy of the ResNet backbone optimized for `mode` (see INFERENCE_MODES)."""
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode: {mode}")
+    if mode == 'eager':
+        return backbone
+    if mode == 'static':
+        return _ForwardAsExtractFeatures(quantize_backbone_static(backbone, calibration_batches))
+
+    backbone = fold_batch_norms(freeze_same_padding(copy.deepcopy(backbone).eval()))
+    if mode == 'quantized':
+        return torch.ao.quantization.quantize_dynamic(backbone, {nn.Linear}, dtype=torch.qint8)
+
+    with torch.no_grad():
+        traced = torch.jit.trace_module(backbone, {'extract_features': torch.zeros(INPUT_SHAPE)})
+    traced = torch.jit.freeze(traced.eval(), preserved_attrs=['extract_features'])
+    return traced
+
+
+def prepare_lstm(lstm_model, mode=INFERENCE_MODE):
+    """
+    Return the LSTM optimized for `mode`. The LSTM stays eager under 'script' because
+    the incremental step() carries an optional state tracing can't express, and its
+    cost is small next to the backbone's.
+    """
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode: {mode}")
+    if mode in ('quantized', 'static'):
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(lstm_model), {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    return lstm_model
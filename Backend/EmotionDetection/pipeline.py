@@ -0,0 +1,163 @@
+import logging
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from EmotionDetection.batching import make_backbone_batcher
+from EmotionDetection.errors import PipelineError
+from EmotionDetection.face_mesh_pool import face_mesh_pool
+from EmotionDetection.labels import DICT_EMO
+from EmotionDetection.model import load_models
+from EmotionDetection.temporal import temporal_sessions, classify_frame
+from EmotionDetection.tracking import FaceTracker, FACE_TRACKING
+from EmotionDetection.utlis import face_preprocessor, get_box
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+class EmotionPipeline:
+    def __init__(self, face_meshes=face_mesh_pool, sessions=temporal_sessions, preprocessor=face_preprocessor,
+                 tracker=None):
+        """
+        The /facedetection inference path: decode -> FaceMesh -> get_box -> crop ->
+        preprocessing -> ResNet50 (micro-batched) -> per-session LSTM.
+
+        With a FaceTracker (EMOTION_FACE_TRACKING=on), FaceMesh only runs every few frames
+        of a session and the previous box is reused in between.
+
+        Models are loaded on first use or by warm_up(), never at import.
+        """
+        self.face_meshes = face_meshes
+        self.sessions = sessions
+        self.preprocessor = preprocessor
+        self.tracker = tracker
+        self._backbone_batcher = None
+        self._lock = threading.Lock()
+        self.ready = False
+
+    @property
+    def backbone_batcher(self):
+        if self._backbone_batcher is None:
+            with self._lock:
+                if self._backbone_batcher is None:
+                    backbone, _ = load_models()
+                    self._backbone_batcher = make_backbone_batcher(backbone)
+        return self._backbone_batcher
+
+    def decode(self, data):
+        """Encoded image bytes -> BGR ndarray."""
+        with stage_timer('pipeline.decode'):
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise PipelineError("Invalid image format", 400)
+        return img
+
+    def detect_face(self, img_rgb):
+        """Bounding box (startX, startY, endX, endY) of the first face, or None."""
+        try:
+            with stage_timer('pipeline.face_mesh'), self.face_meshes.checkout() as face_mesh:
+                results = face_mesh.process(img_rgb)
+        except queue.Empty:
+            raise PipelineError("Face detection is busy, please retry", 503)
+        if not results.multi_face_landmarks:
+            return None
+
+        h, w = img_rgb.shape[:2]
+        with stage_timer('pipeline.get_box'):
+            startX, startY, endX, endY = get_box(results.multi_face_landmarks[0], w, h)
+        # Ensure box coordinates are valid
+        startY, endY = max(0, startY), min(h, endY)
+        startX, endX = max(0, startX), min(w, endX)
+        if startY >= endY or startX >= endX:
+            raise PipelineError("Face detected but bounding box invalid", 400)
+        return startX, startY, endX, endY
+
+    def locate_face(self, img_rgb, session_id):
+        """detect_face(), or the session's tracked box when the tracker can vouch for it."""
+        if self.tracker is None:
+            return self.detect_face(img_rgb)
+        session = self.sessions.get(session_id)
+        with stage_timer('pipeline.face_tracking'):
+            box = self.tracker.track(session, img_rgb)
+        if box is not None:
+            return box
+        start = time.perf_counter()
+        box = self.detect_face(img_rgb)
+        self.tracker.start(session, img_rgb, box, time.perf_counter() - start)
+        return box
+
+    def tracking_stats(self):
+        return self.tracker.stats() if self.tracker is not None else {'enabled': False}
+
+    def classify_face(self, face_rgb, session_id):
+        """
+        Run the emotion models on an RGB face crop for a session.
+
+        Returns:
+            (str, float): Emotion label and its probability.
+        """
+        _, lstm_model = load_models()
+        with stage_timer('pipeline.preprocess'):
+            face = self.preprocessor(face_rgb)
+        # Includes the wait for the micro-batch to fill
+        with stage_timer('pipeline.backbone'):
+            features = self.backbone_batcher(face)
+        if features is None or features.size == 0:
+            raise PipelineError("Could not extract features", 500)
+        with stage_timer('pipeline.lstm'):
+            output = classify_frame(self.sessions.get(session_id), features, lstm_model).detach().cpu().numpy()
+        cl = int(np.argmax(output))
+        return DICT_EMO.get(cl, "Unknown"), float(output[0][cl])
+
+    def process_frame(self, data, session_id):
+        """
+        Classify one encoded webcam frame.
+
+        Returns:
+            dict: {"emotion", "confidence", "box"}, or None when no face is found.
+
+        Raises:
+            PipelineError: For undecodable images, bad crops and model failures.
+        """
+        img = self.decode(data)
+        with stage_timer('pipeline.color_convert'):
+            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        box = self.locate_face(img_rgb, session_id)
+        if box is None:
+            return None
+        startX, startY, endX, endY = box
+        with stage_timer('pipeline.crop'):
+            cur_face = img_rgb[startY:endY, startX:endX]
+        if cur_face.size == 0:
+            raise PipelineError("Face detected but crop failed", 400)
+        try:
+            label, confidence = self.classify_face(cur_face, session_id)
+        except PipelineError:
+            raise
+        except Exception as model_err:
+            logger.exception("Error during emotion model prediction:")
+            raise PipelineError(f"Emotion prediction error: {model_err}", 500)
+        return {
+            "emotion": label,
+            "confidence": confidence,
+            "box": [int(startX), int(startY), int(endX), int(endY)]
+        }
+
+    def warm_up(self):
+        """
+        Load the models, build the FaceMesh graphs and push one dummy face through
+        the backbone and LSTM so the first real request doesn't pay for any of it.
+        """
+        self.face_meshes.warm_up()
+        dummy = np.zeros((224, 224, 3), dtype=np.uint8)
+        self.classify_face(dummy, session_id='__warm_up__')
+        self.sessions.drop('__warm_up__')
+        self.ready = True
+        logger.info("Emotion pipeline warmed up")
+
+
+emotion_pipeline = EmotionPipeline(tracker=FaceTracker() if FACE_TRACKING else None)
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+
+FEATURE_SIZE = 512
+# The Aff-Wild2 LSTM was trained on 10-frame windows of backbone features.
+SEQUENCE_LENGTH = int(os.getenv('EMOTION_SEQUENCE_LENGTH', 10))
+# 'window': re-run the LSTM over the last SEQUENCE_LENGTH frames of the session.
+# 'incremental': one LSTM step per frame, carrying (h, c) for lstm1/lstm2.
+TEMPORAL_MODE = os.getenv('EMOTION_TEMPORAL_MODE', 'window')
+TEMPORAL_MODES = ('window', 'incremental')
+MAX_SESSIONS = int(os.getenv('EMOTION_MAX_SESSIONS', 1024))
+SESSION_TTL = float(os.getenv('EMOTION_SESSION_TTL', 15 * 60))
+
+
+class FeatureRingBuffer:
+    def __init__(self, capacity=SEQUENCE_LENGTH, feature_size=FEATURE_SIZE):
+        """
+        Fixed-size ring of the last `capacity` backbone feature vectors.
+
+        All storage is allocated once; pushing a frame is a single row copy.
+        """
+        self.capacity = capacity
+        self.feature_size = feature_size
+        self._storage = torch.zeros((capacity, feature_size), dtype=torch.float32)
+        self._window = torch.zeros((1, capacity, feature_size), dtype=torch.float32)
+        self._next = 0
+        self.count = 0
+
+    def push(self, features):
+        """Store one frame of features (any shape with `feature_size` elements, Tensor or ndarray)."""
+        self._storage[self._next].copy_(torch.as_tensor(features).reshape(-1))
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        """The most recently pushed frame as a (1, feature_size) view."""
+        return self._storage[(self._next - 1) % self.capacity].unsqueeze(0)
+
+    def window(self):
+        """
+        Return the buffered frames oldest to newest as a (1, capacity, feature_size) tensor.
+
+        Until the ring is full the oldest frame is repeated to pad the front, which for a
+        single frame reproduces the old `[features] * 10` input. The returned tensor is
+        reused by the next call, so consume it before pushing again.
+        """
+        if self.count == 0:
+            raise ValueError("No features buffered yet")
+        out = self._window[0]
+        oldest = (self._next - self.count) % self.capacity
+        pad = self.capacity - self.count
+        if pad:
+            out[:pad] = self._storage[oldest]
+        # Copy the live frames in chronological order, unwrapping the ring in two slices.
+        first = min(self.count, self.capacity - oldest)
+        out[pad:pad + first] = self._storage[oldest:oldest + first]
+        out[pad + first:] = self._storage[:self.count - first]
+        return self._window
+
+    def clear(self):
+        self._next = 0
+        self.count = 0
+
+
+class TemporalSession:
+    def __init__(self, capacity=SEQUENCE_LENGTH, feature_size=FEATURE_SIZE):
+        self.buffer = FeatureRingBuffer(capacity, feature_size)
+        self.lstm_state = None  # ((h1, c1), (h2, c2)) for incremental mode
+        self.face_track = None  # tracking.FaceTrack between FaceMesh runs
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        self.buffer.clear()
+        self.lstm_state = None
+        self.face_track = None
+
+
+class TemporalSessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, capacity=SEQUENCE_LENGTH):
+        """
+        Per-session temporal state, evicting the least recently seen session when full
+        and any session idle for longer than `ttl` seconds.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.capacity = capacity
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_seen > self.ttl:
+                # Stale context from a previous sitting would only blur the new one.
+                session = None
+            if session is None:
+                session = TemporalSession(self.capacity)
+                self._sessions[session_id] = session
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def classify_frame(session, features, lstm_model, mode=TEMPORAL_MODE):
+    """
+    Push one frame of backbone features into the session and run the LSTM.
+
+    Parameters:
+        session (TemporalSession): The student's temporal state.
+        features (Tensor | ndarray): Backbone features for the frame, 512 values.
+        lstm_model (LSTMPyTorch): The Aff-Wild2 LSTM.
+        mode (str): 'window' or 'incremental' (see TEMPORAL_MODE).
+
+    Returns:
+        Tensor: Class probabilities, shape (1, 7).
+    """
+    if mode not in TEMPORAL_MODES:
+        raise ValueError(f"Unknown temporal mode: {mode}")
+    with session.lock, torch.no_grad():
+        session.buffer.push(features)
+        if mode == 'incremental':
+            output, session.lstm_state = lstm_model.step(session.buffer.latest(), session.lstm_state)
+        else:
+            output = lstm_model(session.buffer.window())
+        return output
+
+
+temporal_sessions = TemporalSessionStore()
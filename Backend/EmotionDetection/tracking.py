@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# 'on': reuse the previous face box between FaceMesh runs; 'off': FaceMesh on every frame.
+FACE_TRACKING = os.getenv('EMOTION_FACE_TRACKING', 'off').lower() in ['on', 'true', '1', 't']
+# Run full FaceMesh detection at least every this many frames of a session.
+REDETECT_EVERY = int(os.getenv('EMOTION_REDETECT_EVERY', 5))
+# Template-match score (normalised cross-correlation) below which the face counts as lost.
+MIN_TRACK_SCORE = float(os.getenv('EMOTION_MIN_TRACK_SCORE', 0.7))
+# How far around the previous box to search, as a fraction of the box size.
+SEARCH_MARGIN = 0.25
+# The face template is matched at this width, whatever the face's size in the frame.
+TEMPLATE_WIDTH = 32
+
+
+class FaceTrack:
+    __slots__ = ('box', 'template', 'scale', 'frames_since_detection')
+
+    def __init__(self, box, template, scale):
+        self.box = box
+        self.template = template
+        self.scale = scale
+        self.frames_since_detection = 0
+
+
+class FaceTracker:
+    def __init__(self, redetect_every=REDETECT_EVERY, min_score=MIN_TRACK_SCORE,
+                 search_margin=SEARCH_MARGIN, template_width=TEMPLATE_WIDTH):
+        """
+        Keeps a session's face box between FaceMesh runs. After a detection the face crop is
+        stored as a small grayscale template; on the next frames the template is matched in a
+        window around the old box, and the box is shifted to follow small head movements.
+        FaceMesh runs again every `redetect_every` frames, or as soon as the match score drops
+        below `min_score` (face turned away, occluded, or left the window).
+
+        The per-session FaceTrack lives on TemporalSession.face_track.
+        """
+        self.redetect_every = redetect_every
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.template_width = template_width
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.detections = 0
+        self.tracked = 0
+        self.lost = 0
+        self.detection_seconds = 0.0
+        self.tracking_seconds = 0.0
+
+    def _gray_roi(self, img_rgb, box, scale):
+        startX, startY, endX, endY = box
+        roi = img_rgb[startY:endY, startX:endX]
+        gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
+        return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def start(self, session, img_rgb, box, detection_seconds):
+        """Record a fresh FaceMesh box for the session (None if no face was found)."""
+        with self._lock:
+            self.frames += 1
+            self.detections += 1
+            self.detection_seconds += detection_seconds
+        if box is None:
+            session.face_track = None
+            return
+        scale = self.template_width / max(1, box[2] - box[0])
+        session.face_track = FaceTrack(box, self._gray_roi(img_rgb, box, scale), scale)
+
+    def track(self, session, img_rgb):
+        """
+        The session's face box in this frame, or None when FaceMesh has to run: no track
+        yet, the re-detection interval is up, or the template no longer matches.
+        """
+        track = session.face_track
+        if track is None or track.frames_since_detection + 1 >= self.redetect_every:
+            return None
+        start = time.perf_counter()
+        h, w = img_rgb.shape[:2]
+        startX, startY, endX, endY = track.box
+        mx = int((endX - startX) * self.search_margin)
+        my = int((endY - startY) * self.search_margin)
+        window = (max(0, startX - mx), max(0, startY - my), min(w, endX + mx), min(h, endY + my))
+        search = self._gray_roi(img_rgb, window, track.scale)
+        th, tw = track.template.shape
+        if search.shape[0] < th or search.shape[1] < tw:
+            session.face_track = None
+            return None
+        scores = cv2.matchTemplate(search, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        elapsed = time.perf_counter() - start
+        if not np.isfinite(score) or score < self.min_score:
+            with self._lock:
+                self.lost += 1
+                self.tracking_seconds += elapsed
+            session.face_track = None
+            return None
+
+        # Shift the old box by where the template was found inside the search window
+        offX = window[0] + int(round(dx / track.scale)) - startX
+        offY = window[1] + int(round(dy / track.scale)) - startY
+        box = (max(0, startX + offX), max(0, startY + offY), min(w, endX + offX), min(h, endY + offY))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            session.face_track = None
+            return None
+        track.box = box
+        track.frames_since_detection += 1
+        with self._lock:
+            self.frames += 1
+            self.tracked += 1
+            self.tracking_seconds += elapsed
+        return box
+
+    def stats(self):
+        """Detections skipped and the FaceMesh time that saved, estimated from the mean detection time."""
+        with self._lock:
+            mean_detection = self.detection_seconds / self.detections if self.detections else 0.0
+            mean_tracking = self.tracking_seconds / max(1, self.tracked + self.lost)
+            saved = self.tracked * mean_detection - self.tracking_seconds
+            return {
+                'enabled': True,
+                'frames': self.frames,
+                'detections': self.detections,
+                'tracked_frames': self.tracked,
+                'tracking_lost': self.lost,
+                'skipped_detection_rate': self.tracked / self.frames if self.frames else 0.0,
+                'mean_detection_ms': 1000.0 * mean_detection,
+                'mean_tracking_ms': 1000.0 * mean_tracking,
+                'saved_ms_total': 1000.0 * max(0.0, saved),
+            }
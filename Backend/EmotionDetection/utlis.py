@@ -1,48 +1,120 @@
+import functools
+import threading
+import cv2
 import torch
 import numpy as np
-from PIL import Image
-from torchvision import transforms
 import math
 
+INPUT_SIZE = 224
+# Per-channel means the AffectNet backbone was trained with, in BGR order
+BGR_MEAN = np.array([91.4953, 103.8827, 131.0912], dtype=np.float32)
+# cv2.remap takes 16-bit integer maps
+MAX_REMAP_SIDE = 32767
+
+@functools.lru_cache(maxsize=1024)
+def _nearest_indices(in_size, out_size=INPUT_SIZE):
+    """
+    Source index of every output pixel along one axis for a nearest-neighbour resize,
+    accumulated in float64 exactly the way Pillow's Image.resize(NEAREST) does it.
+    (cv2.INTER_NEAREST and INTER_NEAREST_EXACT round differently on some sizes.)
+    """
+    scale = in_size / out_size
+    steps = np.full(out_size, scale)
+    steps[0] = scale * 0.5
+    indices = np.cumsum(steps).astype(np.int32)
+    indices.setflags(write=False)
+    return indices
+
+class FacePreprocessor:
+    def __init__(self, size=INPUT_SIZE):
+        """
+        Turns RGB uint8 face crops into backbone input without PIL or per-call allocation.
+
+        Each thread gets its own preallocated output tensor, remap table and resize scratch,
+        so the tensor returned by a call is overwritten by that thread's next call. Output
+        is bit-identical to the old PIL pipeline (NEAREST resize, RGB->BGR, mean subtraction).
+        """
+        self.size = size
+        self._local = threading.local()
+
+    def _buffers(self, batch_size):
+        local = self._local
+        if getattr(local, 'output', None) is None or local.output.shape[0] < batch_size:
+            local.output = torch.empty((batch_size, 3, self.size, self.size), dtype=torch.float32)
+            local.remap = np.empty((self.size, self.size, 2), dtype=np.int16)
+            local.resized = np.empty((self.size, self.size, 3), dtype=np.uint8)
+        return local
+
+    def _write(self, face, out, local):
+        h, w = face.shape[:2]
+        ys = _nearest_indices(h, self.size)
+        xs = _nearest_indices(w, self.size)
+        if max(h, w) <= MAX_REMAP_SIDE:
+            local.remap[..., 0] = xs[None, :]
+            local.remap[..., 1] = ys[:, None]
+            resized = cv2.remap(face, local.remap, None, cv2.INTER_NEAREST, dst=local.resized)
+        else:
+            resized = face[ys[:, None], xs[None, :]]
+        # Channel flip, HWC->CHW, float conversion and mean subtraction in one pass
+        np.subtract(resized[:, :, ::-1].transpose(2, 0, 1), BGR_MEAN[:, None, None], out=out, dtype=np.float32)
+
+    def __call__(self, face):
+        """
+        Parameters:
+            face (np.ndarray): RGB uint8 crop of shape (H, W, 3); a strided view into the frame is fine.
+
+        Returns:
+            Tensor: (1, 3, size, size) float32, reused by this thread's next call.
+        """
+        local = self._buffers(1)
+        self._write(face, local.output.numpy()[0], local)
+        return local.output[:1]
+
+    def batch(self, faces):
+        """Preprocess several crops into one (len(faces), 3, size, size) tensor, reused like __call__."""
+        local = self._buffers(len(faces))
+        out = local.output.numpy()
+        for i, face in enumerate(faces):
+            self._write(face, out[i], local)
+        return local.output[:len(faces)]
+
+face_preprocessor = FacePreprocessor()
+
 def pth_processing(fp):
-    class PreprocessInput(torch.nn.Module):
-        def init(self):
-            super(PreprocessInput, self).init()
-
-        def forward(self, x):
-            x = x.to(torch.float32)
-            x = torch.flip(x, dims=(0,))
-            x[0, :, :] -= 91.4953
-            x[1, :, :] -= 103.8827
-            x[2, :, :] -= 131.0912
-            return x
-
-    def get_img_torch(img):
-        ttransform = transforms.Compose([
-            transforms.PILToTensor(),
-            PreprocessInput()
-        ])
-        img = img.resize((224, 224), Image.Resampling.NEAREST)
-        img = ttransform(img)
-        img = torch.unsqueeze(img, 0)
-        return img
-    return get_img_torch(fp)
+    """Preprocess one face (PIL image or RGB ndarray) into a new (1, 3, 224, 224) tensor."""
+    return face_preprocessor(np.asarray(fp)).clone()
 
 def norm_coordinates(normalized_x, normalized_y, image_width, image_height):
     x_px = min(math.floor(normalized_x * image_width), image_width - 1)
     y_px = min(math.floor(normalized_y * image_height), image_height - 1)
     return x_px, y_px
 
-def get_box(fl, w, h):
-    idx_to_coors = {}
-    for idx, landmark in enumerate(fl.landmark):
-        landmark_px = norm_coordinates(landmark.x, landmark.y, w, h)
-        if landmark_px:
-            idx_to_coors[idx] = landmark_px
-    x_min = np.min(np.asarray(list(idx_to_coors.values()))[:, 0])
-    y_min = np.min(np.asarray(list(idx_to_coors.values()))[:, 1])
-    endX = np.max(np.asarray(list(idx_to_coors.values()))[:, 0])
-    endY = np.max(np.asarray(list(idx_to_coors.values()))[:, 1])
-    (startX, startY) = (max(0, x_min), max(0, y_min))
-    (endX, endY) = (min(w - 1, endX), (min(h - 1, endY)))
-    return startX, startY, endX, endY
\ No newline at end of file
+def landmarks_to_array(fl):
+    """Normalized (x, y) of every FaceMesh landmark as one (N, 2) float64 array."""
+    n = len(fl.landmark)
+    coords = np.fromiter((c for lm in fl.landmark for c in (lm.x, lm.y)), dtype=np.float64, count=2 * n)
+    return coords.reshape(n, 2)
+
+def get_box(fl, w, h, return_landmarks=False):
+    """
+    Bounding box of the face landmarks in pixel coordinates, clipped to the image.
+
+    Parameters:
+        fl: FaceMesh NormalizedLandmarkList, or an (N, 2) array from landmarks_to_array.
+        w (int), h (int): Image width and height.
+        return_landmarks (bool): Also return the (N, 2) int pixel coordinates for reuse.
+
+    Returns:
+        (startX, startY, endX, endY), plus the pixel landmark array if requested.
+    """
+    landmarks = fl if isinstance(fl, np.ndarray) else landmarks_to_array(fl)
+    # Same rounding as norm_coordinates, for every landmark at once
+    landmarks_px = np.floor(landmarks * (w, h)).astype(np.int64)
+    np.minimum(landmarks_px, (w - 1, h - 1), out=landmarks_px)
+    x_min, y_min = landmarks_px.min(axis=0)
+    endX, endY = landmarks_px.max(axis=0)
+    (startX, startY) = (max(0, int(x_min)), max(0, int(y_min)))
+    (endX, endY) = (min(w - 1, int(endX)), min(h - 1, int(endY)))
+    if return_landmarks:
+        return (startX, startY, endX, endY), landmarks_px
+    return startX, startY, endX, endY
@@ -1,6 +1,50 @@
 
+import atexit
+import logging
+import os
 import random
 import pickle
+import threading
+import time
+
+import numpy as np
+
+from rl_snapshot import QSnapshot, read_snapshot, snapshot_lock, write_snapshot
+
+# Ensure RL_ACTIONS match the examples/intent in gemini_avatar_dialogue prompt
+RL_ACTIONS = [
+    "Repeat lesson",
+    "Offer additional hint",
+    "Slow down pace",
+    "Provide encouragement",
+    "Proceed normally"
+]
+# 'dense': DenseEmotionRLAgent (NumPy Q-matrix); 'dict': the original EmotionRLAgent
+RL_Q_TABLE = os.getenv('RL_Q_TABLE', 'dense').lower()
+# Shared Q-table snapshot (.npz; a .pkl path keeps the old pickle format), written by
+# `python rl_train.py` and by workers merging what they learned; picked up without a restart
+RL_QTABLE_PATH = os.getenv('RL_QTABLE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rl_qtable.npz'))
+# Seconds between checks for a newer Q-table file
+RL_QTABLE_RELOAD_INTERVAL = float(os.getenv('RL_QTABLE_RELOAD_INTERVAL', 30))
+# Seconds between merges of a worker's own Q-value changes into the shared snapshot
+RL_QTABLE_MERGE_INTERVAL = float(os.getenv('RL_QTABLE_MERGE_INTERVAL', 60))
+
+# Reward for the emotion observed after an action: how much better placed the student is to learn
+EMOTION_REWARDS = {
+    'Happiness': 1.0,
+    'Neutral': 0.5,
+    'Surprise': 0.25,
+    'Sadness': -0.5,
+    'Fear': -0.75,
+    'Disgust': -0.75,
+    'Anger': -1.0,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def emotion_reward(next_state):
+    return EMOTION_REWARDS.get(next_state, 0.0)
 
 class EmotionRLAgent:
     def __init__(self, actions, learning_rate=0.1, discount_factor=0.95, epsilon=0.2):
@@ -84,10 +128,497 @@ class EmotionRLAgent:
         with open(filepath, 'rb') as f:
             self.q_table = pickle.load(f)
 
+class DenseEmotionRLAgent:
+    def __init__(self, actions, learning_rate=0.1, discount_factor=0.95, epsilon=0.2, states=(), seed=None):
+        """
+        EmotionRLAgent with the Q-values in a dense NumPy matrix instead of a dict keyed by
+        (state, action) tuples. States and actions map to integer row/column ids; rows are
+        added as new states show up, so the state set doesn't have to be known in advance.
+
+        Same interface and the same pickle format as EmotionRLAgent (save/load and the
+        `q_table` dict), plus update_batch() and greedy_actions() over arrays of transitions.
+        save()/load() on a .npz path use the versioned snapshot format of rl_snapshot.py.
+
+        Parameters:
+            actions (list): Possible adaptive actions; column j of the matrix is actions[j].
+            learning_rate (float): Learning rate (alpha) for updating Q-values.
+            discount_factor (float): Discount factor (gamma) for future rewards.
+            epsilon (float): Exploration probability for the epsilon-greedy policy.
+            states (iterable): States to give ids up front, e.g. the emotion labels.
+            seed (int): Seed for exploration and tie-breaking, for reproducible runs.
+        """
+        self.actions = list(actions)
+        self.action_ids = {action: i for i, action in enumerate(self.actions)}
+        self.alpha = learning_rate
+        self.gamma = discount_factor
+        self.epsilon = epsilon
+        self.states = []
+        self.state_ids = {}
+        self.q = np.zeros((max(8, len(states)), len(self.actions)), dtype=np.float64)
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        # Serializes writers: growing the matrix replaces it, and a concurrent update would be lost
+        self._lock = threading.Lock()
+        for state in states:
+            self.state_id(state)
+
+    def state_id(self, state):
+        """Row of `state`, adding one (and growing the matrix) the first time it is seen."""
+        i = self.state_ids.get(state)
+        if i is not None:
+            return i
+        with self._lock:
+            i = self.state_ids.get(state)
+            if i is None:
+                i = len(self.states)
+                if i == len(self.q):
+                    grown = np.zeros((2 * len(self.q), len(self.actions)), dtype=self.q.dtype)
+                    grown[:i] = self.q
+                    self.q = grown
+                self.states.append(state)
+                self.state_ids[state] = i
+            return i
+
+    def state_indices(self, states):
+        return np.fromiter((self.state_id(s) for s in states), dtype=np.intp, count=len(states))
+
+    def action_indices(self, actions):
+        return np.fromiter((self.action_ids[a] for a in actions), dtype=np.intp, count=len(actions))
+
+    def get_q(self, state, action):
+        """Q-value of a state-action pair; 0.0 for states never seen."""
+        i = self.state_ids.get(state)
+        return float(self.q[i, self.action_ids[action]]) if i is not None else 0.0
+
+    def choose_action(self, state):
+        """
+        Epsilon-greedy action for `state`; ties between the best actions are broken at random.
+        """
+        if self._random.random() < self.epsilon:
+            return self._random.choice(self.actions)
+        i = self.state_ids.get(state)
+        if i is None:
+            # Unseen state: every action is tied at 0.0
+            return self._random.choice(self.actions)
+        # A handful of actions: plain Python on the row beats NumPy's per-call overhead
+        row = self.q[i].tolist()
+        max_q = max(row)
+        best = [j for j, value in enumerate(row) if value == max_q]
+        return self.actions[best[0] if len(best) == 1 else self._random.choice(best)]
+
+    def greedy_actions(self, states):
+        """
+        Greedy action for each of `states` in one vectorized argmax, ties broken at random
+        (no exploration).
+
+        Returns:
+            list: One action per state.
+        """
+        rows = self.q[self.state_indices(states)]
+        ties = rows == rows.max(axis=1, keepdims=True)
+        # A random score on the tied entries only, so argmax picks uniformly among them
+        picks = np.argmax(ties * self._rng.random(rows.shape), axis=1)
+        return [self.actions[j] for j in picks]
+
+    def update(self, state, action, reward, next_state):
+        """
+        Q-learning update for one transition, as EmotionRLAgent.update.
+        """
+        s, n = self.state_id(state), self.state_id(next_state)
+        a = self.action_ids[action]
+        with self._lock:
+            q = self.q
+            current_q = q.item(s, a)
+            q[s, a] = current_q + self.alpha * (reward + self.gamma * max(q[n].tolist()) - current_q)
+
+    def update_batch(self, states, actions, rewards, next_states):
+        """
+        Q-learning update for a batch of transitions at once.
+
+        All TD errors are computed from the Q-values before the batch. A state-action pair
+        that occurs k times moves towards its mean target by 1 - (1 - alpha)^k, which is what
+        k sequential updates towards the same target would do; simply adding k alpha-steps
+        overshoots and diverges once k * alpha > 1. The result is exactly update() in a loop
+        when no transition reads a value another one in the batch writes.
+
+        Parameters:
+            states, actions, next_states (sequence): Labels, one per transition.
+            rewards (sequence): Rewards, one per transition.
+        """
+        self.update_indices(self.state_indices(states), self.action_indices(actions),
+                            np.asarray(rewards, dtype=np.float64), self.state_indices(next_states))
+
+    def update_indices(self, s, a, r, n):
+        """
+        update_batch() on transitions already encoded as state_id()/action_ids integers,
+        for replaying large logs without a per-item label lookup.
+
+        Parameters:
+            s, a, n (np.ndarray): State, action and next-state ids (integer arrays).
+            r (np.ndarray): Rewards.
+        """
+        with self._lock:
+            q = self.q
+            td = r + self.gamma * q[n].max(axis=1) - q[s, a]
+            pairs = s * q.shape[1] + a
+            counts = np.bincount(pairs, minlength=q.size)
+            td_sums = np.bincount(pairs, weights=td, minlength=q.size)
+            touched = np.flatnonzero(counts)
+            k = counts[touched]
+            # q is C-contiguous, so reshape(-1) is a view and the += lands in the matrix
+            q.reshape(-1)[touched] += (1.0 - (1.0 - self.alpha) ** k) * td_sums[touched] / k
+
+    @property
+    def q_table(self):
+        """The Q-values as EmotionRLAgent's {(state, action): q} dict (a copy)."""
+        return {(state, action): float(self.q[i, j])
+                for state, i in self.state_ids.items() for action, j in self.action_ids.items()}
+
+    @q_table.setter
+    def q_table(self, table):
+        unknown = {action for _, action in table} - set(self.action_ids)
+        if unknown:
+            raise ValueError(f"Q-table has actions this agent doesn't know: {sorted(unknown)}")
+        states = list(dict.fromkeys(state for state, _ in table))
+        state_ids = {state: i for i, state in enumerate(states)}
+        q = np.zeros((len(states), len(self.actions)), dtype=np.float64)
+        for (state, action), value in table.items():
+            q[state_ids[state], self.action_ids[action]] = value
+        self.set_matrix(states, q)
+
+    def set_matrix(self, states, q):
+        """
+        Replace all Q-values at once: q[i] becomes the row of states[i]. `q` is copied.
+        """
+        matrix = np.zeros((max(8, len(states)), len(self.actions)), dtype=np.float64)
+        matrix[:len(states)] = q
+        state_ids = {state: i for i, state in enumerate(states)}
+        with self._lock:
+            self.states, self.state_ids, self.q = list(states), state_ids, matrix
+
+    def snapshot(self, generation=0):
+        """The current Q-values as a QSnapshot (a copy)."""
+        with self._lock:
+            return QSnapshot(self.q[:len(self.states)].copy(), self.states, self.actions, generation)
+
+    def save(self, filepath):
+        """
+        Save the Q-table: a .npz snapshot (see rl_snapshot.py), written atomically, or
+        EmotionRLAgent's pickle format for any other path, so either agent can load it.
+        """
+        if filepath.endswith('.npz'):
+            write_snapshot(filepath, self.snapshot())
+            return
+        with open(filepath, 'wb') as f:
+            pickle.dump(self.q_table, f)
+
+    def load(self, filepath):
+        """
+        Load a .npz snapshot, or a Q-table pickled by either agent.
+        """
+        if filepath.endswith('.npz'):
+            snapshot = read_snapshot(filepath, mmap=False)
+            self.set_matrix(snapshot.states, snapshot.aligned(self.actions))
+            return
+        with open(filepath, 'rb') as f:
+            self.q_table = pickle.load(f)
+
+
+def load_q_table(agent, filepath):
+    """
+    Load a Q-table file into either agent: .npz snapshots as well as pickles, which is
+    all EmotionRLAgent.load reads.
+    """
+    if filepath.endswith('.npz') and not isinstance(agent, DenseEmotionRLAgent):
+        agent.q_table = read_snapshot(filepath, mmap=False).q_table()
+    else:
+        agent.load(filepath)
+
+
+def create_rl_agent(actions=RL_ACTIONS, q_table=None, **kwargs):
+    """
+    Build the agent selected by `q_table` (default: $RL_Q_TABLE or 'dense').
+
+    Parameters:
+        actions (list): Possible adaptive actions.
+        q_table (str): 'dense' for DenseEmotionRLAgent, 'dict' for EmotionRLAgent.
+        **kwargs: Passed to the agent (learning_rate, discount_factor, epsilon, ...).
+    """
+    q_table = (q_table or RL_Q_TABLE).lower()
+    if q_table == 'dense':
+        return DenseEmotionRLAgent(actions, **kwargs)
+    if q_table == 'dict':
+        kwargs.pop('states', None)
+        kwargs.pop('seed', None)
+        return EmotionRLAgent(actions, **kwargs)
+    raise ValueError(f"Unknown Q-table representation: {q_table}")
+
+class HotSwapRLAgent:
+    def __init__(self, make_agent, path=RL_QTABLE_PATH, check_interval=RL_QTABLE_RELOAD_INTERVAL):
+        """
+        The agent /rl_action asks, reloaded whenever `path` changes on disk.
+
+        `python rl_train.py` replaces the file atomically; each worker notices the new
+        mtime within `check_interval` seconds, loads it into a fresh agent off to the side
+        and swaps the reference, so requests never see a half-loaded table and nothing
+        has to restart. A file that fails to load is logged and the current agent kept.
+
+        Parameters:
+            make_agent (callable): Builds an empty agent (e.g. create_rl_agent).
+            path (str): Q-table file (.npz or pickle) to follow; a missing file means "keep the current agent".
+            check_interval (float): Seconds between stat() calls.
+        """
+        self.make_agent = make_agent
+        self.path = path
+        self.check_interval = check_interval
+        self.agent = make_agent()
+        self.loaded_mtime = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.maybe_reload(force=True)
+
+    def maybe_reload(self, force=False):
+        """Swap in the Q-table file if it changed since the last load; True if it did."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        # One thread reloads; the others keep using the current agent meanwhile
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self.loaded_mtime:
+                return False
+            agent = self.make_agent()
+            try:
+                load_q_table(agent, self.path)
+            except Exception as e:
+                self.reload_errors += 1
+                self.loaded_mtime = mtime  # don't retry the same broken file every interval
+                logger.error(f"Could not load Q-table {self.path}: {str(e)}")
+                return False
+            self.agent = agent
+            self.loaded_mtime = mtime
+            self.loaded_at = time.time()
+            self.reloads += 1
+            logger.info(f"Loaded Q-table {self.path} ({len(agent.q_table)} state-action values)")
+            return True
+        finally:
+            self._lock.release()
+
+    def choose_action(self, state):
+        self.maybe_reload()
+        return self.agent.choose_action(state)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'loaded': self.loaded_at is not None,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+            'q_values': len(self.agent.q_table),
+        }
+
+class SharedRLAgent:
+    def __init__(self, agent, path=RL_QTABLE_PATH, check_interval=RL_QTABLE_RELOAD_INTERVAL,
+                 merge_interval=RL_QTABLE_MERGE_INTERVAL):
+        """
+        A DenseEmotionRLAgent that learns online in every worker process and shares what it
+        learned through the .npz snapshot at `path`.
+
+        Each worker maps the latest snapshot read-only (its base) and answers requests from
+        its own matrix: the base plus whatever its update() calls changed since (its delta).
+        A background thread adds the delta to the snapshot on disk every `merge_interval`
+        seconds, under an exclusive file lock, as the next generation written atomically;
+        every `check_interval` seconds it rebases onto generations written by other workers
+        or by `python rl_train.py`, keeping its unmerged delta on top. Workers converge on
+        one table shortly after learning stops, and no request waits on disk or a pickle.
+
+        Parameters:
+            agent (DenseEmotionRLAgent): The agent requests use; its Q-values become base + delta.
+            path (str): .npz snapshot shared by all workers; created by the first merge if missing.
+            check_interval (float): Seconds between checks for a newer snapshot.
+            merge_interval (float): Seconds between merges of this worker's delta.
+        """
+        self.agent = agent
+        self.path = path
+        self.check_interval = check_interval
+        self.merge_interval = merge_interval
+        # Snapshot values of agent.states[:len(base)] (zero where the snapshot lacks a state); the delta is agent.q minus these
+        self.base = np.zeros((0, len(agent.actions)))
+        self.generation = None
+        self.loaded_mtime = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.merges = 0
+        self.sync_errors = 0
+        self.updates = 0
+        self._last_merge = time.monotonic()
+        self._sync_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self.refresh()
+        atexit.register(self.merge)
+
+    def _ensure_syncer(self):
+        # Threads don't survive fork(), so each worker process starts its own
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    threading.Thread(target=self._sync_periodically, name='rl-qtable-sync', daemon=True).start()
+
+    def _sync_periodically(self):
+        while True:
+            time.sleep(self.check_interval)
+            merged = False
+            if time.monotonic() - self._last_merge >= self.merge_interval:
+                self._last_merge = time.monotonic()
+                merged = self.merge()
+            if not merged:
+                self.refresh()
+
+    def _delta(self):
+        """(states, rows) this worker changed since its base; call with the agent's lock held."""
+        agent = self.agent
+        delta = agent.q[:len(agent.states)].copy()
+        delta[:len(self.base)] -= self.base
+        return list(agent.states), delta
+
+    def _rebase(self, snapshot, merged=None):
+        """
+        Make `snapshot` the base and put the delta it doesn't contain back on top.
+
+        Parameters:
+            snapshot (QSnapshot): The new base.
+            merged (tuple): (states, delta) merge() just added to `snapshot`, or None.
+        """
+        agent = self.agent
+        base = snapshot.aligned(agent.actions)
+        with agent._lock:
+            states, delta = self._delta()
+            if merged is not None:
+                # States are only ever appended between merge() taking the delta and this
+                merged_states, merged_delta = merged
+                delta[:len(merged_states)] -= merged_delta
+            # Rows keep their ids and new states are appended: update() and choose_action()
+            # resolve an id before taking the lock, so renumbering would move their step
+            # to another state's row
+            ids = dict(agent.state_ids)
+            new_states = list(agent.states)
+            for state in snapshot.states:
+                if state not in ids:
+                    ids[state] = len(new_states)
+                    new_states.append(state)
+            aligned = np.zeros((len(new_states), len(agent.actions)), dtype=np.float64)
+            aligned[[ids[state] for state in snapshot.states]] = base
+            q = np.zeros((max(8, len(new_states)), len(agent.actions)), dtype=np.float64)
+            q[:len(new_states)] = aligned
+            q[:len(states)] += delta
+            # q first: any id a lock-free reader finds in state_ids already has its row
+            agent.q = q
+            agent.states, agent.state_ids = new_states, ids
+            self.base = aligned
+
+    def _loaded(self, snapshot, mtime):
+        self.generation = snapshot.generation
+        self.loaded_mtime = mtime
+        self.loaded_at = time.time()
+
+    def refresh(self):
+        """Rebase onto the snapshot on disk if it changed since the last look; True if it did."""
+        with self._sync_lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self.loaded_mtime:
+                return False
+            try:
+                snapshot = read_snapshot(self.path)
+            except Exception as e:
+                self.sync_errors += 1
+                self.loaded_mtime = mtime  # don't retry the same broken file every interval
+                logger.error(f"Could not load Q-table snapshot {self.path}: {str(e)}")
+                return False
+            self._rebase(snapshot)
+            self._loaded(snapshot, mtime)
+            self.reloads += 1
+            logger.info(f"Loaded Q-table snapshot {self.path} (generation {snapshot.generation}, "
+                        f"{len(snapshot.states)} states)")
+            return True
+
+    def merge(self):
+        """Add this worker's delta to the shared snapshot; False if there was nothing to add or it failed."""
+        actions = self.agent.actions
+        with self._sync_lock:
+            with self.agent._lock:
+                states, delta = self._delta()
+            if not delta.any():
+                return False
+            try:
+                with snapshot_lock(self.path):
+                    if os.path.exists(self.path):
+                        current = read_snapshot(self.path, mmap=False)
+                    else:
+                        current = QSnapshot(np.zeros((0, len(actions))), [], actions)
+                    ids = {state: i for i, state in enumerate(current.states)}
+                    for state in states:
+                        ids.setdefault(state, len(ids))
+                    q = np.zeros((len(ids), len(actions)), dtype=np.float64)
+                    q[:len(current.states)] = current.aligned(actions)
+                    q[[ids[state] for state in states]] += delta
+                    write_snapshot(self.path, QSnapshot(q, list(ids), actions, current.generation + 1))
+                    snapshot = read_snapshot(self.path)
+                    mtime = os.stat(self.path).st_mtime_ns
+            except Exception as e:
+                self.sync_errors += 1
+                logger.error(f"Could not merge Q-values into {self.path}: {str(e)}")
+                return False
+            self._rebase(snapshot, merged=(states, delta))
+            self._loaded(snapshot, mtime)
+            self.merges += 1
+            logger.info(f"Merged {int(np.count_nonzero(delta))} changed Q-values into {self.path} "
+                        f"(generation {snapshot.generation})")
+            return True
+
+    def choose_action(self, state):
+        self._ensure_syncer()
+        return self.agent.choose_action(state)
+
+    def update(self, state, action, reward, next_state):
+        """Online Q-learning update in this worker; reaches the others with the next merge."""
+        self._ensure_syncer()
+        self.agent.update(state, action, reward, next_state)
+        self.updates += 1
+
+    def stats(self):
+        with self.agent._lock:
+            _, delta = self._delta()
+        return {
+            'path': self.path,
+            'loaded': self.loaded_at is not None,
+            'loaded_at': self.loaded_at,
+            'generation': self.generation,
+            'reloads': self.reloads,
+            'merges': self.merges,
+            'sync_errors': self.sync_errors,
+            'updates': self.updates,
+            'unmerged_q_values': int(np.count_nonzero(delta)),
+            'q_values': len(self.agent.states) * len(self.agent.actions),
+        }
+
 # Example usage (this block can be removed when integrating the agent into your project)
 if __name__ == "__main__":
-    actions = ["Repeat lesson", "Offer additional hint", "Slow down pace", "Provide encouragement", "Proceed normally"]
-    agent = EmotionRLAgent(actions=actions)
+    agent = EmotionRLAgent(actions=RL_ACTIONS)
     # Assume the current emotion is "Anger"
     current_state = "Anger"
     action = agent.choose_action(current_state)
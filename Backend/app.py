@@ -1,31 +1,39 @@
 # .\venv\Scripts\activate
 import os
-import re
-import base64
-import datetime
+import sys
+import json
 import logging
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify, send_from_directory, abort
 from flask_cors import CORS
 from flask_pymongo import PyMongo
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 import jwt
-from datetime import timedelta
 from functools import wraps
+from urllib.parse import urlencode
 from bson import ObjectId
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from dotenv import load_dotenv
-import cv2
-import numpy as np
-import torch
-import mediapipe as mp
-from PIL import Image
-from gemini_analyzer import identify # Keep this for LD analysis
+from gemini_analyzer import identify, identify_fake # Keep this for LD analysis
 # ***** CHANGE HERE: Import the new dialogue generator *****
 from gemini_avatar_dialogue import generate_dialgoue_client_sdk
 # *********************************************************
-from EmotionDetection.model import pth_backbone_model, pth_LSTM_model
-from EmotionDetection.utlis import pth_processing, get_box
-from RL import EmotionRLAgent
+# The emotion pipeline (torch, cv2, mediapipe) is imported on first use, see get_emotion_pipeline()
+from EmotionDetection.labels import DICT_EMO
+from EmotionDetection.errors import PipelineError
+from RL import create_rl_agent, HotSwapRLAgent, SharedRLAgent, RL_Q_TABLE, RL_QTABLE_PATH
+from rl_transitions import TransitionLog, TransitionTracker, RL_TRANSITION_LOGGING, RL_ONLINE_LEARNING
+from emotion_store import create_emotion_history_store
+from ld_jobs import LDAnalysisQueue
+from dialogue_cache import DialogueCache, load_phrase_bank
+from gemini_client import get_gemini_client
+from user_cache import UserCache, AUTH_TRUST_CLAIMS
+from image_store import handwriting_store, multipart_file_chunks, read_chunks, ImageTooLarge
+from frame_stream import FrameStream
+from assessments import (new_user_document, token_claims, build_assessment, page_query, split_page,
+                         ASSESSMENTS_SORT)
+from metrics import registry as metrics_registry, stage_timer, observe_request, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from collections import Counter
 
 
@@ -38,36 +46,55 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Load the models and FaceMesh graphs before serving instead of on the first frame
+WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'True').lower() in ['true', '1', 't']
+
 app = Flask(__name__)
-CORS(app)
+# Pagination cursors travel in response headers, which browsers hide unless exposed
+CORS(app, expose_headers=['X-Next-Cursor', 'Link'])
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
 app.config["MONGO_URI"] = os.getenv("MONGO_URI", "mongodb://localhost:27017/main_project")
 mongo = PyMongo(app)
-
-# Initialize Face Mesh and Emotion Dictionary
-mp_face_mesh = mp.solutions.face_mesh
-DICT_EMO = {0: 'Neutral', 1: 'Happiness', 2: 'Sadness', 3: 'Surprise', 4: 'Fear', 5: 'Disgust', 6: 'Anger'}
-
-# Ensure RL_ACTIONS match the examples/intent in gemini_avatar_dialogue prompt
-RL_ACTIONS = [
-    "Repeat lesson",
-    "Offer additional hint",
-    "Slow down pace",
-    "Provide encouragement",
-    "Proceed normally"
-]
-rl_agent = EmotionRLAgent(actions=RL_ACTIONS)
+# WebSocket frame stream (/ws/facedetection); pings keep idle connections open through proxies
+app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': 25, 'max_message_size': 2 * 1024 * 1024}
+sock = Sock(app)
+
+# Q-table representation from RL_Q_TABLE (dense NumPy matrix by default). The dense agent
+# learns online and merges with the other workers through the RL_QTABLE_PATH snapshot; the
+# dict agent (or a .pkl RL_QTABLE_PATH) only follows it. Either way a new table from
+# `python rl_train.py` is picked up without a restart
+if RL_Q_TABLE == 'dense' and RL_QTABLE_PATH.endswith('.npz'):
+    rl_agent = SharedRLAgent(create_rl_agent(states=list(DICT_EMO.values())))
+else:
+    rl_agent = HotSwapRLAgent(lambda: create_rl_agent(states=list(DICT_EMO.values())))
+rl_online_update = rl_agent.update if RL_ONLINE_LEARNING and isinstance(rl_agent, SharedRLAgent) else None
+# (state, action, next emotion state) of every /rl_action decision, for rl_train.py and online learning
+if RL_TRANSITION_LOGGING or rl_online_update is not None:
+    rl_transitions = TransitionTracker(TransitionLog() if RL_TRANSITION_LOGGING else None,
+                                       on_transition=rl_online_update)
+else:
+    rl_transitions = None
+# Avatar sentences per (action, state, context); refresh the bank with `python dialogue_cache.py`
+dialogue_cache = DialogueCache(generate_dialgoue_client_sdk, phrase_bank=load_phrase_bank())
 
 # Create indexes for users and assessments
 try:
     mongo.db.users.create_index("email", unique=True)
-    mongo.db.assessments.create_index([("userId", 1), ("created_at", -1)])
+    # _id breaks ties between assessments saved in the same instant, for stable /assessments cursors
+    mongo.db.assessments.create_index([("userId", 1), ("created_at", -1), ("_id", -1)])
     logger.info("Database indexes created successfully")
 except Exception as e:
     logger.error(f"Error creating database indexes: {str(e)}")
 
-emotion_history = []
+# Recent emotion labels per user/session; EMOTION_HISTORY_BACKEND=mongo|redis shares them across workers
+emotion_history = create_emotion_history_store(mongo_db=mongo.db)
+
+# LD analysis runs in the background after /save-assessment returns (GEMINI_FAKE=1 for offline runs)
+ld_analysis_queue = LDAnalysisQueue(
+    mongo.db.assessments,
+    identify_fake if os.getenv('GEMINI_FAKE', 'False').lower() in ['true', '1', 't'] else identify
+)
 
 # Check MongoDB connection
 def check_mongo_connection():
@@ -79,23 +106,37 @@ def check_mongo_connection():
 
 check_mongo_connection()
 
-def token_required(f):
+# Verified JWT claims and user documents for token_required, so most requests skip the users lookup
+user_cache = UserCache(
+    load_user=lambda email: mongo.db.users.find_one({'email': email}, {'password': 0}),
+    decode_token=lambda token: jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]),
+)
+
+def get_bearer_token():
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header:
+        parts = auth_header.split(" ")
+        if len(parts) == 2:
+            return parts[1]
+    return None
+
+def authenticate(f, trust_claims):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header:
-            parts = auth_header.split(" ")
-            if len(parts) == 2:
-                token = parts[1]
+        token = get_bearer_token()
 
         if not token:
             logger.warning("Token is missing in request")
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = mongo.db.users.find_one({'email': data['email']})
+            with stage_timer('auth.verify'):
+                data = user_cache.claims(token)
+                if trust_claims and data.get('uid'):
+                    # Signed at login; a deleted user keeps read access until the token expires
+                    current_user = {'_id': ObjectId(data['uid']), 'email': data['email'], 'username': data.get('username', '')}
+                else:
+                    current_user = user_cache.user(data['email'])
             if not current_user:
                 logger.warning(f"User not found for email: {data['email']}")
                 return jsonify({'message': 'User not found!'}), 401
@@ -113,6 +154,100 @@ def token_required(f):
 
     return decorated
 
+def token_required(f):
+    """Pass the logged-in user's document (without the password hash) as the first argument."""
+    return authenticate(f, trust_claims=False)
+
+def claims_required(f):
+    """
+    token_required for read-only routes that only need _id/email/username. With
+    AUTH_TRUST_CLAIMS on, those come from the signed token and no user lookup happens.
+    """
+    return authenticate(f, trust_claims=AUTH_TRUST_CLAIMS)
+
+def get_emotion_pipeline():
+    """The shared EmotionPipeline, importing torch/cv2/mediapipe on first call."""
+    from EmotionDetection.pipeline import emotion_pipeline
+    return emotion_pipeline
+
+def warm_up():
+    """
+    Load the emotion models and FaceMesh graphs before taking traffic.
+    Run by init_worker() (unless WARM_UP_ON_START is false); /ready reports when it has finished.
+    """
+    logger.info("Warming up emotion pipeline")
+    get_emotion_pipeline().warm_up()
+
+def init_worker(processes=1):
+    """
+    Per-process startup, in every process that serves requests: size torch's thread pool
+    for `processes` serving processes, warm up the pipeline, and requeue LD analysis jobs
+    a dead worker left behind.
+    """
+    from EmotionDetection.model import configure_threads
+    threads = configure_threads(processes)
+    logger.info(f"Worker {os.getpid()}: {threads} torch threads")
+    if WARM_UP_ON_START:
+        warm_up()
+    try:
+        recovered = ld_analysis_queue.recover_pending()
+        if recovered:
+            logger.info(f"Requeued {recovered} unfinished LD analysis jobs")
+    except Exception as e:
+        logger.error(f"Could not requeue unfinished LD analysis jobs: {str(e)}")
+    ld_analysis_queue.start_recovery()
+
+def create_app(prefork=True):
+    """
+    The Flask app for a WSGI server (wsgi.py); routes are registered at import.
+
+    With `prefork` this runs in the server's master process before it forks workers
+    (gunicorn.conf.py preloads the app). The model weights are loaded here, once, and
+    the forked workers share their memory pages copy-on-write since inference never
+    writes to them. Anything that starts threads or runs inference (FaceMesh graphs,
+    the warm-up pass, the LD job pool) is left to init_worker() in each worker, because
+    threads don't survive fork(). Without `prefork` this process is the worker and
+    init_worker() runs right away.
+    """
+    if WARM_UP_ON_START:
+        from EmotionDetection.model import load_models
+        load_models()
+    if not prefork:
+        init_worker()
+    return app
+
+def get_token_email():
+    """Email claim of a valid Bearer token, or None. Unlike token_required it never hits the database."""
+    token = get_bearer_token()
+    if not token:
+        return None
+    try:
+        return user_cache.claims(token).get('email')
+    except jwt.InvalidTokenError:
+        return None
+
+def record_emotion(session_id, label):
+    """
+    Bookkeeping for every detected emotion: the history /rl_action reads, and the RL
+    transition whose next state it helps observe.
+    """
+    with stage_timer('emotion_history.append'):
+        emotion_history.append(session_id, label)
+    if rl_transitions is not None:
+        rl_transitions.observe(session_id, label)
+
+def get_session_id():
+    """
+    Identify whose webcam stream / emotion history a request belongs to, so per-student
+    state isn't mixed. Logged-in users are keyed by email, which is also what
+    save_assessment reads. Anonymous clients can send a `session_id` form field or an
+    `X-Session-Id` header; otherwise the remote address is used.
+    """
+    return (get_token_email()
+            or request.form.get('session_id')
+            or request.headers.get('X-Session-Id')
+            or request.remote_addr)
+
 # --- Routes for Auth, Profile, Assessment Saving, Face Detection (Keep as they are) ---
 @app.route('/register', methods=['POST'])
 def register():
@@ -122,19 +257,18 @@ def register():
         logger.warning("Missing required fields in registration")
         return jsonify({'message': 'Missing required fields'}), 400
 
-    if mongo.db.users.find_one({'email': data['email']}):
+    with stage_timer('mongo.find_user'):
+        existing = mongo.db.users.find_one({'email': data['email']})
+    if existing:
         logger.warning(f"User already exists: {data['email']}")
         return jsonify({'message': 'User already exists'}), 409
 
-    new_user = {
-        'username': data.get('username', ''),
-        'email': data['email'],
-        'password': generate_password_hash(data['password']),
-        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
-    }
+    new_user = new_user_document(data)
 
     try:
-        mongo.db.users.insert_one(new_user)
+        with stage_timer('mongo.insert_user'):
+            mongo.db.users.insert_one(new_user)
+        user_cache.invalidate(data['email'])
         logger.info(f"New user registered: {data['email']}")
         return jsonify({'message': 'User registered successfully'}), 201
     except Exception as e:
@@ -149,15 +283,15 @@ def login():
         logger.warning("Missing credentials in login attempt")
         return jsonify({'message': 'Missing required fields'}), 400
 
-    user = mongo.db.users.find_one({'email': data['email']})
-    if not user or not check_password_hash(user['password'], data['password']):
+    with stage_timer('mongo.find_user'):
+        user = mongo.db.users.find_one({'email': data['email']})
+    with stage_timer('auth.password_check'):
+        valid = user is not None and check_password_hash(user['password'], data['password'])
+    if not valid:
         logger.warning(f"Invalid login attempt for {data['email']}")
         return jsonify({'message': 'Invalid credentials'}), 401
 
-    token = jwt.encode({
-        'email': user['email'],
-        'exp': datetime.datetime.now(datetime.timezone.utc) + timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+    token = jwt.encode(token_claims(user), app.config['SECRET_KEY'], algorithm="HS256")
 
     logger.info(f"User logged in: {data['email']}")
     return jsonify({'token': token}), 200
@@ -186,102 +320,21 @@ def save_assessment(current_user):
         logger.error("Request is not JSON")
         return jsonify({'message': 'Request must be JSON'}), 400
 
-    data = request.get_json()
+    with stage_timer('http.parse_json'):
+        data = request.get_json()
     if not data:
         logger.error("No data provided in request")
         return jsonify({'message': 'No data provided'}), 400
 
     try:
-        assessment_data = {
-            'userId': str(current_user['_id']),
-            'userEmail': current_user['email'],
-            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            'emotions': emotion_history.copy() # Save snapshot of emotions at assessment time
-        }
-
-        # Process handwriting image if provided
-        image_filename = None
-        if data.get('handwriting') and data['handwriting'].get('imageData'):
-            try:
-                logger.info("Processing handwriting image")
-                image_string = data['handwriting']['imageData']
-
-                if not image_string or not isinstance(image_string, str) or not image_string.startswith('data:image'):
-                    logger.warning("Invalid image data format received")
-                    raise ValueError("Invalid image data format")
-
-                # Extract base64 data correctly
-                header, encoded = image_string.split(",", 1)
-
-                try:
-                    image_data = base64.b64decode(encoded)
-                except base64.binascii.Error as b64_error:
-                    logger.error(f"Invalid base64 image data: {b64_error}")
-                    raise ValueError("Invalid base64 image data")
-
-                timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                # Extract extension from header (e.g., 'image/png')
-                img_format = header.split(';')[0].split('/')[1]
-                image_filename = f"handwriting_{current_user['email']}_{timestamp}.{img_format}"
-
-                upload_folder = os.path.join(os.getcwd(), 'uploads')
-                os.makedirs(upload_folder, exist_ok=True)
-                image_path = os.path.join(upload_folder, secure_filename(image_filename))
-
-                with open(image_path, 'wb') as f:
-                    f.write(image_data)
-
-                # Store only the filename in the database, not the full path or base64
-                data['handwriting']['imageData'] = image_filename
-                logger.info(f"Handwriting image saved as {image_filename}")
-
-            except ValueError as ve:
-                 # Log the specific value error
-                 logger.error(f"Error processing handwriting image data: {ve}")
-                 data['handwriting']['imageData'] = None # Ensure it's None if saving failed
-            except Exception as e:
-                logger.exception(f"Unexpected error processing handwriting image:") # Log full traceback
-                data['handwriting']['imageData'] = None # Ensure it's None if saving failed
-
-
-        # Update assessment_data with other parts from request data
-        assessment_data.update({
-            'numberComparison': data.get('numberComparison'),
-            'handwriting': data.get('handwriting'), # Now contains filename or None
-            'letterArrangement': data.get('letterArrangement'),
-            'completedAt': data.get('completedAt'), # Assuming frontend sends this
-            'emotionTrackingData': data.get('emotionTrackingData', []) # Ensure default if missing
-        })
-
-
-        # Call Gemini analyzer for LD identification
-        try:
-            logger.info("Calling Gemini analyzer for LD identification")
-            # ***** NOTE: `identify` should return JSON as defined in gemini_analyzer.py *****
-            gemini_response_json = identify(assessment_data)
-            assessment_data['gemini_response'] = gemini_response_json # Store the JSON response
-            logger.info("Gemini LD analysis completed successfully")
-        except Exception as e:
-            logger.error(f"Gemini LD analysis failed: {str(e)}")
-            assessment_data['gemini_response'] = {
-                'error': 'LD Analysis failed',
-                'details': str(e)
-            }
+        assessment_data, analysis_input, ld_job, image_filename = build_assessment(
+            current_user, data, emotion_history.snapshot(current_user['email']))
 
         # Save to MongoDB
         try:
             logger.info("Saving assessment to database")
-            result = mongo.db.assessments.insert_one(assessment_data)
-            logger.info(f"Assessment saved with ID: {result.inserted_id}")
-            emotion_history.clear() # Clear history *after* successful save
-
-            return jsonify({
-                'message': 'Assessment saved successfully',
-                'assessmentId': str(result.inserted_id),
-                'ld_analysis': assessment_data.get('gemini_response'), # Return analysis result
-                'image_saved': image_filename is not None
-            }), 201
-
+            with stage_timer('mongo.insert_assessment'):
+                result = mongo.db.assessments.insert_one(assessment_data)
         except Exception as e:
             logger.error(f"Database save failed: {str(e)}")
             # Attempt to delete uploaded image if DB save fails? Optional.
@@ -291,6 +344,28 @@ def save_assessment(current_user):
                 'message': 'Failed to save assessment to database',
                 'error': str(e)
             }), 500
+        logger.info(f"Assessment saved with ID: {result.inserted_id}")
+
+        # The assessment is stored from here on: a 500 would only make the client save it twice
+        try:
+            emotion_history.clear(current_user['email']) # Clear this user's history *after* successful save
+        except Exception as e:
+            logger.error(f"Could not clear the emotion history of {current_user['email']}: {str(e)}")
+        try:
+            with stage_timer('ld_queue.submit'):
+                ld_analysis_queue.submit(ld_job['id'], analysis_input)
+            logger.info(f"Queued LD analysis job {ld_job['id']}")
+        except Exception as e:
+            # The job stays queued on the assessment; the periodic recover_pending() picks it up
+            logger.error(f"Could not submit LD analysis job {ld_job['id']}, left for recovery: {str(e)}")
+
+        return jsonify({
+            'message': 'Assessment saved, LD analysis queued',
+            'assessmentId': str(result.inserted_id),
+            'jobId': ld_job['id'],
+            'statusUrl': f"/ld-jobs/{ld_job['id']}",
+            'image_saved': image_filename is not None
+        }), 202
 
     except Exception as e:
         logger.exception(f"Unexpected error in save_assessment:") # Log full traceback
@@ -300,29 +375,124 @@ def save_assessment(current_user):
         }), 500
 
 
-@app.route('/assessments', methods=['GET'])
+@app.route('/handwriting', methods=['POST'])
 @token_required
+def upload_handwriting(current_user):
+    """
+    Stream a handwriting image to disk ahead of /save-assessment, which then references it
+    by hash. Accepts multipart/form-data with an `image` file, or a raw image/* body.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            chunks = multipart_file_chunks(request.stream, request.content_type, field_name='image')
+        elif request.mimetype.startswith('image/'):
+            chunks = read_chunks(request.stream)
+        else:
+            return jsonify({'message': 'Send multipart/form-data with an image file, or an image/* body'}), 415
+        with stage_timer('handwriting.store'):
+            stored = handwriting_store.save_chunks(chunks)
+    except ImageTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+    except ValueError as e:
+        logger.warning(f"Rejected handwriting upload from {current_user['email']}: {e}")
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error storing handwriting upload:")
+        return jsonify({'message': 'Failed to store image', 'error': str(e)}), 500
+
+    logger.info(f"Handwriting image {stored['hash']} stored ({stored['size']} bytes, deduplicated={stored['deduplicated']})")
+    return jsonify({
+        'imageHash': stored['hash'],
+        'imageData': stored['path'],
+        'size': stored['size'],
+        'deduplicated': stored['deduplicated'],
+    }), 201
+
+
+@app.route('/uploads/<path:filename>', methods=['GET'])
+@claims_required
+def uploaded_file(current_user, filename):
+    """
+    A stored handwriting image, for its owner: only content-addressed ab/cd/<sha256>.<ext>
+    paths that one of the caller's assessments references. Anything else is a 404, so
+    legacy files with guessable names and in-progress uploads are never served.
+    """
+    digest = handwriting_store.digest_of(filename)
+    if digest is None:
+        abort(404)
+    with stage_timer('mongo.find_assessments'):
+        owned = mongo.db.assessments.find_one({
+            'userId': str(current_user['_id']),
+            '$or': [{'handwriting.imageHash': digest}, {'handwriting.imageData': filename}],
+        }, {'_id': 1})
+    if owned is None:
+        abort(404)
+    # Content-addressed files never change, but only the owner's browser may keep a copy
+    response = send_from_directory(handwriting_store.root, filename, max_age=365 * 24 * 3600)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.vary.add('Authorization')
+    return response
+
+
+@app.route('/ld-jobs/<job_id>', methods=['GET'])
+@claims_required
+def get_ld_job_status(current_user, job_id):
+    """Poll the background LD analysis of a saved assessment."""
+    try:
+        doc = ld_analysis_queue.status(job_id, user_id=str(current_user['_id']))
+    except Exception as e:
+        logger.exception(f"Error fetching LD job {job_id}:")
+        return jsonify({'message': 'Failed to fetch LD analysis status', 'error': str(e)}), 500
+    if not doc:
+        return jsonify({'message': 'LD analysis job not found'}), 404
+
+    ld_job = doc['ld_job']
+    return jsonify({
+        'jobId': job_id,
+        'assessmentId': str(doc['_id']),
+        'status': ld_job['status'],
+        'attempts': ld_job.get('attempts', 0),
+        'error': ld_job.get('error'),
+        'ld_analysis': doc.get('gemini_response') if ld_job['status'] in ('done', 'failed') else None,
+    }), 200
+
+
+@app.route('/assessments', methods=['GET'])
+@claims_required
 def get_user_assessments(current_user):
-    # ... (keep existing code) ...
+    """
+    The user's assessments, newest first, one page at a time.
+
+    Query parameters:
+        limit: Page size (default ASSESSMENTS_PAGE_SIZE, at most 100).
+        cursor: The X-Next-Cursor header of the previous page.
+        view: 'full' (default) or 'summary'.
+        fields: Comma-separated fields to return instead of a view, e.g. fields=completedAt,gemini_response.
+
+    The body stays a plain list; the cursor for the next page, if there is one, is in the
+    X-Next-Cursor header (and a Link: rel="next" header).
+    """
     try:
-        user_id_str = str(current_user['_id']) # Use the ObjectId string representation
-        # Prioritize query by userId if available and reliable
-        assessments = list(mongo.db.assessments.find({'userId': user_id_str}).sort("created_at", -1))
-        # Fallback or complementary query by email if needed (e.g., for older data)
-        if not assessments:
-             logger.info(f"No assessments found by userId '{user_id_str}', trying email '{current_user['email']}'")
-             assessments = list(mongo.db.assessments.find({'userEmail': current_user['email']}).sort("created_at", -1))
-
-        # Convert ObjectId to string for JSON serialization
-        for assessment in assessments:
-            assessment['_id'] = str(assessment['_id'])
-            # Ensure userId is also a string if it exists
-            if 'userId' in assessment and isinstance(assessment['userId'], ObjectId):
-                 assessment['userId'] = str(assessment['userId'])
+        query, projection, limit = page_query(request.args, str(current_user['_id']))
+    except ValueError as e:
+        return jsonify({'message': f'Invalid query parameters: {str(e)}'}), 400
 
+    try:
+        cursor = mongo.db.assessments.find(query, projection).sort(ASSESSMENTS_SORT).limit(limit + 1)
+        with stage_timer('mongo.find_assessments'):
+            assessments = list(cursor)
+        assessments, next_cursor = split_page(assessments, limit)
 
         logger.info(f"Retrieved {len(assessments)} assessments for user {current_user['email']}")
-        return jsonify(assessments), 200
+        response = jsonify(assessments)
+        if next_cursor:
+            next_args = request.args.to_dict()
+            next_args['cursor'] = next_cursor
+            next_url = f"{request.base_url}?{urlencode(next_args)}"
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response, 200
     except Exception as e:
         logger.exception(f"Error fetching assessments for user {current_user['email']}:")
         return jsonify({'message': 'Failed to fetch assessments', 'error': str(e)}), 500
@@ -338,113 +508,86 @@ def face_detection_route():
 
         file = request.files['image']
         # Read image safely
-        filestr = file.read()
+        with stage_timer('http.read_upload'):
+            filestr = file.read()
         if not filestr:
              logger.warning("Empty image file received in face detection")
              return jsonify({"message": "Empty image file received"}), 400
 
-        npimg = np.frombuffer(filestr, np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-
-        if img is None:
-            logger.warning("Could not decode image file.")
-            return jsonify({"message": "Invalid image format"}), 400
-
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        h, w, _ = img.shape
-
-        # Initialize models if they haven't been (consider initializing globally at startup)
-        global mp_face_mesh, pth_backbone_model, pth_LSTM_model
-        if 'mp_face_mesh' not in globals():
-             mp_face_mesh = mp.solutions.face_mesh
-        # Add similar checks/initialization for your PyTorch models if needed
-
-        with mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=False, # Set to False if not needed, potentially faster
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5) as face_mesh:
-
-            results = face_mesh.process(img_rgb)
-
-            if results.multi_face_landmarks:
-                fl = results.multi_face_landmarks[0] # Process only the first detected face
-                startX, startY, endX, endY = get_box(fl, w, h)
-
-                # Ensure box coordinates are valid
-                startY, endY = max(0, startY), min(h, endY)
-                startX, endX = max(0, startX), min(w, endX)
-
-                if startY >= endY or startX >= endX:
-                     logger.warning("Invalid face bounding box calculated.")
-                     return jsonify({"message": "Face detected but bounding box invalid"}), 400
-
-                cur_face = img_rgb[startY:endY, startX:endX]
-
-                if cur_face.size == 0:
-                     logger.warning("Face crop resulted in an empty image.")
-                     return jsonify({"message": "Face detected but crop failed"}), 400
-
-                # Process with PyTorch models
-                try:
-                    cur_face_pil = Image.fromarray(cur_face)
-                    cur_face_processed = pth_processing(cur_face_pil) # Your preprocessing function
-
-                    # Ensure models are loaded (add error handling for model loading)
-                    if pth_backbone_model is None or pth_LSTM_model is None:
-                         logger.error("Emotion detection models not loaded.")
-                         return jsonify({"message": "Emotion models unavailable"}), 500
-
-                    with torch.no_grad(): # Important for inference
-                        features = torch.nn.functional.relu(
-                            pth_backbone_model.extract_features(cur_face_processed)
-                        ).detach().cpu().numpy() # Move to CPU if needed
-
-                        # Ensure features have the expected shape/type
-                        if features is None or features.size == 0:
-                             logger.warning("Feature extraction yielded empty result.")
-                             return jsonify({"message": "Could not extract features"}), 500
-
-                        # Prepare LSTM input (adjust sequence length as needed)
-                        lstm_features = [features] * 10 # Assuming sequence length 10
-                        lstm_f = torch.from_numpy(np.vstack(lstm_features))
-                        lstm_f = torch.unsqueeze(lstm_f, 0) # Add batch dimension
-
-                        output = pth_LSTM_model(lstm_f).detach().cpu().numpy()
-
-                    cl = np.argmax(output)
-                    label = DICT_EMO.get(cl, "Unknown") # Use .get for safety
-                    confidence = float(output[0][cl])
-
-                    # Add detected emotion to history
-                    emotion_history.append(label)
-                    # Optional: Limit history size
-                    max_history = 50
-                    if len(emotion_history) > max_history:
-                        emotion_history.pop(0) # Remove oldest entry
-
-                    logger.info(f"Detected emotion: {label} (Confidence: {confidence:.4f})")
-                    return jsonify({
-                        "emotion": label,
-                        "confidence": confidence,
-                        "box": [int(startX), int(startY), int(endX), int(endY)]
-                    })
-
-                except Exception as model_err:
-                    logger.exception("Error during emotion model prediction:")
-                    return jsonify({"message": f"Emotion prediction error: {model_err}"}), 500
-            else:
-                # No face detected, don't add to history
-                logger.info("No face detected in image")
-                # Return neutral emotion or a specific "no face" indicator?
-                # Returning "Neutral" might skew RL if no face is common.
-                # Returning a specific message allows frontend to handle it.
-                return jsonify({"message": "No face detected"}), 200 # 200 OK, but no detection
+        session_id = get_session_id()
+        try:
+            result = get_emotion_pipeline().process_frame(filestr, session_id)
+        except PipelineError as pe:
+            logger.warning(f"Face detection failed: {pe.message}")
+            return jsonify({"message": pe.message}), pe.status
+
+        if result is None:
+            # No face detected, don't add to history
+            logger.info("No face detected in image")
+            # Return neutral emotion or a specific "no face" indicator?
+            # Returning "Neutral" might skew RL if no face is common.
+            # Returning a specific message allows frontend to handle it.
+            return jsonify({"message": "No face detected"}), 200 # 200 OK, but no detection
+
+        label = result["emotion"]
+        # Add detected emotion to this user's history (bounded by EMOTION_HISTORY_MAX)
+        record_emotion(session_id, label)
+
+        logger.info(f"Detected emotion: {label} (Confidence: {result['confidence']:.4f})")
+        with stage_timer('http.jsonify'):
+            response = jsonify(result)
+        return response
 
     except Exception as e:
         logger.exception("Error in face detection route:")
         return jsonify({"message": f"Server error during face detection: {str(e)}"}), 500
 
+@sock.route('/ws/facedetection')
+def face_detection_stream(ws):
+    """
+    Persistent alternative to POST /facedetection for a continuous webcam stream.
+
+    Connect with ?token=<jwt> (browsers can't set headers on a WebSocket) or ?session_id=...,
+    then send each frame as a binary JPEG/PNG message. Every processed frame is answered
+    with a JSON text message: {"type": "result", "emotion", "confidence", "box", ...},
+    {"type": "no_face"} or {"type": "error", "message", "status"}, each with the frame's
+    `seq`, `latency_ms` and the running `dropped` count. Frames that arrive while the
+    previous one is still being processed replace each other, so only the newest is run.
+    Any text message is answered with the stream's counters.
+    """
+    token = request.args.get('token')
+    email = None
+    if token:
+        try:
+            email = user_cache.claims(token).get('email')
+        except jwt.InvalidTokenError:
+            ws.close(reason=1008, message='Token is invalid!')
+            return
+    session_id = email or request.args.get('session_id') or request.remote_addr
+    pipeline = get_emotion_pipeline()
+    stream = FrameStream(
+        lambda frame: pipeline.process_frame(frame, session_id),
+        ws.send,
+        # Same bookkeeping as face_detection_route
+        on_result=lambda result: record_emotion(session_id, result['emotion']),
+    )
+    logger.info(f"Face detection stream opened for session {session_id}")
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, (bytes, bytearray)):
+                if message:
+                    stream.receive(bytes(message))
+            elif message is not None:
+                stream.push(json.dumps({'type': 'stats', 'received': stream.received,
+                                         'processed': stream.processed, 'dropped': stream.dropped}))
+    except ConnectionClosed:
+        pass
+    finally:
+        stream.close()
+        logger.info(f"Face detection stream closed for session {session_id}: {stream.received} frames received, "
+                    f"{stream.processed} processed, {stream.dropped} dropped")
+
 # --- RL Action Endpoint ---
 @app.route('/rl_action', methods=['POST'])
 def rl_action():
@@ -457,25 +600,31 @@ def rl_action():
         request_data = request.get_json(silent=True) or {}
         user_context = request_data.get("context", None) # e.g., "Lesson 3: Addition"
         
-        logger.info(f"RL Action Triggered. Emotion History Length: {len(emotion_history)}. Context: {user_context}")
-        
         # --- State Determination ---
         required_entries = 5 # Number of recent emotions to consider
-        if len(emotion_history) < required_entries:
-            logger.warning(f"Not enough emotion data for RL action. Need {required_entries}, have {len(emotion_history)}. Using default.")
+        session_id = get_session_id()
+        with stage_timer('emotion_history.recent'):
+            last_entries = emotion_history.recent(session_id, required_entries)
+        logger.info(f"RL Action Triggered. Recent emotions: {len(last_entries)}. Context: {user_context}")
+
+        if len(last_entries) < required_entries:
+            logger.warning(f"Not enough emotion data for RL action. Need {required_entries}, have {len(last_entries)}. Using default.")
             current_state = "Neutral" # Default state if not enough data
             # Decide on a default action or just generate neutral dialogue
             action = "Proceed normally" # Or another safe default
-            avatar_message = generate_dialogue(action, current_state, user_context)
+            try:
+                avatar_message = dialogue_cache.get(action, current_state, user_context)
+            except Exception as gen_err:
+                logger.error(f"Dialogue generation failed: {str(gen_err)}")
+                avatar_message = dialogue_cache.fallback(action, current_state)
             return jsonify({
                 "state": current_state,
                 "action": action, # Default action
                 "avatar_message": avatar_message or "Let's keep going!", # Use fallback if generation failed
-                "warning": f"Using default state/action due to insufficient emotion data ({len(emotion_history)}/{required_entries})."
+                "warning": f"Using default state/action due to insufficient emotion data ({len(last_entries)}/{required_entries})."
             }), 200
         
         # Use the last 'required_entries' emotions
-        last_entries = emotion_history[-required_entries:]
         emotion_counter = Counter(last_entries)
         # Determine the most frequent emotion as the current state
         if emotion_counter:
@@ -487,11 +636,14 @@ def rl_action():
         # --- Action Selection ---
         action = rl_agent.choose_action(current_state) # Your RL agent chooses
         logger.info(f"RL Action determined: State='{current_state}', Action='{action}'")
+        if rl_transitions is not None:
+            # Completed by the next emotions this session reports, see record_emotion()
+            rl_transitions.record_action(session_id, current_state, action)
         
         # --- Generate Dialogue using the new function ---
         # Generate dialogue based on the selected action and emotional state
-        action = rl_agent.choose_action(current_state)
-        avatar_message = generate_dialgoue_client_sdk(action, current_state, user_context=None)
+        with stage_timer('dialogue'):
+            avatar_message = dialogue_cache.get(action, current_state, user_context)
         # --- Prepare Response ---
         response_data = {
             "state": current_state,
@@ -512,6 +664,88 @@ def rl_action():
             "avatar_message": "Oops! Something went wrong on my end. Let's try that again.",
             "error": f"Internal server error: {str(e)}"
         }), 500 # Internal Server Error status
+
+
+@app.route('/rl_action/cache-stats', methods=['GET'])
+def dialogue_cache_stats():
+    """Hit/miss counters of the avatar dialogue cache in this worker."""
+    return jsonify(dialogue_cache.stats()), 200
+
+@app.route('/gemini/stats', methods=['GET'])
+def gemini_stats():
+    """Latency, in-flight and retry counters of the shared Gemini client in this worker."""
+    return jsonify(get_gemini_client().stats()), 200
+
+@app.route('/auth/stats', methods=['GET'])
+def auth_stats():
+    """Hit rates of the token and user caches behind token_required in this worker."""
+    return jsonify({**user_cache.stats(), 'trust_claims': AUTH_TRUST_CLAIMS}), 200
+
+@app.route('/facedetection/stats', methods=['GET'])
+def face_detection_stats():
+    """Face tracking counters: FaceMesh runs skipped and the time that saved (EMOTION_FACE_TRACKING)."""
+    # Like /ready, never import the pipeline just to report on it
+    pipeline_module = sys.modules.get('EmotionDetection.pipeline')
+    if pipeline_module is None:
+        return jsonify({'enabled': None, 'message': 'Emotion pipeline not loaded yet'}), 200
+    return jsonify(pipeline_module.emotion_pipeline.tracking_stats()), 200
+
+# --- Metrics ---
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # The URL rule, not the path, so /ld-jobs/<job_id> stays one series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+def pipeline_metrics():
+    pipeline_module = sys.modules.get('EmotionDetection.pipeline')
+    if pipeline_module is None:
+        return None
+    pipeline = pipeline_module.emotion_pipeline
+    stats = {'ready': pipeline.ready, 'sessions': len(pipeline.sessions), 'tracking': pipeline.tracking_stats()}
+    if pipeline._backbone_batcher is not None:
+        stats['backbone_batcher'] = pipeline._backbone_batcher.stats()
+    return stats
+
+# The JSON stats endpoints above, as gauges on /metrics
+metrics_registry.register_collector('dialogue_cache', dialogue_cache.stats)
+metrics_registry.register_collector('gemini', lambda: get_gemini_client().stats())
+metrics_registry.register_collector('auth_cache', user_cache.stats)
+metrics_registry.register_collector('emotion_pipeline', pipeline_metrics)
+metrics_registry.register_collector('rl_agent', rl_agent.stats)
+if rl_transitions is not None:
+    metrics_registry.register_collector('rl_transitions', rl_transitions.stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text format: per-stage timings (app_stage_seconds), request latency by route
+    (app_http_request_seconds) and the cache/Gemini/pipeline counters, for this worker
+    process. METRICS_ENABLED=off stops the timing but keeps the counters.
+    """
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+# --- Readiness Endpoint ---
+@app.route('/ready', methods=['GET'])
+def ready():
+    """200 once the emotion models are loaded and warmed up, 503 before that."""
+    # Only look at modules that are already imported; a readiness probe must not load torch
+    model_module = sys.modules.get('EmotionDetection.model')
+    pipeline_module = sys.modules.get('EmotionDetection.pipeline')
+    pipeline_ready = pipeline_module is not None and pipeline_module.emotion_pipeline.ready
+    status = {
+        'ready': pipeline_ready,
+        'models_loaded': model_module is not None and model_module.models_loaded(),
+    }
+    return jsonify(status), 200 if pipeline_ready else 503
+
 # --- Main Execution ---
 if __name__ == '__main__':
     logger.info("Starting Flask application")
@@ -519,7 +753,11 @@ if __name__ == '__main__':
         # Use environment variables for host/port if available, else default
         host = os.getenv('FLASK_RUN_HOST', '0.0.0.0')
         port = int(os.getenv('FLASK_RUN_PORT', 5000))
-        debug_mode = os.getenv('FLASK_DEBUG', 'True').lower() in ['true', '1', 't']
+        # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`
+        debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() in ['true', '1', 't']
+        # With the debug reloader only the child process serves requests
+        if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            init_worker()
         app.run(debug=debug_mode, host=host, port=port)
     except Exception as e:
         logger.critical(f"Failed to start Flask application: {str(e)}", exc_info=True) # Log critical error with traceback
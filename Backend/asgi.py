@@ -0,0 +1,302 @@
+"""
+Async variant of the user and assessment routes (/register, /login, /save-assessment and
+/assessments) on Quart, with PyMongo's native AsyncMongoClient instead of flask_pymongo.
+
+    cd Backend && hypercorn asgi:app --bind 0.0.0.0:5001 --workers 2
+
+A request waiting on Mongo doesn't hold a thread: one process keeps hundreds of them in
+flight on its event loop, where the Flask app under gunicorn has one thread each.
+Concurrent /save-assessment inserts, which carry the emotion data, are grouped into
+insert_many() round trips (mongo_async.BatchedInserter). Password hashing and disk
+writes run on the default thread pool so they don't stall the loop.
+
+Route these four paths to this server and everything else to gunicorn (wsgi.py). The
+webcam routes that fill the emotion history stay in the Flask app, so both need a shared
+EMOTION_HISTORY_BACKEND (mongo or redis). LD analysis jobs use the same LDAnalysisQueue,
+with a blocking client of its own on its thread pool.
+"""
+import asyncio
+import logging
+import os
+from functools import wraps
+from urllib.parse import urlencode
+
+import jwt
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient, MongoClient
+from quart import Quart, Response, jsonify, request
+from werkzeug.security import check_password_hash
+
+from assessments import new_user_document, token_claims, build_assessment, page_query, split_page, ASSESSMENTS_SORT
+from emotion_store import create_emotion_history_store
+from gemini_analyzer import identify, identify_fake
+from ld_jobs import LDAnalysisQueue
+from metrics import registry as metrics_registry, stage_timer, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from mongo_async import BatchedInserter
+from user_cache import UserCache, AUTH_TRUST_CLAIMS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+app = Quart(__name__)
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
+app.config["MONGO_URI"] = os.getenv("MONGO_URI", "mongodb://localhost:27017/main_project")
+
+# Blocking client for the emotion history store and the LD job threads; connects on first use
+sync_db = MongoClient(app.config["MONGO_URI"], connect=False).get_default_database()
+emotion_history = create_emotion_history_store(mongo_db=sync_db)
+ld_analysis_queue = LDAnalysisQueue(
+    sync_db.assessments,
+    identify_fake if os.getenv('GEMINI_FAKE', 'False').lower() in ['true', '1', 't'] else identify
+)
+# Token claims only; user documents are looked up with the async client, see load_user()
+user_cache = UserCache(
+    load_user=None,
+    decode_token=lambda token: jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"]),
+)
+
+# Set by use_database(): the async database and the batched inserts into its assessments
+db = None
+assessment_inserts = None
+
+
+def use_database(database):
+    """Serve from `database`, an AsyncDatabase (or a stand-in with the same async methods)."""
+    global db, assessment_inserts
+    db = database
+    assessment_inserts = BatchedInserter(database.assessments)
+
+
+@app.before_serving
+async def connect():
+    # The client belongs to the event loop it is first used on, so it is made on the serving loop
+    use_database(AsyncMongoClient(app.config["MONGO_URI"]).get_default_database())
+    ld_analysis_queue.start_recovery()
+
+
+@app.after_request
+async def add_cors_headers(response):
+    # What flask_cors does for the Flask app: any origin, pagination headers exposed
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor, Link'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get('Access-Control-Request-Headers', '*')
+    return response
+
+
+async def load_user(email):
+    """The user document for `email` without the password hash, through user_cache's TTL cache."""
+    user = user_cache.users.get(email)
+    if user is None:
+        with stage_timer('mongo.find_user'):
+            user = await db.users.find_one({'email': email}, {'password': 0})
+        if user is not None:
+            user_cache.users.put(email, user)
+    return dict(user) if user is not None else None
+
+
+def get_bearer_token():
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header:
+        parts = auth_header.split(" ")
+        if len(parts) == 2:
+            return parts[1]
+    return None
+
+
+def authenticate(f, trust_claims):
+    """app.authenticate for async views."""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        token = get_bearer_token()
+
+        if not token:
+            logger.warning("Token is missing in request")
+            return jsonify({'message': 'Token is missing!'}), 401
+
+        try:
+            with stage_timer('auth.verify'):
+                data = user_cache.claims(token)
+                if trust_claims and data.get('uid'):
+                    current_user = {'_id': ObjectId(data['uid']), 'email': data['email'], 'username': data.get('username', '')}
+                else:
+                    current_user = await load_user(data['email'])
+            if not current_user:
+                logger.warning(f"User not found for email: {data['email']}")
+                return jsonify({'message': 'User not found!'}), 401
+        except jwt.ExpiredSignatureError:
+            logger.warning("Expired token received")
+            return jsonify({'message': 'Token has expired!'}), 401
+        except jwt.InvalidTokenError:
+            logger.warning("Invalid token received")
+            return jsonify({'message': 'Token is invalid!'}), 401
+        except Exception as e:
+            logger.error(f"Token validation error: {str(e)}")
+            return jsonify({'message': 'Token validation failed!'}), 401
+
+        return await f(current_user, *args, **kwargs)
+
+    return decorated
+
+
+def token_required(f):
+    return authenticate(f, trust_claims=False)
+
+
+def claims_required(f):
+    return authenticate(f, trust_claims=AUTH_TRUST_CLAIMS)
+
+
+@app.route('/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    if not data or not data.get('email') or not data.get('password'):
+        logger.warning("Missing required fields in registration")
+        return jsonify({'message': 'Missing required fields'}), 400
+
+    with stage_timer('mongo.find_user'):
+        existing = await db.users.find_one({'email': data['email']})
+    if existing:
+        logger.warning(f"User already exists: {data['email']}")
+        return jsonify({'message': 'User already exists'}), 409
+
+    new_user = await asyncio.to_thread(new_user_document, data)
+
+    try:
+        with stage_timer('mongo.insert_user'):
+            await db.users.insert_one(new_user)
+        user_cache.invalidate(data['email'])
+        logger.info(f"New user registered: {data['email']}")
+        return jsonify({'message': 'User registered successfully'}), 201
+    except Exception as e:
+        logger.error(f"Registration failed for {data['email']}: {str(e)}")
+        return jsonify({'message': 'Registration failed'}), 500
+
+
+@app.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    if not data or not data.get('email') or not data.get('password'):
+        logger.warning("Missing credentials in login attempt")
+        return jsonify({'message': 'Missing required fields'}), 400
+
+    with stage_timer('mongo.find_user'):
+        user = await db.users.find_one({'email': data['email']})
+    with stage_timer('auth.password_check'):
+        valid = user is not None and await asyncio.to_thread(check_password_hash, user['password'], data['password'])
+    if not valid:
+        logger.warning(f"Invalid login attempt for {data['email']}")
+        return jsonify({'message': 'Invalid credentials'}), 401
+
+    token = jwt.encode(token_claims(user), app.config['SECRET_KEY'], algorithm="HS256")
+
+    logger.info(f"User logged in: {data['email']}")
+    return jsonify({'token': token}), 200
+
+
+@app.route('/save-assessment', methods=['POST'])
+@token_required
+async def save_assessment(current_user):
+    logger.info(f"Received assessment save request from {current_user['email']}")
+
+    if not request.is_json:
+        logger.error("Request is not JSON")
+        return jsonify({'message': 'Request must be JSON'}), 400
+
+    with stage_timer('http.parse_json'):
+        data = await request.get_json()
+    if not data:
+        logger.error("No data provided in request")
+        return jsonify({'message': 'No data provided'}), 400
+
+    def prepare():
+        # One trip to the thread pool: the history read may block (mongo/redis) and an
+        # inline handwriting image is written to disk
+        return build_assessment(current_user, data, emotion_history.snapshot(current_user['email']))
+
+    try:
+        assessment_data, analysis_input, ld_job, image_filename = await asyncio.to_thread(prepare)
+
+        try:
+            with stage_timer('mongo.insert_assessment'):
+                inserted_id = await assessment_inserts.insert(assessment_data)
+        except Exception as e:
+            logger.error(f"Database save failed: {str(e)}")
+            return jsonify({
+                'message': 'Failed to save assessment to database',
+                'error': str(e)
+            }), 500
+        logger.info(f"Assessment saved with ID: {inserted_id}")
+
+        # Stored from here on; see app.save_assessment
+        try:
+            await asyncio.to_thread(emotion_history.clear, current_user['email'])
+        except Exception as e:
+            logger.error(f"Could not clear the emotion history of {current_user['email']}: {str(e)}")
+        try:
+            with stage_timer('ld_queue.submit'):
+                ld_analysis_queue.submit(ld_job['id'], analysis_input)
+            logger.info(f"Queued LD analysis job {ld_job['id']}")
+        except Exception as e:
+            logger.error(f"Could not submit LD analysis job {ld_job['id']}, left for recovery: {str(e)}")
+
+        return jsonify({
+            'message': 'Assessment saved, LD analysis queued',
+            'assessmentId': str(inserted_id),
+            'jobId': ld_job['id'],
+            'statusUrl': f"/ld-jobs/{ld_job['id']}",
+            'image_saved': image_filename is not None
+        }), 202
+
+    except Exception as e:
+        logger.exception("Unexpected error in save_assessment:")
+        return jsonify({
+            'message': 'An unexpected error occurred during assessment saving',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/assessments', methods=['GET'])
+@claims_required
+async def get_user_assessments(current_user):
+    """The user's assessments, newest first, one page at a time; see app.get_user_assessments."""
+    try:
+        query, projection, limit = page_query(request.args, str(current_user['_id']))
+    except ValueError as e:
+        return jsonify({'message': f'Invalid query parameters: {str(e)}'}), 400
+
+    try:
+        cursor = db.assessments.find(query, projection).sort(ASSESSMENTS_SORT).limit(limit + 1)
+        with stage_timer('mongo.find_assessments'):
+            assessments = await cursor.to_list(None)
+        assessments, next_cursor = split_page(assessments, limit)
+
+        logger.info(f"Retrieved {len(assessments)} assessments for user {current_user['email']}")
+        response = jsonify(assessments)
+        if next_cursor:
+            next_args = request.args.to_dict()
+            next_args['cursor'] = next_cursor
+            next_url = f"{request.base_url}?{urlencode(next_args)}"
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response, 200
+    except Exception as e:
+        logger.exception(f"Error fetching assessments for user {current_user['email']}:")
+        return jsonify({'message': 'Failed to fetch assessments', 'error': str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus text format: this process's stage timings and batched insert counters."""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+metrics_registry.register_collector('assessment_inserts', lambda: assessment_inserts.stats() if assessment_inserts else None)
+metrics_registry.register_collector('auth_cache', user_cache.stats)
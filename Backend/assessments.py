@@ -0,0 +1,235 @@
+import base64
+import datetime
+import json
+import logging
+import os
+import re
+
+from bson import ObjectId
+from werkzeug.security import generate_password_hash
+
+from emotion_codec import pack_assessment, unpack_assessment, analysis_view, PACKED_FIELDS
+from image_store import handwriting_store
+from ld_jobs import LDAnalysisQueue
+from metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+# The request-independent parts of the user and assessment routes, shared by the Flask
+# app (app.py, blocking PyMongo) and the async variant (asgi.py, AsyncMongoClient)
+
+ASSESSMENTS_PAGE_SIZE = int(os.getenv('ASSESSMENTS_PAGE_SIZE', 20))
+ASSESSMENTS_MAX_PAGE_SIZE = 100
+# view=summary: enough for a history list, without the emotion arrays or the full LD report
+ASSESSMENT_SUMMARY_FIELDS = [
+    'created_at', 'completedAt', 'userEmail',
+    'numberComparison.summary', 'letterArrangement.accuracy',
+    'ld_job.status', 'gemini_response.learningDisabilities',
+]
+FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+# Newest first. Served by the (userId, created_at, _id) index; assessments saved before
+# userId was stored need `python -m migrations.backfill_assessment_user_id` once
+ASSESSMENTS_SORT = [("created_at", -1), ("_id", -1)]
+TOKEN_LIFETIME = datetime.timedelta(hours=24)
+# 'columnar' stores emotions/emotionTrackingData packed (emotion_codec); 'raw' as posted
+EMOTION_STORAGE = os.getenv('EMOTION_STORAGE', 'columnar').lower()
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def new_user_document(data):
+    """The users document for a /register body that has email and password (hashes the password)."""
+    with stage_timer('auth.password_hash'):
+        password_hash = generate_password_hash(data['password'])
+    return {
+        'username': data.get('username', ''),
+        'email': data['email'],
+        'password': password_hash,
+        'created_at': _now().isoformat()
+    }
+
+
+def token_claims(user):
+    """JWT claims for a user who just logged in."""
+    return {
+        'email': user['email'],
+        # Lets claims_required routes skip the user lookup (AUTH_TRUST_CLAIMS)
+        'uid': str(user['_id']),
+        'username': user.get('username', ''),
+        'exp': _now() + TOKEN_LIFETIME
+    }
+
+
+def _store_inline_image(handwriting):
+    """Save a base64 data URL handwriting image; sets imageData/imageHash and returns the stored path or None."""
+    try:
+        logger.info("Processing handwriting image")
+        image_string = handwriting['imageData']
+
+        if not image_string or not isinstance(image_string, str) or not image_string.startswith('data:image'):
+            logger.warning("Invalid image data format received")
+            raise ValueError("Invalid image data format")
+
+        # Extract base64 data correctly
+        header, encoded = image_string.split(",", 1)
+
+        try:
+            image_data = base64.b64decode(encoded)
+        except base64.binascii.Error as b64_error:
+            logger.error(f"Invalid base64 image data: {b64_error}")
+            raise ValueError("Invalid base64 image data")
+
+        # Same content-addressed storage as POST /handwriting
+        with stage_timer('handwriting.store'):
+            stored = handwriting_store.save_bytes(image_data)
+
+        # Store only the path relative to uploads/ in the database, not base64
+        handwriting['imageData'] = stored['path']
+        handwriting['imageHash'] = stored['hash']
+        logger.info(f"Handwriting image saved as {stored['path']}")
+        return stored['path']
+
+    except ValueError as ve:
+        logger.error(f"Error processing handwriting image data: {ve}")
+    except Exception:
+        logger.exception("Unexpected error processing handwriting image:")  # Log full traceback
+    handwriting['imageData'] = None  # Ensure it's None if saving failed
+    return None
+
+
+def build_assessment(current_user, data, emotions):
+    """
+    The assessment document for a /save-assessment body, with its LD analysis job.
+
+    The handwriting image is either uploaded beforehand via POST /handwriting and referenced
+    by `imageHash`, or inline as a base64 data URL, which is stored here (a disk write).
+
+    Parameters:
+        current_user (dict): The logged-in user.
+        data (dict): The request body; its `handwriting` entry is updated in place.
+        emotions (list): The user's emotion history at assessment time.
+
+    Returns:
+        (dict, dict, dict, str): The document to insert, the LD analysis input, its `ld_job`
+        and the stored image path (None without an image).
+    """
+    assessment_data = {
+        'userId': str(current_user['_id']),
+        'userEmail': current_user['email'],
+        'created_at': _now().isoformat(),
+        'emotions': emotions
+    }
+
+    image_filename = None
+    handwriting = data.get('handwriting')
+    if handwriting and handwriting.get('imageHash'):
+        image_filename = handwriting_store.find(handwriting['imageHash'])
+        if image_filename is None:
+            logger.warning(f"Unknown handwriting image hash: {handwriting['imageHash']}")
+            handwriting['imageHash'] = None
+        handwriting['imageData'] = image_filename
+    elif handwriting and handwriting.get('imageData'):
+        image_filename = _store_inline_image(handwriting)
+
+    assessment_data.update({
+        'numberComparison': data.get('numberComparison'),
+        'handwriting': handwriting,  # Now contains filename or None
+        'letterArrangement': data.get('letterArrangement'),
+        'completedAt': data.get('completedAt'),  # Assuming frontend sends this
+        'emotionTrackingData': data.get('emotionTrackingData', [])  # Ensure default if missing
+    })
+
+    # Gemini LD identification runs in the background; `gemini_response` is filled in when it finishes
+    analysis_input = analysis_view(assessment_data)
+    if EMOTION_STORAGE == 'columnar':
+        with stage_timer('emotion_codec.pack'):
+            pack_assessment(assessment_data)
+    ld_job = LDAnalysisQueue.new_job()
+    assessment_data['gemini_response'] = None
+    assessment_data['ld_job'] = ld_job
+    return assessment_data, analysis_input, ld_job, image_filename
+
+
+def encode_cursor(assessment):
+    """Opaque cursor pointing just past `assessment` in (created_at, _id) descending order."""
+    raw = json.dumps([assessment['created_at'], str(assessment['_id'])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """The query clause selecting assessments after `cursor`; raises ValueError if it is malformed."""
+    try:
+        created_at, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        last_id = ObjectId(last_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': last_id}},
+    ]}
+
+
+def assessment_projection(args):
+    """
+    Mongo projection for /assessments from `view=summary` or `fields=a,b.c`; None means full documents.
+    Raises ValueError for unknown views, field names that aren't plain (dotted) identifiers,
+    paths into the packed emotion fields and paths that overlap another one (`a` and `a.b`,
+    or anything under the always returned `_id` and `created_at`), which Mongo rejects as
+    a path collision.
+    """
+    fields = args.get('fields')
+    view = args.get('view', 'full')
+    if fields:
+        names = [f.strip() for f in fields.split(',') if f.strip()]
+        if not names or not all(FIELD_NAME.match(n) for n in names):
+            raise ValueError("fields must be a comma-separated list of field names")
+        if any(n.startswith(f'{packed}.') for n in names for packed in PACKED_FIELDS):
+            raise ValueError(f"{' and '.join(PACKED_FIELDS)} can only be requested whole")
+        names = list(dict.fromkeys(names))
+        paths = names + ['_id', 'created_at']
+        for name in names:
+            parent = next((p for p in paths if name.startswith(f'{p}.') or p.startswith(f'{name}.')), None)
+            if parent is not None:
+                raise ValueError(f"fields {name} and {parent} overlap")
+    elif view == 'summary':
+        names = ASSESSMENT_SUMMARY_FIELDS
+    elif view == 'full':
+        return None
+    else:
+        raise ValueError("view must be 'full' or 'summary'")
+    # created_at is always returned so the next cursor can be built
+    return {name: 1 for name in dict.fromkeys(names + ['created_at'])}
+
+
+def page_query(args, user_id):
+    """
+    The /assessments query for the request's arguments; raises ValueError for invalid ones.
+
+    Returns:
+        (dict, dict, int): Query, projection and page size. Fetch limit + 1 documents,
+        sorted by ASSESSMENTS_SORT, so split_page() can tell whether there is a next page.
+    """
+    limit = min(max(int(args.get('limit', ASSESSMENTS_PAGE_SIZE)), 1), ASSESSMENTS_MAX_PAGE_SIZE)
+    projection = assessment_projection(args)
+    query = {'userId': user_id}
+    if args.get('cursor'):
+        query.update(decode_cursor(args['cursor']))
+    return query, projection, limit
+
+
+def split_page(assessments, limit):
+    """
+    The page to return out of the limit + 1 fetched documents, with string ids and any
+    packed emotion fields the projection included decoded, and the cursor of the next
+    page (None on the last one).
+    """
+    has_more = len(assessments) > limit
+    assessments = assessments[:limit]
+    next_cursor = encode_cursor(assessments[-1]) if has_more else None
+    # Convert ObjectId to string for JSON serialization
+    for assessment in assessments:
+        assessment['_id'] = str(assessment['_id'])
+        unpack_assessment(assessment)
+    return assessments, next_cursor
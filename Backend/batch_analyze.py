@@ -0,0 +1,341 @@
+"""
+Offline emotion analysis of recorded lessons with the /facedetection pipeline
+(FaceMesh -> get_box -> preprocessing -> ResNet50 -> LSTM), one row per frame.
+
+Frames are read and decoded, faces found and crops preprocessed in a process pool, one
+chunk of frames per task. The main process runs the backbone in batches and the LSTM
+in frame order, and appends each finished chunk to the output. Only a few chunks are
+in flight at once, so memory stays flat however long the recording is. After every
+chunk a checkpoint is written next to the output, and re-running the same command
+continues from there.
+
+Run from Backend/:
+    python batch_analyze.py lesson.mp4 --out lesson_emotions.csv --every 5
+    python batch_analyze.py frames/ --out frames_emotions.parquet --workers 4
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from EmotionDetection.errors import PipelineError
+from EmotionDetection.labels import DICT_EMO
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+LABELS = [DICT_EMO[i] for i in sorted(DICT_EMO)]
+COLUMNS = ['source', 'frame', 'timestamp_ms', 'face', 'startX', 'startY', 'endX', 'endY',
+           'emotion', 'confidence'] + [f'p_{label}' for label in LABELS]
+# ParquetSink's per-chunk files, including a write interrupted before its rename
+PARQUET_PART = re.compile(r'^part-(\d+)\.parquet(\.tmp)?$')
+
+# Set per worker process by _init_worker
+_worker_pipeline = None
+
+
+def _init_worker(track):
+    global _worker_pipeline
+    import torch
+    from EmotionDetection.face_mesh_pool import FaceMeshPool
+    from EmotionDetection.pipeline import EmotionPipeline
+    from EmotionDetection.temporal import TemporalSessionStore
+    from EmotionDetection.tracking import FaceTracker
+
+    # The pool already uses every core; intra-op threads would only fight over them
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    _worker_pipeline = EmotionPipeline(face_meshes=FaceMeshPool(size=1), sessions=TemporalSessionStore(),
+                                       tracker=FaceTracker() if track else None)
+
+
+def _prepare_frame(frame_bgr):
+    """(box, preprocessed face as float32 (3, 224, 224)) for one BGR frame, or (None, None)."""
+    img_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+    try:
+        box = _worker_pipeline.locate_face(img_rgb, 'batch')
+    except PipelineError:
+        return None, None
+    if box is None:
+        return None, None
+    startX, startY, endX, endY = box
+    face = img_rgb[startY:endY, startX:endX]
+    if face.size == 0:
+        return None, None
+    return box, _worker_pipeline.preprocessor(face)[0].numpy().copy()
+
+
+def _video_frames(path, start, stop, every):
+    """(frame index, timestamp ms, BGR frame, path) for sampled frames start <= i < stop of a video."""
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for index in range(start, stop):
+            if index % every:
+                # grab() advances without decoding the frame
+                if not capture.grab():
+                    return
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield index, (1000.0 * index / fps) if fps else None, frame, path
+    finally:
+        capture.release()
+
+
+def process_chunk(task):
+    """
+    Worker task: decode, detect and preprocess one chunk of frames.
+
+    Returns:
+        dict: "rows" (per-frame metadata) and "faces" (float32 (n_faces, 3, 224, 224)),
+        plus "eof" when a video ran out before the end of the chunk.
+    """
+    rows, faces = [], []
+    # A worker's chunks needn't be adjacent, so no face track is carried from the previous one
+    _worker_pipeline.sessions.drop('batch')
+    if task['kind'] == 'video':
+        frames = _video_frames(task['source'], task['start'], task['stop'], task['every'])
+        expected = len(range(task['start'], task['stop'], task['every']))
+    else:
+        frames = ((i, None, cv2.imread(path), path) for i, path in task['paths'])
+        expected = len(task['paths'])
+
+    for index, timestamp, frame, source in frames:
+        box, face = (None, None) if frame is None else _prepare_frame(frame)
+        rows.append({'source': source, 'frame': index, 'timestamp_ms': timestamp, 'box': box})
+        if face is not None:
+            faces.append(face)
+    return {
+        'chunk': task['chunk'],
+        'rows': rows,
+        'faces': np.stack(faces) if faces else np.empty((0, 3, 224, 224), np.float32),
+        'eof': len(rows) < expected,
+    }
+
+
+def make_tasks(source, chunk_size, every):
+    """Chunk descriptors in frame order; small, so they can all be generated up front lazily."""
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source)
+                       if name.lower().endswith(IMAGE_EXTENSIONS))
+        sampled = list(enumerate(paths))[::every]
+        for chunk, start in enumerate(range(0, len(sampled), chunk_size)):
+            yield {'kind': 'images', 'source': source, 'chunk': chunk, 'paths': sampled[start:start + chunk_size]}
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {source}")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    capture.release()
+    span = chunk_size * every
+    chunk = 0
+    # Some containers report no frame count; then keep going until a worker reports eof
+    while total <= 0 or chunk * span < total:
+        start = chunk * span
+        yield {'kind': 'video', 'source': source, 'chunk': chunk, 'start': start, 'stop': start + span, 'every': every}
+        chunk += 1
+
+
+class Checkpoint:
+    def __init__(self, out):
+        """Progress of one output, stored atomically as <out>.checkpoint.json."""
+        self.path = f"{out}.checkpoint.json"
+        self.state = {'next_chunk': 0, 'rows': 0, 'csv_bytes': None, 'features': []}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    def save(self, **updates):
+        self.state.update(updates)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CsvSink:
+    def __init__(self, out, state):
+        """Append rows to one CSV; on resume, cut off anything written after the last checkpoint."""
+        self.out = out
+        resume_at = state.get('csv_bytes')
+        exists = resume_at is not None and os.path.exists(out)
+        self.file = open(out, 'r+' if exists else 'w', newline='')
+        if exists:
+            self.file.truncate(resume_at)
+            self.file.seek(resume_at)
+        self.writer = csv.DictWriter(self.file, COLUMNS)
+        if not exists:
+            self.writer.writeheader()
+
+    def write(self, chunk, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'csv_bytes': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    def __init__(self, out, state):
+        """
+        One Parquet file per chunk in the directory `out`, readable together as a dataset.
+        Parts from the checkpoint's next chunk on are removed: left over from a crashed run,
+        or from a previous run when starting over, they would be read as part of this one.
+        """
+        try:
+            import pyarrow  # optional dependency, only needed for Parquet output
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use a .csv --out instead")
+        self.pa = pyarrow
+        self.out = out
+        os.makedirs(out, exist_ok=True)
+        for name in os.listdir(out):
+            match = PARQUET_PART.match(name)
+            if match and int(match.group(1)) >= state['next_chunk']:
+                os.remove(os.path.join(out, name))
+
+    def write(self, chunk, rows):
+        table = self.pa.Table.from_pylist(rows, schema=self.pa.schema(
+            [('source', self.pa.string()), ('frame', self.pa.int64()), ('timestamp_ms', self.pa.float64()),
+             ('face', self.pa.bool_())]
+            + [(name, self.pa.int32()) for name in ('startX', 'startY', 'endX', 'endY')]
+            + [('emotion', self.pa.string()), ('confidence', self.pa.float32())]
+            + [(f'p_{label}', self.pa.float32()) for label in LABELS]))
+        path = os.path.join(self.out, f"part-{chunk:06d}.parquet")
+        self.pa.parquet.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        return {}
+
+    def close(self):
+        pass
+
+
+def classify_chunk(result, backbone, lstm_model, session, batch_size):
+    """Backbone in batches of `batch_size`, then the LSTM frame by frame; returns output rows."""
+    import torch
+    from EmotionDetection.temporal import classify_frame
+
+    faces = torch.from_numpy(result['faces'])
+    features = []
+    with torch.no_grad():
+        for start in range(0, len(faces), batch_size):
+            batch = backbone.extract_features(faces[start:start + batch_size])
+            features.append(torch.nn.functional.relu(batch))
+    features = torch.cat(features) if features else torch.empty((0, 512))
+
+    rows, next_face = [], 0
+    for meta in result['rows']:
+        row = {'source': meta['source'], 'frame': meta['frame'], 'timestamp_ms': meta['timestamp_ms'], 'face': meta['box'] is not None}
+        if meta['box'] is not None:
+            probs = classify_frame(session, features[next_face], lstm_model).detach().cpu().numpy()[0]
+            next_face += 1
+            cl = int(np.argmax(probs))
+            row.update(zip(('startX', 'startY', 'endX', 'endY'), (int(v) for v in meta['box'])))
+            row.update({'emotion': DICT_EMO.get(cl, "Unknown"), 'confidence': float(probs[cl])})
+            row.update({f'p_{label}': float(p) for label, p in zip(LABELS, probs)})
+        rows.append(row)
+    return rows
+
+
+def session_features(session):
+    """The LSTM window's frames, oldest first, so a resumed run continues with the same context."""
+    if session.buffer.count == 0:
+        return []
+    window = session.buffer.window()[0]
+    return window[-session.buffer.count:].tolist()
+
+
+def run(source, out, workers, chunk_size, batch_size, every, track):
+    import torch
+    from EmotionDetection.model import load_models
+    from EmotionDetection.temporal import TemporalSession, classify_frame
+
+    checkpoint = Checkpoint(out)
+    start_chunk = checkpoint.state['next_chunk']
+    rows_done = checkpoint.state['rows']
+    sink = (ParquetSink if out.endswith('.parquet') else CsvSink)(out, checkpoint.state)
+    if start_chunk:
+        logger.info(f"Resuming {out} at chunk {start_chunk} ({rows_done} frames already written)")
+
+    backbone, lstm_model = load_models()
+    session = TemporalSession()
+    for features in checkpoint.state.get('features', []):
+        classify_frame(session, torch.tensor(features), lstm_model)
+
+    tasks = (task for task in make_tasks(source, chunk_size, every) if task['chunk'] >= start_chunk)
+    started = time.perf_counter()
+    # Bounded number of chunks in flight: workers can't run ahead and fill memory
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(track,)) as executor:
+        pending = []
+        done = False
+        while not done:
+            while not done and len(pending) < max_pending:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append(executor.submit(process_chunk, task))
+            if not pending:
+                break
+            result = pending.pop(0).result()
+            rows = classify_chunk(result, backbone, lstm_model, session, batch_size)
+            progress = sink.write(result['chunk'], rows)
+            rows_done += len(rows)
+            checkpoint.save(next_chunk=result['chunk'] + 1, rows=rows_done,
+                            features=session_features(session), **progress)
+            elapsed = time.perf_counter() - started
+            logger.info(f"chunk {result['chunk']}: {rows_done} frames written, "
+                        f"{sum(r['face'] for r in rows)}/{len(rows)} with a face, {elapsed:.1f}s")
+            if result['eof']:
+                done = True
+        for future in pending:
+            future.cancel()
+    sink.close()
+    checkpoint.remove()
+    return rows_done
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="video file, or a directory of frame images (processed in name order)")
+    parser.add_argument('--out', required=True, help="output .csv file, or .parquet directory (needs pyarrow)")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--chunk-size', type=int, default=64, help="frames per worker task and per checkpoint")
+    parser.add_argument('--batch-size', type=int, default=32, help="faces per backbone forward pass")
+    parser.add_argument('--every', type=int, default=1, help="only analyse every Nth frame")
+    parser.add_argument('--track', action='store_true', help="reuse face boxes between FaceMesh runs (see EMOTION_FACE_TRACKING)")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore an existing checkpoint and start over, replacing the output")
+    args = parser.parse_args()
+
+    if args.restart:
+        Checkpoint(args.out).remove()
+    started = time.perf_counter()
+    frames = run(args.source, args.out, args.workers, args.chunk_size, args.batch_size, args.every, args.track)
+    elapsed = time.perf_counter() - started
+    print(f"{frames} frames written to {args.out} in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
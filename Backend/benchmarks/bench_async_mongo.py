@@ -0,0 +1,256 @@
+"""
+The user and assessment routes on the Flask app (blocking PyMongo, one thread per request)
+against the Quart variant in asgi.py (AsyncMongoClient, requests multiplexed on one event
+loop, /save-assessment inserts grouped into insert_many() round trips).
+
+    sync:   app.py through Flask test clients on --threads threads (WSGI_THREADS per worker)
+    async:  asgi.py through the Quart test client, --concurrency requests in flight
+
+Mongo is mongomock behind a stand-in that sleeps --db-latency-ms per round trip (time.sleep
+for the blocking path, asyncio.sleep for the async one) and counts the round trips, so the
+numbers reflect waiting on the network rather than mongomock's own speed. LD analysis jobs
+are only recorded, not run: on mongomock every job update scans the whole collection, and
+those threads would take the GIL from the event loop far more than real jobs waiting on
+Gemini do.
+
+Per route it reports latency, requests/s and Mongo round trips per request; with batching
+the async /save-assessment needs fewer than one. /login and /register are bound by the
+password hash (CPU, on the thread pool either way), so both paths top out at the same rate.
+
+Run from Backend/:
+    python -m benchmarks.bench_async_mongo --requests 200 --db-latency-ms 2 --concurrency 8 64 256
+"""
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.common import summarize
+from benchmarks.suite import Fixtures, assessment_payload
+
+PASSWORD = 'bench-password'
+
+
+class RoundTrips:
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+
+class SyncCursor:
+    def __init__(self, cursor, trips):
+        self._cursor = cursor
+        self._trips = trips
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    def __iter__(self):
+        # One batch is enough for a page of assessments
+        self._trips.add()
+        time.sleep(self._trips.latency)
+        return iter(list(self._cursor))
+
+
+class SyncCollection:
+    """A mongomock collection that sleeps like a blocking driver waiting on the server."""
+
+    def __init__(self, collection, trips):
+        self._collection = collection
+        self._trips = trips
+
+    def find(self, *args, **kwargs):
+        return SyncCursor(self._collection.find(*args, **kwargs), self._trips)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        def call(*args, **kwargs):
+            self._trips.add()
+            time.sleep(self._trips.latency)
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncCursor(SyncCursor):
+    def __iter__(self):
+        raise TypeError("use to_list()")
+
+    async def to_list(self, length=None):
+        self._trips.add()
+        await asyncio.sleep(self._trips.latency)
+        documents = list(self._cursor)
+        return documents if length is None else documents[:length]
+
+
+class AsyncCollection(SyncCollection):
+    """The same with AsyncCollection's coroutine methods: the wait yields to the event loop."""
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs), self._trips)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            self._trips.add()
+            await asyncio.sleep(self._trips.latency)
+            return method(*args, **kwargs)
+        return call
+
+
+class RecordedJobs:
+    """Takes LDAnalysisQueue.submit() calls and leaves the jobs queued."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, job_id, assessment_data):
+        self.submitted += 1
+        return job_id
+
+
+class StandInDatabase:
+    def __init__(self, database, collection_class, trips):
+        self._database = database
+        self._collection_class = collection_class
+        self._trips = trips
+
+    def __getattr__(self, name):
+        return self._collection_class(self._database[name], self._trips)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def route_requests(headers, payload):
+    """(route, method, path, body factory, headers, expected statuses) for each benchmarked route."""
+    emails = itertools.count()
+    return [
+        # First, so every configuration pages through the same collection
+        ('assessments', 'GET', '/assessments?view=summary&limit=20', None, headers, (200,)),
+        ('save_assessment', 'POST', '/save-assessment', lambda: payload, headers, (202,)),
+        ('login', 'POST', '/login', lambda: {'email': 'bench-login@example.com', 'password': PASSWORD}, {}, (200,)),
+        ('register', 'POST', '/register',
+         lambda: {'email': f'bench-register-{next(emails)}@example.com', 'password': PASSWORD}, {}, (201,)),
+    ]
+
+
+def request_body(body):
+    return {'json': body()} if body else {}
+
+
+def run_sync(backend, route, n, threads):
+    name, method, path, body, headers, statuses = route
+    local = threading.local()
+    counter = itertools.count()
+
+    def worker():
+        if not hasattr(local, 'client'):
+            local.client = backend.app.test_client()
+        latencies = []
+        while next(counter) < n:
+            start = time.perf_counter()
+            response = local.client.open(path, method=method, headers=headers, **request_body(body))
+            assert response.status_code in statuses, f"{name}: {response.status_code}"
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = [pool.submit(worker) for _ in range(threads)]
+        latencies = [latency for future in results for latency in future.result()]
+    return summarize(latencies, wall_time=time.perf_counter() - start)
+
+
+async def run_async(asgi, route, n, concurrency):
+    name, method, path, body, headers, statuses = route
+    client = asgi.app.test_client()
+    counter = itertools.count()
+    latencies = []
+
+    async def worker():
+        while next(counter) < n:
+            start = time.perf_counter()
+            response = await client.open(path, method=method, headers=headers, **request_body(body))
+            assert response.status_code in statuses, f"{name}: {response.status_code}"
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, wall_time=time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="requests per route and configuration")
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help="simulated Mongo round trip")
+    parser.add_argument('--threads', type=int, default=8, help="request threads of the blocking path")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 64, 256],
+                        help="requests in flight on the async path")
+    parser.add_argument('--routes', nargs='+', default=None, help="subset of save_assessment assessments login register")
+    args = parser.parse_args()
+
+    fx = Fixtures()
+    backend = fx.app
+    raw = backend.mongo.db
+    backend.ld_analysis_queue = RecordedJobs()
+    raw.users.insert_one({'email': 'bench-login@example.com', 'username': 'bench',
+                          'password': generate_password_hash(PASSWORD), 'created_at': '2025-01-01T00:00:00+00:00'})
+    # A few pages of history for /assessments
+    for _ in range(60):
+        fx.client.post('/save-assessment', json=assessment_payload(), headers=fx.headers)
+
+    import asgi
+    asgi.ld_analysis_queue = backend.ld_analysis_queue
+
+    routes = [r for r in route_requests(fx.headers, assessment_payload()) if not args.routes or r[0] in args.routes]
+    trips = RoundTrips(args.db_latency_ms)
+    rows = []
+    for route in routes:
+        backend.mongo.db = StandInDatabase(raw, SyncCollection, trips)
+        trips.count = 0
+        summary = run_sync(backend, route, args.requests, args.threads)
+        rows.append((route[0], f"sync, {args.threads} threads", summary, trips.count))
+        print(f"{route[0]} sync: {summary['throughput_per_s']:.0f} req/s", flush=True)
+
+        for concurrency in args.concurrency:
+            trips.count = 0
+
+            async def measure():
+                # The inserter's futures belong to the running loop, so it is made on it
+                asgi.use_database(StandInDatabase(raw, AsyncCollection, trips))
+                return await run_async(asgi, route, args.requests, concurrency)
+            summary = asyncio.run(measure())
+            rows.append((route[0], f"async, {concurrency} in flight", summary, trips.count))
+            inserts = asgi.assessment_inserts.stats()
+            batches = f", {inserts['mean_batch_size']:.1f} inserts per batch" if inserts['batches'] else ''
+            print(f"{route[0]} async x{concurrency}: {summary['throughput_per_s']:.0f} req/s{batches}", flush=True)
+    backend.mongo.db = raw
+    fx.close()
+
+    print(f"\n{args.requests} requests per row, {args.db_latency_ms} ms per Mongo round trip")
+    header = f"{'route':<17}{'path':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'trips/req':>11}"
+    print(header)
+    print('-' * len(header))
+    for route, config, s, count in rows:
+        print(f"{route:<17}{config:<22}{s['throughput_per_s']:>9.0f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+              f"{s['p99_ms']:>9.1f}{count / s['count']:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Auth overhead per protected request, through the Flask test client.
+
+    before:  JWT decode + users.find_one on every request (user cache disabled)
+    cached:  token_required with the token/user caches
+    claims:  claims_required with AUTH_TRUST_CLAIMS, no user lookup at all
+
+Mongo is replaced by mongomock plus --db-latency-ms of sleep per users lookup, standing in
+for a network round trip.
+
+Run from Backend/:
+    python -m benchmarks.bench_auth --requests 2000 --db-latency-ms 0.5
+"""
+import argparse
+import datetime
+import os
+import time
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/main_project?serverSelectionTimeoutMS=200')
+
+import jwt
+import mongomock
+
+from benchmarks.common import time_calls, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--db-latency-ms', type=float, default=0.5)
+    args = parser.parse_args()
+
+    import app as backend
+    from user_cache import UserCache
+
+    db = mongomock.MongoClient().main_project
+    user_id = db.users.insert_one({'email': 'bench@example.com', 'username': 'bench', 'password': 'x',
+                                   'created_at': '2025-01-01T00:00:00+00:00'}).inserted_id
+    lookups = 0
+
+    def load_user(email):
+        nonlocal lookups
+        lookups += 1
+        time.sleep(args.db_latency_ms / 1000.0)
+        return db.users.find_one({'email': email}, {'password': 0})
+
+    def decode_token(token):
+        return jwt.decode(token, backend.app.config['SECRET_KEY'], algorithms=["HS256"])
+
+    token = jwt.encode({
+        'email': 'bench@example.com', 'uid': str(user_id), 'username': 'bench',
+        'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }, backend.app.config['SECRET_KEY'], algorithm="HS256")
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def protected(current_user):
+        return '', 204
+
+    backend.app.add_url_rule('/__bench/token', 'bench_token', backend.token_required(protected))
+    backend.app.add_url_rule('/__bench/claims', 'bench_claims', backend.authenticate(protected, trust_claims=True))
+    client = backend.app.test_client()
+
+    def request(path):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 204, response.status_code
+
+    rows, db_lookups = {}, {}
+    cases = (
+        ('find_one per request', UserCache(load_user, decode_token, ttl=0), '/__bench/token'),
+        ('token_required, cached', UserCache(load_user, decode_token), '/__bench/token'),
+        ('claims_required, trusted', UserCache(load_user, decode_token), '/__bench/claims'),
+    )
+    for name, cache, path in cases:
+        backend.user_cache = cache
+        lookups = 0
+        rows[name] = time_calls(lambda: request(path), args.requests)
+        db_lookups[name] = (lookups, cache.stats())
+
+    print_table(rows, title=f"{args.requests} protected requests, {args.db_latency_ms} ms per users lookup")
+    for name, (count, stats) in db_lookups.items():
+        print(f"{name:<34}{count:>6} users lookups, user hit rate {stats['users']['hit_rate']:.1%}, "
+              f"token hit rate {stats['tokens']['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
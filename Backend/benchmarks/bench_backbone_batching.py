@@ -0,0 +1,69 @@
+"""
+Throughput versus p99 latency of the micro-batched ResNet50 backbone.
+
+Simulates `--clients` students, each streaming `--requests` face crops back to back,
+for every (max_batch_size, max_wait_ms) pair in the sweep. Batch size 1 is the old
+unbatched route.
+
+Run from Backend/:
+    python -m benchmarks.bench_backbone_batching --clients 16 --batch-sizes 1 4 8 16 --waits 2 5 10
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from benchmarks.common import summarize
+from EmotionDetection.batching import make_backbone_batcher
+from EmotionDetection.model import ResNet50
+
+
+def run_case(model, clients, requests, max_batch_size, max_wait_ms):
+    batcher = make_backbone_batcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    face = torch.randn(1, 3, 224, 224)
+    batcher(face)  # start the dispatcher and warm the kernels
+
+    def client(_):
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            batcher(face)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = [lat for per_client in executor.map(client, range(clients)) for lat in per_client]
+    summary = summarize(latencies, wall_time=time.perf_counter() - start)
+    summary['mean_batch_size'] = batcher.stats()['mean_batch_size'] if not batcher.inline else 1.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--waits', type=float, nargs='+', default=[2.0, 5.0, 10.0])
+    parser.add_argument('--threads', type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # Weights don't change the cost of a forward pass, so skip the checkpoint.
+    model = ResNet50(7, channels=3).eval()
+
+    header = f"{'max_batch':>10}{'wait ms':>9}{'mean batch':>12}{'frames/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for max_batch_size in args.batch_sizes:
+        waits = [0.0] if max_batch_size == 1 else args.waits
+        for wait in waits:
+            s = run_case(model, args.clients, args.requests, max_batch_size, wait)
+            print(f"{max_batch_size:>10}{wait:>9.1f}{s['mean_batch_size']:>12.2f}"
+                  f"{s['throughput_per_s']:>10.1f}{s['p50_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Size and speed of the packed emotion fields (emotion_codec) against the arrays as posted.
+
+For emotionTrackingData of --entries frames, in two shapes:
+
+    frontend:  {emotion, timestamp (ISO string), task}, what AssessmentPanel posts; labels
+               persist for a few frames like real webcam readings
+    tracking:  {timestamp (epoch ms), emotion, confidence} with an independent label per
+               frame (benchmarks.suite's payload), the worst case for run-length encoding
+
+it reports BSON bytes, pack/unpack time, what PyMongo spends decoding a whole assessment
+(bson.decode) and the JSON the LD analysis sends Gemini. Then GET /assessments with full
+documents, through the Flask app on mongomock, with EMOTION_STORAGE raw and columnar.
+
+Run from Backend/:
+    python -m benchmarks.bench_emotion_codec --entries 60 300 1800
+"""
+import argparse
+import datetime
+import json
+import os
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/main_project?serverSelectionTimeoutMS=200')
+
+import bson
+import numpy as np
+
+import emotion_codec
+from benchmarks.common import time_calls, print_table
+from benchmarks.suite import Fixtures, assessment_payload, emotion_tracking_data
+
+LABELS = ['Neutral', 'Happiness', 'Sadness', 'Surprise', 'Fear', 'Disgust', 'Anger']
+TASKS = ['number-comparison', 'handwriting', 'letter-arrangement']
+
+
+def frontend_tracking_data(n, stickiness=0.8, seed=0):
+    """AssessmentPanel's emotionData: a reading per second that mostly keeps the previous label."""
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2025, 1, 1, 10, 0, tzinfo=datetime.timezone.utc)
+    entries, label = [], LABELS[0]
+    for i in range(n):
+        if rng.random() > stickiness:
+            label = LABELS[int(rng.integers(len(LABELS)))]
+        at = start + datetime.timedelta(milliseconds=1000 * i + int(rng.integers(0, 50)))
+        entries.append({'emotion': label, 'timestamp': at.strftime('%Y-%m-%dT%H:%M:%S.') + f'{at.microsecond // 1000:03d}Z',
+                        'task': TASKS[min(3 * i // n, 2)]})
+    return entries
+
+
+def codec_rows(shape, entries, iterations):
+    packed = emotion_codec.pack(entries)
+    assert emotion_codec.unpack(packed) == entries
+    raw_doc = bson.encode({'emotionTrackingData': entries})
+    packed_doc = bson.encode({'emotionTrackingData': packed})
+    timings = {
+        f'{shape}.pack': time_calls(lambda: emotion_codec.pack(entries), iterations),
+        f'{shape}.unpack': time_calls(lambda: emotion_codec.unpack(packed), iterations),
+        f'{shape}.bson_decode.raw': time_calls(lambda: bson.decode(raw_doc), iterations),
+        f'{shape}.bson_decode.packed': time_calls(lambda: bson.decode(packed_doc), iterations),
+    }
+    sizes = {
+        'bson_raw': len(raw_doc),
+        'bson_packed': len(packed_doc),
+        'gemini_raw': len(json.dumps(entries)),
+        'gemini_runs': len(json.dumps(emotion_codec.summarize(entries))),
+    }
+    return timings, sizes
+
+
+def route_rows(fx, storage, requests):
+    import assessments
+    backend = fx.app
+    assessments.EMOTION_STORAGE = storage
+    backend.mongo.db.assessments.delete_many({})
+    payload = assessment_payload()
+    payload['emotionTrackingData'] = frontend_tracking_data(300)
+    for _ in range(21):
+        response = fx.client.post('/save-assessment', json=payload, headers=fx.headers)
+        assert response.status_code == 202, response.status_code
+    stored = backend.mongo.db.assessments.find_one()
+    doc_bytes = len(bson.encode(stored))
+
+    def page():
+        response = fx.client.get('/assessments?limit=20', headers=fx.headers)
+        assert response.status_code == 200, response.status_code
+    return time_calls(page, requests), doc_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, nargs='+', default=[60, 300, 1800], help="frames of tracking data")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=50, help="GET /assessments calls per storage mode")
+    args = parser.parse_args()
+
+    rows, sizes = {}, {}
+    for n in args.entries:
+        for shape, entries in (('frontend', frontend_tracking_data(n)), ('tracking', emotion_tracking_data(n))):
+            timings, size = codec_rows(f'{shape}.{n}', entries, args.iterations)
+            rows.update(timings)
+            sizes[f'{shape}, {n} frames'] = size
+    print_table(rows, title="emotionTrackingData codec")
+
+    print(f"\n{'emotionTrackingData':<26}{'BSON raw':>10}{'packed':>9}{'ratio':>8}{'Gemini JSON':>13}{'runs':>8}")
+    for name, s in sizes.items():
+        print(f"{name:<26}{s['bson_raw']:>10}{s['bson_packed']:>9}{s['bson_packed'] / s['bson_raw']:>8.1%}"
+              f"{s['gemini_raw']:>13}{s['gemini_runs']:>8}")
+
+    fx = Fixtures()
+    route, doc_sizes = {}, {}
+    for storage in ('raw', 'columnar'):
+        route[f'GET /assessments, {storage}'], doc_sizes[storage] = route_rows(fx, storage, args.requests)
+    fx.close()
+    print_table(route, title="GET /assessments?limit=20, full documents (mongomock)")
+    for storage, size in doc_sizes.items():
+        print(f"{storage:<10} assessment document: {size} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Before/after latency of FaceMesh in /facedetection on synthetic frames.
+
+    before: a new FaceMesh graph is built and torn down for every frame (old route)
+    after:  frames are processed by graphs checked out of FaceMeshPool
+
+Run from Backend/:
+    python -m benchmarks.bench_face_mesh_pool --frames 200 --threads 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from benchmarks.common import synthetic_face_frame, summarize, time_calls, print_table
+from EmotionDetection.face_mesh_pool import FaceMeshPool, FACE_MESH_SETTINGS, mp_face_mesh
+
+
+def run_threaded(fn, frames, threads):
+    def timed(frame):
+        start = time.perf_counter()
+        fn(frame)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(timed, frames))
+    return summarize(latencies, wall_time=time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--width', type=int, default=240)
+    parser.add_argument('--height', type=int, default=180)
+    args = parser.parse_args()
+
+    # Same resolution the frontend asks the webcam for.
+    frames = [cv2.cvtColor(synthetic_face_frame(args.width, args.height, seed=i), cv2.COLOR_BGR2RGB)
+              for i in range(args.frames)]
+    frame_iter = iter(frames * 2)
+
+    def fresh_graph(frame):
+        with mp_face_mesh.FaceMesh(**FACE_MESH_SETTINGS) as face_mesh:
+            face_mesh.process(frame)
+
+    pool = FaceMeshPool(size=args.threads)
+    pool.warm_up()
+
+    def pooled_graph(frame):
+        with pool.checkout() as face_mesh:
+            face_mesh.process(frame)
+
+    rows = {
+        'fresh FaceMesh / frame': time_calls(lambda: fresh_graph(next(frame_iter)), args.frames // 2),
+        'pooled FaceMesh': time_calls(lambda: pooled_graph(next(frame_iter)), args.frames // 2),
+    }
+    print_table(rows, title="Single request thread")
+
+    rows = {
+        f'fresh FaceMesh / frame x{args.threads}': run_threaded(fresh_graph, frames, args.threads),
+        f'pooled FaceMesh x{args.threads}': run_threaded(pooled_graph, frames, args.threads),
+    }
+    print_table(rows, title=f"{args.threads} concurrent request threads")
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
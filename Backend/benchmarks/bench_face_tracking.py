@@ -0,0 +1,87 @@
+"""
+Face localisation per frame with and without session face tracking, on a synthetic
+webcam sequence where the head drifts a few pixels per frame.
+
+    before:   FaceMesh + get_box on every frame
+    tracking: FaceMesh every --redetect-every frames, template tracking in between
+
+Also reports how closely the tracked boxes follow the boxes FaceMesh finds (mean IoU).
+
+Run from Backend/:
+    python -m benchmarks.bench_face_tracking --frames 300 --redetect-every 5
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import synthetic_face_frame, summarize, print_table
+from EmotionDetection.face_mesh_pool import FaceMeshPool
+from EmotionDetection.pipeline import EmotionPipeline
+from EmotionDetection.temporal import TemporalSessionStore
+from EmotionDetection.tracking import FaceTracker
+
+
+def drifting_sequence(frames, width, height, step=1.5):
+    """RGB frames of one synthetic face translated along a slow circular path."""
+    base = cv2.cvtColor(synthetic_face_frame(width, height), cv2.COLOR_BGR2RGB)
+    sequence = []
+    for i in range(frames):
+        dx, dy = step * 6 * np.cos(i / 15.0), step * 4 * np.sin(i / 15.0)
+        shift = np.float32([[1, 0, dx], [0, 1, dy]])
+        sequence.append(cv2.warpAffine(base, shift, (width, height), borderMode=cv2.BORDER_REFLECT))
+    return sequence
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def run(pipeline, sequence):
+    latencies, boxes = [], []
+    for frame in sequence:
+        start = time.perf_counter()
+        boxes.append(pipeline.locate_face(frame, 'bench'))
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies), boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=240)
+    parser.add_argument('--height', type=int, default=180)
+    parser.add_argument('--redetect-every', type=int, default=5)
+    args = parser.parse_args()
+
+    sequence = drifting_sequence(args.frames, args.width, args.height)
+    pool = FaceMeshPool(size=1)
+    pool.warm_up(1)
+
+    baseline = EmotionPipeline(face_meshes=pool, sessions=TemporalSessionStore())
+    tracker = FaceTracker(redetect_every=args.redetect_every)
+    tracking = EmotionPipeline(face_meshes=pool, sessions=TemporalSessionStore(), tracker=tracker)
+
+    rows = {}
+    rows['FaceMesh every frame'], reference = run(baseline, sequence)
+    rows[f'tracking, redetect every {args.redetect_every}'], tracked = run(tracking, sequence)
+    print_table(rows, title=f"{args.frames} frames at {args.width}x{args.height}")
+
+    overlaps = [iou(a, b) for a, b in zip(reference, tracked) if a is not None and b is not None]
+    stats = tracker.stats()
+    print(f"\nFaceMesh runs: {stats['detections']} of {stats['frames']} frames "
+          f"({stats['skipped_detection_rate']:.0%} skipped, {stats['tracking_lost']} re-detections after losing the face)")
+    print(f"mean detection {stats['mean_detection_ms']:.2f} ms, mean tracking {stats['mean_tracking_ms']:.2f} ms, "
+          f"saved {stats['saved_ms_total']:.0f} ms in total")
+    if overlaps:
+        print(f"tracked vs FaceMesh box IoU: mean {np.mean(overlaps):.3f}, min {np.min(overlaps):.3f}")
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
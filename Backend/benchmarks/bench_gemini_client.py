@@ -0,0 +1,79 @@
+"""
+Gemini call overhead against the local fake endpoint.
+
+    before: a new genai.Client per call (old identify / generate_dialgoue_client_sdk)
+    after:  the shared GeminiClient (connection reuse, concurrency cap, retries)
+
+Also reports how many TCP connections each variant opened and, with --fail-rate,
+how many calls the retries rescued.
+
+Run from Backend/:
+    python -m benchmarks.bench_gemini_client --calls 200 --threads 8 --latency-ms 20
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize, print_table
+from benchmarks.fake_gemini import serve
+from gemini_client import GeminiClient
+
+
+def run_threaded(fn, calls, threads):
+    failures = 0
+
+    def timed(_):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            failures += 1
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(timed, range(calls)))
+    return summarize(latencies, wall_time=time.perf_counter() - start), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    from google import genai
+    from google.genai import types
+
+    server, url = serve(latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+    handler = server.RequestHandlerClass
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text="Emotional state: Happy")])]
+    config = types.GenerateContentConfig(max_output_tokens=100)
+
+    def per_call_client():
+        client = genai.Client(api_key='fake', http_options=types.HttpOptions(base_url=url))
+        return client.models.generate_content(model='gemini-2.0-flash', contents=contents, config=config).text
+
+    shared = GeminiClient(api_key='fake', base_url=url, max_concurrency=args.max_concurrency, backoff=0.05)
+
+    rows, notes = {}, {}
+    for name, fn in (('new client per call', per_call_client),
+                     ('shared GeminiClient', lambda: shared.generate(contents, config))):
+        handler.connections = 0
+        rows[name], failures = run_threaded(fn, args.calls, args.threads)
+        notes[name] = (handler.connections, failures)
+
+    print_table(rows, title=f"{args.calls} calls, {args.threads} threads, fake latency {args.latency_ms:.0f} ms, "
+                            f"fail rate {args.fail_rate:.0%}")
+    for name, (connections, failures) in notes.items():
+        print(f"{name:<34}{connections:>5} TCP connections, {failures} failed calls")
+    print(f"\nshared client stats: {shared.stats()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
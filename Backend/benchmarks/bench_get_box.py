@@ -0,0 +1,73 @@
+"""
+Microbenchmark of the vectorized get_box against the original per-landmark loop.
+
+Run from Backend/:
+    python -m benchmarks.bench_get_box --iterations 2000
+"""
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.common import time_calls, print_table
+from EmotionDetection.utlis import get_box, landmarks_to_array, norm_coordinates
+
+NUM_LANDMARKS = 468
+
+
+def get_box_loop(fl, w, h):
+    """get_box as it was before vectorization, kept as the reference."""
+    idx_to_coors = {}
+    for idx, landmark in enumerate(fl.landmark):
+        landmark_px = norm_coordinates(landmark.x, landmark.y, w, h)
+        if landmark_px:
+            idx_to_coors[idx] = landmark_px
+    x_min = np.min(np.asarray(list(idx_to_coors.values()))[:, 0])
+    y_min = np.min(np.asarray(list(idx_to_coors.values()))[:, 1])
+    endX = np.max(np.asarray(list(idx_to_coors.values()))[:, 0])
+    endY = np.max(np.asarray(list(idx_to_coors.values()))[:, 1])
+    (startX, startY) = (max(0, x_min), max(0, y_min))
+    (endX, endY) = (min(w - 1, endX), (min(h - 1, endY)))
+    return startX, startY, endX, endY
+
+
+def synthetic_landmarks(seed=0):
+    """A FaceMesh-shaped landmark list; uses the real protobuf type when mediapipe is installed."""
+    rng = np.random.default_rng(seed)
+    # Mostly inside the frame, with a few points spilling over the edges like real detections
+    coords = rng.uniform(-0.05, 1.05, size=(NUM_LANDMARKS, 2))
+    try:
+        from mediapipe.framework.formats import landmark_pb2
+        fl = landmark_pb2.NormalizedLandmarkList()
+        for x, y in coords:
+            fl.landmark.add(x=float(x), y=float(y), z=0.0)
+        return fl
+    except ImportError:
+        return SimpleNamespace(landmark=[SimpleNamespace(x=float(x), y=float(y), z=0.0) for x, y in coords])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+    w, h = args.width, args.height
+
+    for seed in range(20):
+        fl = synthetic_landmarks(seed)
+        assert tuple(int(v) for v in get_box_loop(fl, w, h)) == get_box(fl, w, h), "vectorized box differs"
+
+    fl = synthetic_landmarks()
+    landmarks = landmarks_to_array(fl)
+    rows = {
+        'loop (original)': time_calls(lambda: get_box_loop(fl, w, h), args.iterations),
+        'vectorized': time_calls(lambda: get_box(fl, w, h), args.iterations),
+        'vectorized, array reused': time_calls(lambda: get_box(landmarks, w, h), args.iterations),
+        'landmarks_to_array only': time_calls(lambda: landmarks_to_array(fl), args.iterations),
+    }
+    print_table(rows, title=f"get_box on {NUM_LANDMARKS} landmarks, {w}x{h}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Accuracy drift, latency and memory of each EMOTION_INFERENCE_MODE against eager fp32.
+
+Drift is measured on synthetic face crops run through the real preprocessing:
+max |delta| of the backbone features and of the LSTM class probabilities, plus how
+often the predicted emotion still matches fp32.
+
+Run from Backend/:
+    python -m benchmarks.bench_inference_modes --faces 64 --iterations 50
+"""
+import argparse
+import io
+import os
+import time
+
+os.environ['EMOTION_INFERENCE_MODE'] = 'eager'  # the reference models must stay fp32
+
+import torch
+
+from benchmarks.common import synthetic_face_crop, time_calls
+from EmotionDetection.model import pth_backbone_model, pth_LSTM_model
+from EmotionDetection.optimize import INFERENCE_MODES, prepare_backbone, prepare_lstm
+from EmotionDetection.temporal import SEQUENCE_LENGTH
+from EmotionDetection.utlis import FacePreprocessor
+
+
+def serialized_mb(model):
+    buffer = io.BytesIO()
+    if isinstance(model, torch.jit.ScriptModule):
+        torch.jit.save(model, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faces', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--modes', nargs='+', default=list(INFERENCE_MODES), choices=INFERENCE_MODES)
+    parser.add_argument('--threads', type=int, default=None, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    preprocess = FacePreprocessor()
+    faces = torch.cat([preprocess(synthetic_face_crop(160, seed=i)).clone() for i in range(args.faces)])
+    # Calibrate static quantization on different faces than the ones we score
+    calibration = [torch.cat([preprocess(synthetic_face_crop(160, seed=1000 + 4 * b + i)).clone() for i in range(4)])
+                   for b in range(8)]
+
+    with torch.no_grad():
+        ref_features = torch.relu(pth_backbone_model.extract_features(faces))
+        ref_windows = ref_features.unfold(0, SEQUENCE_LENGTH, 1).permute(0, 2, 1).contiguous()
+        ref_probs = pth_LSTM_model(ref_windows)
+
+    header = (f"{'mode':<11}{'build s':>9}{'feat max|d|':>13}{'prob max|d|':>13}{'top-1 agree':>13}"
+              f"{'backbone ms':>13}{'lstm ms':>10}{'backbone MB':>13}{'lstm MB':>9}")
+    print(header)
+    print('-' * len(header))
+    single_face, window = faces[:1], ref_windows[:1]
+    for mode in args.modes:
+        start = time.perf_counter()
+        backbone = prepare_backbone(pth_backbone_model, mode, calibration_batches=calibration)
+        lstm = prepare_lstm(pth_LSTM_model, mode)
+        build = time.perf_counter() - start
+
+        with torch.no_grad():
+            features = torch.relu(backbone.extract_features(faces))
+            windows = features.unfold(0, SEQUENCE_LENGTH, 1).permute(0, 2, 1).contiguous()
+            probs = lstm(windows)
+            feature_drift = (features - ref_features).abs().max().item()
+            prob_drift = (probs - ref_probs).abs().max().item()
+            agree = (probs.argmax(1) == ref_probs.argmax(1)).float().mean().item()
+            backbone_lat = time_calls(lambda: backbone.extract_features(single_face), args.iterations)
+            lstm_lat = time_calls(lambda: lstm(window), args.iterations * 4)
+
+        print(f"{mode:<11}{build:>9.2f}{feature_drift:>13.4f}{prob_drift:>13.4f}{agree:>13.1%}"
+              f"{backbone_lat['p50_ms']:>13.2f}{lstm_lat['p50_ms']:>10.3f}"
+              f"{serialized_mb(backbone):>13.1f}{serialized_mb(lstm):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
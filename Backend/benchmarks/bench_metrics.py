@@ -0,0 +1,60 @@
+"""
+Cost of the metrics layer: one stage_timer block, one histogram observe, rendering /metrics,
+and the /facedetection and /rl_action routes with METRICS_ENABLED on and off.
+
+Also prints the per-stage breakdown /facedetection produced, which is what the
+instrumentation is for.
+
+Run from Backend/:
+    python -m benchmarks.bench_metrics --requests 50
+"""
+import argparse
+
+import metrics
+from benchmarks.common import time_calls, print_table
+from benchmarks.suite import Fixtures, setup_facedetection, setup_rl_action
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50, help="/facedetection requests per variant")
+    parser.add_argument('--iterations', type=int, default=100000, help="timer iterations")
+    args = parser.parse_args()
+
+    def timed_block():
+        with metrics.stage_timer('bench.noop'):
+            pass
+
+    rows = {
+        'empty loop body': time_calls(lambda: None, args.iterations),
+        'stage_timer block': time_calls(timed_block, args.iterations),
+        'histogram observe': time_calls(lambda: metrics.stage_seconds.observe(0.001, 'bench.noop'), args.iterations),
+    }
+    print_table(rows, title="Instrumentation primitives")
+
+    fx = Fixtures()
+    try:
+        facedetection = setup_facedetection(fx)
+        rl_action = setup_rl_action(fx)
+        client = fx.client
+        rows = {}
+        # Two interleaved rounds, so drift over the run doesn't favour either variant
+        for round_ in (1, 2):
+            for enabled in (False, True):
+                metrics.METRICS_ENABLED = enabled
+                label = f"metrics {'on' if enabled else 'off'} ({round_})"
+                rows[f'/facedetection, {label}'] = time_calls(facedetection, args.requests)
+                rows[f'/rl_action, {label}'] = time_calls(rl_action, args.requests * 10)
+        rows['GET /metrics'] = time_calls(lambda: client.get('/metrics'), 200)
+        print_table(rows, title="Routes")
+    finally:
+        fx.close()
+
+    print("\nStage breakdown (mean ms per call):")
+    for (stage,), (count, total) in sorted(metrics.stage_seconds.snapshot().items()):
+        if stage.startswith(('pipeline.', 'http.', 'emotion_history.', 'dialogue', 'gemini.')):
+            print(f"  {stage:<28}{count:>7}{1000.0 * total / count:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Old PIL-based pth_processing versus FacePreprocessor, with a bit-exactness check.
+
+Run from Backend/:
+    python -m benchmarks.bench_preprocessing --iterations 1000
+"""
+import argparse
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from benchmarks.common import synthetic_face_crop, time_calls, print_table
+from EmotionDetection.utlis import FacePreprocessor
+
+
+def pth_processing_pil(fp):
+    """pth_processing as it was before the rewrite, kept as the reference."""
+    class PreprocessInput(torch.nn.Module):
+        def init(self):
+            super(PreprocessInput, self).init()
+
+        def forward(self, x):
+            x = x.to(torch.float32)
+            x = torch.flip(x, dims=(0,))
+            x[0, :, :] -= 91.4953
+            x[1, :, :] -= 103.8827
+            x[2, :, :] -= 131.0912
+            return x
+
+    def get_img_torch(img):
+        ttransform = transforms.Compose([
+            transforms.PILToTensor(),
+            PreprocessInput()
+        ])
+        img = img.resize((224, 224), Image.Resampling.NEAREST)
+        img = ttransform(img)
+        img = torch.unsqueeze(img, 0)
+        return img
+    return get_img_torch(fp)
+
+
+def check_identical(preprocessor, trials=500, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        h, w = (int(v) for v in rng.integers(8, 640, size=2))
+        frame = rng.integers(0, 256, size=(h + 20, w + 20, 3), dtype=np.uint8)
+        face = frame[10:10 + h, 10:10 + w]  # a strided crop, like the route's
+        expected = pth_processing_pil(Image.fromarray(np.ascontiguousarray(face)))
+        if not torch.equal(expected, preprocessor(face)):
+            raise AssertionError(f"FacePreprocessor output differs for a {w}x{h} crop")
+    print(f"FacePreprocessor matches the PIL pipeline bit for bit on {trials} random crop sizes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--crop', type=int, default=160, help="side of the synthetic face crop")
+    parser.add_argument('--batch', type=int, default=8)
+    args = parser.parse_args()
+
+    preprocessor = FacePreprocessor()
+    check_identical(preprocessor)
+
+    face = synthetic_face_crop(args.crop)
+    faces = [synthetic_face_crop(args.crop, seed=i) for i in range(args.batch)]
+    rows = {
+        'PIL pth_processing (old)': time_calls(lambda: pth_processing_pil(Image.fromarray(face)), args.iterations),
+        'FacePreprocessor': time_calls(lambda: preprocessor(face), args.iterations),
+        f'PIL pth_processing x{args.batch} + cat': time_calls(
+            lambda: torch.cat([pth_processing_pil(Image.fromarray(f)) for f in faces]), args.iterations // args.batch),
+        f'FacePreprocessor.batch x{args.batch}': time_calls(lambda: preprocessor.batch(faces), args.iterations // args.batch),
+    }
+    print_table(rows, title=f"{args.crop}x{args.crop} face crop -> 1x3x224x224")
+
+
+if __name__ == '__main__':
+    main()
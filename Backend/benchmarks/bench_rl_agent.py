@@ -0,0 +1,105 @@
+"""
+EmotionRLAgent (dict Q-table) against DenseEmotionRLAgent (NumPy Q-matrix).
+
+    per call:  choose_action and update, one transition at a time
+    batched:   N transitions through update() in a loop vs one update_batch(),
+               and N greedy choices vs one greedy_actions()
+
+Also checks that per-call updates give identical Q-values in both agents, and how far
+update_batch() drifts from sequential updates on transitions that overlap.
+
+Run from Backend/:
+    python -m benchmarks.bench_rl_agent --iterations 20000 --batch 1000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import time_calls, summarize, print_table
+from EmotionDetection.labels import DICT_EMO
+from RL import EmotionRLAgent, DenseEmotionRLAgent, RL_ACTIONS
+
+STATES = list(DICT_EMO.values())
+
+
+def transitions(n, seed=0):
+    rng = random.Random(seed)
+    return [(rng.choice(STATES), rng.choice(RL_ACTIONS), rng.uniform(-1, 1), rng.choice(STATES)) for _ in range(n)]
+
+
+def max_diff(a, b):
+    return max(abs(a.get_q(s, act) - b.get_q(s, act)) for s in STATES for act in RL_ACTIONS)
+
+
+def time_batches(fn, batches, repeats):
+    latencies = []
+    for _ in range(repeats):
+        for batch in batches:
+            start = time.perf_counter()
+            fn(batch)
+            latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=1000, help="transitions per batch")
+    parser.add_argument('--batches', type=int, default=20)
+    args = parser.parse_args()
+
+    history = transitions(5000)
+    dict_agent = EmotionRLAgent(RL_ACTIONS)
+    dense_agent = DenseEmotionRLAgent(RL_ACTIONS, states=STATES, seed=0)
+    for t in history:
+        dict_agent.update(*t)
+        dense_agent.update(*t)
+    print(f"max |Q difference| after {len(history)} per-call updates: {max_diff(dict_agent, dense_agent):.3g}")
+
+    cycle = transitions(args.iterations, seed=1)
+    rows = {}
+    for name, agent in (('dict', dict_agent), ('dense', dense_agent)):
+        it = iter(range(10 ** 12))
+        rows[f'{name}: choose_action'] = time_calls(lambda: agent.choose_action(STATES[next(it) % len(STATES)]),
+                                                   args.iterations)
+        it = iter(range(10 ** 12))
+        rows[f'{name}: update'] = time_calls(lambda: agent.update(*cycle[next(it) % len(cycle)]), args.iterations)
+    print_table(rows, title="Per call")
+
+    batches = [transitions(args.batch, seed=100 + i) for i in range(args.batches)]
+    columns = [tuple(zip(*batch)) for batch in batches]
+    states_only = [[t[0] for t in batch] for batch in batches]
+
+    def update_loop(agent):
+        def run(batch):
+            for t in batch:
+                agent.update(*t)
+        return run
+
+    rows = {
+        'dict: update() loop': time_batches(update_loop(dict_agent), batches, 3),
+        'dense: update() loop': time_batches(update_loop(dense_agent), batches, 3),
+        'dense: update_batch()': time_batches(lambda cols: dense_agent.update_batch(*cols), columns, 3),
+        'dict: choose_action() loop': time_batches(
+            lambda states: [dict_agent.choose_action(s) for s in states], states_only, 3),
+        'dense: greedy_actions()': time_batches(dense_agent.greedy_actions, states_only, 3),
+    }
+    print_table(rows, title=f"Batches of {args.batch} transitions (ms per batch)")
+    loop, batched = rows['dense: update() loop']['p50_ms'], rows['dense: update_batch()']['p50_ms']
+    print(f"update_batch: {1000.0 * batched / args.batch:.3f} us per transition, "
+          f"{loop / batched:.0f}x faster than the dense loop, "
+          f"{rows['dict: update() loop']['p50_ms'] / batched:.0f}x faster than the dict loop")
+
+    sequential = DenseEmotionRLAgent(RL_ACTIONS, states=STATES)
+    batched_agent = DenseEmotionRLAgent(RL_ACTIONS, states=STATES)
+    for batch, cols in zip(batches, columns):
+        for t in batch:
+            sequential.update(*t)
+        batched_agent.update_batch(*cols)
+    scale = max(abs(sequential.get_q(s, a)) for s in STATES for a in RL_ACTIONS)
+    print(f"update_batch vs sequential after {args.batches} batches over {len(STATES)}x{len(RL_ACTIONS)} pairs: "
+          f"max |dQ| {max_diff(sequential, batched_agent):.3f} (max |Q| {scale:.3f})")
+
+
+if __name__ == '__main__':
+    main()
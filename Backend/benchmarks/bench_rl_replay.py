@@ -0,0 +1,81 @@
+"""
+Offline replay throughput: rl_train.py's parse -> encode -> vectorized update_indices
+against replaying the same log through EmotionRLAgent.update one transition at a time.
+
+The synthetic log has one right action per state (encouragement when sad, a hint when
+afraid, ...); the script checks the rebuilt table's greedy policy finds it.
+
+Run from Backend/:
+    python -m benchmarks.bench_rl_replay --transitions 2000000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from EmotionDetection.labels import DICT_EMO
+from RL import DenseEmotionRLAgent, EmotionRLAgent, RL_ACTIONS, emotion_reward
+from rl_train import load_encoded, train
+from rl_transitions import TransitionLog, read_transitions
+
+STATES = list(DICT_EMO.values())
+
+
+def write_log(directory, count, seed=0):
+    rng = random.Random(seed)
+    best = {state: RL_ACTIONS[i % len(RL_ACTIONS)] for i, state in enumerate(STATES)}
+    log = TransitionLog(directory, flush_size=10 ** 9)
+    for i in range(count):
+        state, action = rng.choice(STATES), rng.choice(RL_ACTIONS)
+        next_state = 'Happiness' if action == best[state] else rng.choice(['Neutral', 'Sadness', 'Anger'])
+        log.append(state, action, next_state, emotion_reward(next_state))
+        if i % 100000 == 99999:
+            log.flush()
+    log.flush()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transitions', type=int, default=2_000_000)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--loop-sample', type=int, default=200_000,
+                        help="transitions timed through the per-call loop (extrapolated)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        best = write_log(directory, args.transitions)
+        print(f"wrote {args.transitions:,} transitions in {time.perf_counter() - start:.1f}s")
+
+        agent = DenseEmotionRLAgent(RL_ACTIONS, states=STATES, seed=0)
+        start = time.perf_counter()
+        s, a, r, n = load_encoded(agent, [directory])
+        loaded = time.perf_counter()
+        replayed = train(agent, s, a, r, n, epochs=args.epochs, batch_size=args.batch_size)
+        trained = time.perf_counter()
+
+        sample = []
+        for states, actions, next_states, rewards in read_transitions([directory], chunk_size=args.loop_sample):
+            sample = list(zip(states, actions, rewards, next_states))
+            break
+        loop_agent = EmotionRLAgent(RL_ACTIONS)
+        start_loop = time.perf_counter()
+        for state, action, reward, next_state in sample:
+            loop_agent.update(state, action, reward, next_state)
+        per_transition = (time.perf_counter() - start_loop) / len(sample)
+
+    vectorized = (trained - loaded) / replayed
+    print(f"parse + encode: {loaded - start:.2f}s ({len(s) / (loaded - start):,.0f} transitions/s)")
+    print(f"update_indices, batch {args.batch_size}: {trained - loaded:.2f}s for {replayed:,} replays "
+          f"({1e6 * vectorized:.3f} us each)")
+    print(f"EmotionRLAgent.update loop: {1e6 * per_transition:.3f} us each, "
+          f"{per_transition * replayed:.1f}s for the same replays ({per_transition / vectorized:.0f}x slower)")
+
+    found = sum(agent.greedy_actions([state])[0] == best[state] for state in STATES)
+    print(f"greedy policy matches the rewarded action in {found}/{len(STATES)} states")
+
+
+if __name__ == '__main__':
+    main()
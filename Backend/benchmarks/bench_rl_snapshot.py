@@ -0,0 +1,130 @@
+"""
+Q-table persistence: the pickle format against the .npz snapshot (rl_snapshot.py), and
+what sharing it through SharedRLAgent costs.
+
+    size / save / load:  pickle dict vs .npz read into memory vs .npz memory-mapped,
+                         for the emotion table and a large synthetic one
+    request path:        choose_action / update on a bare DenseEmotionRLAgent vs SharedRLAgent
+    sync:                merge() of a worker's delta and refresh() onto another worker's write
+
+Also runs --workers processes learning online in parallel and checks they end on the same table.
+
+Run from Backend/:
+    python -m benchmarks.bench_rl_snapshot --states 5000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import time_calls, print_table
+from EmotionDetection.labels import DICT_EMO
+from RL import DenseEmotionRLAgent, SharedRLAgent, RL_ACTIONS
+from rl_snapshot import read_snapshot
+
+STATES = list(DICT_EMO.values())
+
+
+def filled_agent(states, seed=0):
+    agent = DenseEmotionRLAgent(RL_ACTIONS, states=states, seed=seed)
+    agent.q[:len(states)] = np.random.default_rng(seed).uniform(-1, 1, (len(states), len(RL_ACTIONS)))
+    return agent
+
+
+def format_rows(agent, directory, name, iterations):
+    pkl, npz = os.path.join(directory, f'{name}.pkl'), os.path.join(directory, f'{name}.npz')
+    agent.save(pkl)
+    agent.save(npz)
+    loader = DenseEmotionRLAgent(RL_ACTIONS)
+    rows = {
+        f'{name}: save pickle': time_calls(lambda: agent.save(pkl), iterations),
+        f'{name}: save .npz (atomic)': time_calls(lambda: agent.save(npz), iterations),
+        f'{name}: load pickle into agent': time_calls(lambda: loader.load(pkl), iterations),
+        f'{name}: load .npz into agent': time_calls(lambda: loader.load(npz), iterations),
+        f'{name}: read .npz, copy': time_calls(lambda: read_snapshot(npz, mmap=False), iterations),
+        f'{name}: read .npz, mmap': time_calls(lambda: read_snapshot(npz, mmap=True), iterations),
+    }
+    return rows, os.path.getsize(pkl), os.path.getsize(npz)
+
+
+def learn(path, seed, updates, merged, tables):
+    shared = SharedRLAgent(DenseEmotionRLAgent(RL_ACTIONS, states=STATES, seed=seed), path,
+                           check_interval=0.05, merge_interval=0.2)
+    rng = random.Random(seed)
+    for _ in range(updates):
+        shared.update(rng.choice(STATES), rng.choice(RL_ACTIONS), rng.uniform(-1, 1), rng.choice(STATES))
+    shared.merge()
+    # Once every worker has merged, each should be looking at the same table
+    merged.wait()
+    shared.refresh()
+    stats = shared.stats()
+    tables.put((shared.agent.snapshot().q.tolist(), stats['merges'], stats['sync_errors']))
+
+
+def converge(directory, workers, updates):
+    path = os.path.join(directory, 'shared.npz')
+    ctx = multiprocessing.get_context('fork')
+    merged, tables = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=learn, args=(path, seed, updates, merged, tables)) for seed in range(workers)]
+    for proc in procs:
+        proc.start()
+    results = [tables.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    snapshot = read_snapshot(path)
+    same = all(np.array_equal(np.array(q), snapshot.q) for q, _, _ in results)
+    print(f"\n{workers} workers x {updates} online updates: {sum(r[1] for r in results)} merges, "
+          f"{sum(r[2] for r in results)} sync errors, snapshot generation {snapshot.generation}; "
+          f"workers {'agree with' if same else 'DIFFER from'} the merged snapshot")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--states', type=int, default=5000, help="states in the large synthetic table")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--calls', type=int, default=50000, help="request-path calls timed")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        rows, sizes = {}, {}
+        for name, states in (('emotions', STATES), (f'{args.states} states', [f's{i}' for i in range(args.states)])):
+            table_rows, pkl_size, npz_size = format_rows(filled_agent(states), directory, name, args.iterations)
+            rows.update(table_rows)
+            sizes[name] = (pkl_size, npz_size)
+        print_table(rows, title="Q-table files")
+        for name, (pkl_size, npz_size) in sizes.items():
+            print(f"{name}: pickle {pkl_size:,} bytes, .npz {npz_size:,} bytes ({npz_size / pkl_size:.2f}x)")
+
+        path = os.path.join(directory, 'request.npz')
+        bare = filled_agent(STATES, seed=1)
+        shared = SharedRLAgent(filled_agent(STATES, seed=1), path, check_interval=3600, merge_interval=3600)
+        other = SharedRLAgent(filled_agent(STATES, seed=2), path, check_interval=3600, merge_interval=3600)
+        rng = random.Random(0)
+        cycle = [(rng.choice(STATES), rng.choice(RL_ACTIONS), rng.uniform(-1, 1), rng.choice(STATES))
+                 for _ in range(1000)]
+        it = iter(range(10 ** 12))
+        rows = {
+            'bare: choose_action': time_calls(lambda: bare.choose_action(STATES[next(it) % len(STATES)]), args.calls),
+            'shared: choose_action': time_calls(lambda: shared.choose_action(STATES[next(it) % len(STATES)]),
+                                                args.calls),
+            'bare: update': time_calls(lambda: bare.update(*cycle[next(it) % len(cycle)]), args.calls),
+            'shared: update': time_calls(lambda: shared.update(*cycle[next(it) % len(cycle)]), args.calls),
+        }
+
+        def merge_then_refresh():
+            shared.update(*cycle[next(it) % len(cycle)])
+            shared.merge()
+            other.refresh()
+
+        rows['sync: update + merge + other worker refresh'] = time_calls(merge_then_refresh, args.iterations)
+        print_table(rows, title="Request path and sync")
+
+        converge(directory, args.workers, updates=20000)
+
+
+if __name__ == '__main__':
+    main()
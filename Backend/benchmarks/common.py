@@ -0,0 +1,82 @@
+import time
+
+import cv2
+import numpy as np
+
+
+def synthetic_face_frame(width=640, height=480, seed=0):
+    """
+    Draw a crude, deterministic face (skin ellipse, eyes, brows, nose, mouth) on a
+    noisy background. Good enough to exercise the detector without shipping real photos.
+
+    Returns:
+        np.ndarray: BGR uint8 image of shape (height, width, 3).
+    """
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    cx, cy = width // 2 + int(rng.integers(-20, 21)), height // 2 + int(rng.integers(-20, 21))
+    fw, fh = width // 6, height // 4
+    cv2.ellipse(frame, (cx, cy), (fw, fh), 0, 0, 360, (150, 180, 225), -1)
+    for side in (-1, 1):
+        eye = (cx + side * fw // 2, cy - fh // 4)
+        cv2.ellipse(frame, eye, (fw // 6, fh // 12), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(frame, eye, fh // 16, (40, 30, 20), -1)
+        cv2.line(frame, (eye[0] - fw // 5, eye[1] - fh // 6), (eye[0] + fw // 5, eye[1] - fh // 6), (40, 40, 60), 3)
+    cv2.line(frame, (cx, cy - fh // 8), (cx, cy + fh // 6), (110, 130, 180), 2)
+    cv2.ellipse(frame, (cx, cy + fh // 2), (fw // 3, fh // 10), 0, 0, 180, (60, 60, 160), -1)
+    return frame
+
+
+def synthetic_face_crop(size=160, seed=0):
+    """RGB crop of a synthetic face, shaped like what get_box hands to pth_processing."""
+    frame = synthetic_face_frame(size * 3, size * 3, seed)
+    crop = frame[size:2 * size, size:2 * size]
+    return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+
+
+def summarize(latencies, wall_time=None):
+    """
+    Reduce per-call latencies (seconds) to the numbers we report.
+
+    Parameters:
+        latencies (list): Per-call latency in seconds.
+        wall_time (float): Total wall clock time, if calls overlapped (threads).
+
+    Returns:
+        dict: count, mean/p50/p95/p99/max in milliseconds and throughput per second.
+    """
+    arr = np.asarray(latencies, dtype=np.float64) * 1000.0
+    total = wall_time if wall_time is not None else arr.sum() / 1000.0
+    return {
+        'count': int(arr.size),
+        'mean_ms': float(arr.mean()),
+        'p50_ms': float(np.percentile(arr, 50)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'p99_ms': float(np.percentile(arr, 99)),
+        'max_ms': float(arr.max()),
+        'throughput_per_s': float(arr.size / total) if total > 0 else float('inf'),
+    }
+
+
+def time_calls(fn, iterations, warmup=3):
+    """Call `fn()` `warmup` times untimed, then `iterations` times timed; return summarize()."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def print_table(rows, title=None):
+    """Print {name: summarize()-dict} as a fixed-width table."""
+    if title:
+        print(f"\n{title}")
+    header = f"{'case':<34}{'n':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}"
+    print(header)
+    print('-' * len(header))
+    for name, s in rows.items():
+        print(f"{name:<34}{s['count']:>7}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}"
+              f"{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['throughput_per_s']:>11.1f}")
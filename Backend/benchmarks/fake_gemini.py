@@ -0,0 +1,100 @@
+"""
+Local stand-in for the Gemini generateContent API, for offline tests and load runs.
+
+Answers generateContent and streamGenerateContent (SSE) for any model with a short
+sentence after --latency-ms, and fails a --fail-rate share of requests with a 503 so
+the retry path gets exercised. Point the backend at it with GEMINI_BASE_URL.
+
+Run from Backend/:
+    python -m benchmarks.fake_gemini --port 8765 --latency-ms 300 --fail-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _response(text):
+    return {
+        'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP', 'index': 0}],
+        'usageMetadata': {'promptTokenCount': 1, 'candidatesTokenCount': 1, 'totalTokenCount': 2},
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; with Nagle on, keep-alive clients wait ~40 ms for the delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    fail_rate = 0.0
+    requests_served = 0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        type(self).requests_served += 1
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self._send(503, json.dumps({'error': {'code': 503, 'message': 'fake overload', 'status': 'UNAVAILABLE'}}))
+            return
+        prompt = ''.join(p.get('text', '') for c in payload.get('contents', []) for p in c.get('parts', []))
+        text = f"You're doing great, let's keep going! ({len(prompt)} chars)"
+        if ':streamGenerateContent' in self.path:
+            half = len(text) // 2
+            events = ''.join(f"data: {json.dumps(_response(part))}\r\n\r\n" for part in (text[:half], text[half:]))
+            self._send(200, events, 'text/event-stream')
+        else:
+            self._send(200, json.dumps(_response(text)))
+
+
+def serve(host='127.0.0.1', port=0, latency_ms=0.0, fail_rate=0.0):
+    """
+    Start the fake server on a daemon thread.
+
+    Returns:
+        (ThreadingHTTPServer, str): The server (call shutdown() when done) and its base URL.
+    """
+    handler = type('Handler', (FakeGeminiHandler,), {'latency': latency_ms / 1000.0, 'fail_rate': fail_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = serve(args.host, args.port, args.latency_ms, args.fail_rate)
+    print(f"Fake Gemini listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Load test of the production setup: gunicorn -c gunicorn.conf.py wsgi:app, driven with
+/facedetection frames from several client processes.
+
+For every worker count (and with WSGI_PRELOAD on and off) it reports:
+
+    aggregate frames/s and latency over all clients
+    memory per worker from /proc/<pid>/smaps_rollup: RSS, PSS (shared pages split
+    between the processes mapping them) and USS (pages only this process has).
+    With the models preloaded in the master, the weights count towards every
+    worker's RSS but only once in the PSS total.
+
+Needs gunicorn and Linux /proc. Mongo isn't needed (/facedetection doesn't touch it).
+
+Run from Backend/:
+    python -m benchmarks.load_test --workers 1 2 4 --clients 8 --duration 20
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.common import summarize, synthetic_face_frame
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOUNDARY = 'loadtestboundary'
+
+
+def multipart_frame(jpeg, session_id):
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="session_id"\r\n\r\n{session_id}\r\n'.encode(),
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="frame.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'.encode() + jpeg + b'\r\n',
+        f'--{BOUNDARY}--\r\n'.encode(),
+    ]
+    return b''.join(parts)
+
+
+def client(port, body, deadline, results):
+    """One student's webcam: frames back to back on a keep-alive connection until `deadline`."""
+    headers = {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request('POST', '/facedetection', body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+
+def worker_pids(master_pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The ppid is the 2nd field after the parenthesised command name
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == master_pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return sorted(children)
+
+
+def memory_mb(pid):
+    """RSS, PSS and USS of a process in MB, from smaps_rollup."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024.0
+    uss = fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    return fields.get('Rss', 0.0), fields.get('Pss', 0.0), uss
+
+
+def wait_ready(port, workers, timeout):
+    """Wait until /ready answers 200 and every worker has finished its warm-up."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/ready')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run(args, workers, preload, body, log_dir):
+    port = args.port
+    env = {
+        **os.environ,
+        'WSGI_BIND': f'127.0.0.1:{port}',
+        'WSGI_WORKERS': str(workers),
+        'WSGI_PRELOAD': 'on' if preload else 'off',
+        'MONGO_URI': os.getenv('MONGO_URI', 'mongodb://localhost:27017/main_project?serverSelectionTimeoutMS=200'),
+        'RL_QTABLE_PATH': os.path.join(log_dir, 'rl_qtable.npz'),
+        'RL_TRANSITION_LOG_DIR': os.path.join(log_dir, 'transitions'),
+        'GLOG_minloglevel': '2',
+    }
+    log_path = os.path.join(log_dir, f'gunicorn-{workers}-{preload}.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                                  cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_ready(port, workers, args.startup_timeout):
+            raise RuntimeError(f"gunicorn did not become ready, see {log_path}")
+        # /ready is answered by one worker; give the others time to finish their warm-up
+        deadline = time.time() + args.startup_timeout
+        while time.time() < deadline:
+            with open(log_path) as f:
+                if f.read().count('Emotion pipeline warmed up') >= workers:
+                    break
+            time.sleep(0.5)
+
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        deadline = time.time() + args.duration
+        clients = [ctx.Process(target=client, args=(port, multipart_frame(body, f'load-{i}'), deadline, results))
+                   for i in range(args.clients)]
+        start = time.perf_counter()
+        for proc in clients:
+            proc.start()
+        # Sample memory under load, halfway through
+        time.sleep(args.duration / 2)
+        pids = worker_pids(server.pid)
+        memory = [memory_mb(pid) for pid in pids]
+        master = memory_mb(server.pid)
+        outcomes = [results.get() for _ in clients]
+        elapsed = time.perf_counter() - start
+        for proc in clients:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies = [latency for lat, _ in outcomes for latency in lat]
+    errors = sum(err for _, err in outcomes)
+    summary = summarize(latencies, wall_time=elapsed) if latencies else {}
+    return {
+        'workers': workers,
+        'preload': preload,
+        'frames': len(latencies),
+        'errors': errors,
+        'fps': len(latencies) / elapsed,
+        'p50_ms': summary.get('p50_ms', float('nan')),
+        'p95_ms': summary.get('p95_ms', float('nan')),
+        'rss_mb': sum(m[0] for m in memory) / max(1, len(memory)),
+        'pss_mb': sum(m[1] for m in memory) / max(1, len(memory)),
+        'uss_mb': sum(m[2] for m in memory) / max(1, len(memory)),
+        'total_pss_mb': sum(m[1] for m in memory) + master[1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help="concurrent client processes")
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds of load per configuration")
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--startup-timeout', type=float, default=180.0)
+    parser.add_argument('--no-compare-preload', action='store_true', help="only run with WSGI_PRELOAD=on")
+    args = parser.parse_args()
+
+    ok, encoded = cv2.imencode('.jpg', synthetic_face_frame(640, 480))
+    body = encoded.tobytes()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='load-test-') as log_dir:
+        for workers in args.workers:
+            for preload in ((True,) if args.no_compare_preload else (True, False)):
+                row = run(args, workers, preload, body, log_dir)
+                rows.append(row)
+                print(f"workers={workers} preload={'on' if preload else 'off'}: {row['fps']:.1f} frames/s", flush=True)
+
+    print(f"\n{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:.0f}s per run; memory is per worker (MB)")
+    print(f"{'workers':>7}{'preload':>9}{'frames/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+          f"{'RSS':>9}{'PSS':>9}{'USS':>9}{'PSS total':>11}")
+    for row in rows:
+        print(f"{row['workers']:>7}{'on' if row['preload'] else 'off':>9}{row['fps']:>10.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['errors']:>8}{row['rss_mb']:>9.0f}{row['pss_mb']:>9.0f}"
+              f"{row['uss_mb']:>9.0f}{row['total_pss_mb']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
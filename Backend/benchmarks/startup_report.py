@@ -0,0 +1,90 @@
+"""
+Startup-time report: what importing each module and loading the models costs.
+
+Every measurement runs in a fresh interpreter so earlier imports don't hide later ones.
+`app` is imported with a short Mongo server-selection timeout so a missing database
+doesn't dominate the number.
+
+Run from Backend/:
+    python -m benchmarks.startup_report [--json startup.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'numpy', 'cv2', 'torch', 'torchvision', 'mediapipe', 'google.genai', 'flask', 'flask_pymongo',
+    'gemini_analyzer', 'gemini_avatar_dialogue', 'RL',
+    'EmotionDetection.model', 'EmotionDetection.pipeline',
+    'app',
+]
+
+MEASURE_IMPORT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('torch', 'cv2', 'mediapipe', 'google.genai') if m in sys.modules]
+print(elapsed, ','.join(heavy) or '-')
+"""
+
+MEASURE_STAGES = """
+import time
+start = time.perf_counter()
+from EmotionDetection.model import load_models
+imported = time.perf_counter()
+load_models()
+loaded = time.perf_counter()
+from EmotionDetection.pipeline import emotion_pipeline
+emotion_pipeline.warm_up()
+warmed = time.perf_counter()
+print(imported - start, loaded - imported, warmed - loaded)
+"""
+
+
+def run(code):
+    env = dict(os.environ)
+    env.setdefault('MONGO_URI', 'mongodb://localhost:27017/main_project?serverSelectionTimeoutMS=500')
+    env.setdefault('GLOG_minloglevel', '2')
+    out = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1].split(' ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {'imports': {}, 'models': {}}
+    print(f"{'import':<28}{'seconds':>9}  heavy modules pulled in")
+    print('-' * 70)
+    for module in MODULES:
+        try:
+            elapsed, heavy = run(MEASURE_IMPORT.format(module=module))
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<28}{'failed':>9}  {e.stderr.strip().splitlines()[-1] if e.stderr else ''}")
+            continue
+        report['imports'][module] = {'seconds': float(elapsed), 'heavy_modules': [m for m in heavy.split(',') if m != '-']}
+        print(f"{module:<28}{float(elapsed):>9.3f}  {heavy}")
+
+    try:
+        imported, loaded, warmed = (float(v) for v in run(MEASURE_STAGES))
+        report['models'] = {'import_model_module': imported, 'load_checkpoints': loaded, 'warm_up': warmed}
+        print(f"\n{'import EmotionDetection.model':<28}{imported:>9.3f}")
+        print(f"{'load_models()':<28}{loaded:>9.3f}")
+        print(f"{'pipeline warm_up()':<28}{warmed:>9.3f}")
+    except subprocess.CalledProcessError as e:
+        print(f"\nModel load failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
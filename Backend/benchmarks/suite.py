@@ -0,0 +1,402 @@
+"""
+Benchmark suite for the backend hot paths, with JSON results and a baseline comparison.
+
+Every case runs against synthetic data: the crude face from benchmarks.common for the
+emotion pipeline, mongomock in place of MongoDB, and benchmarks.fake_gemini in place of
+the Gemini API, so runs are reproducible offline and on CI.
+
+    get_box, pth_processing, backbone.extract_features, lstm.forward
+    rl.choose_action, rl.update, gemini.generate
+    POST /facedetection, /save-assessment (JSON and base64 image), /rl_action
+
+Each case reports count, mean/p50/p95/p99/max latency and throughput. With --baseline,
+p50 and p95 are compared against a stored run and the suite exits with status 1 when a
+case got slower by more than --tolerance (and by more than --min-delta-ms). The stored
+baseline records the machine it came from; compare on similar hardware.
+
+Run from Backend/:
+    python -m benchmarks.suite --out results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.suite --save-baseline          # refresh benchmarks/baseline.json
+    python -m benchmarks.suite --only rl. get_box --scale 0.2
+"""
+import argparse
+import base64
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from functools import cached_property
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/main_project?serverSelectionTimeoutMS=200')
+os.environ.setdefault('GLOG_minloglevel', '2')
+
+import cv2
+import numpy as np
+
+from benchmarks.common import synthetic_face_frame, synthetic_face_crop, time_calls
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+# Latency percentiles compared against the baseline
+COMPARED_METRICS = ('p50_ms', 'p95_ms')
+# Slowdowns smaller than this are timer noise on microsecond cases, whatever the percentage
+MIN_DELTA_MS = 0.05
+
+
+class Fixtures:
+    def __init__(self, gemini_latency_ms=0.0):
+        """
+        Shared setup for the cases, built on first use so `--only rl.` never loads torch
+        or the Flask app.
+        """
+        self.gemini_latency_ms = gemini_latency_ms
+        self._closers = []
+
+    @cached_property
+    def gemini_url(self):
+        from benchmarks.fake_gemini import serve
+        server, url = serve(latency_ms=self.gemini_latency_ms)
+        self._closers.append(server.shutdown)
+        return url
+
+    @cached_property
+    def app(self):
+        """The Flask app on mongomock and the fake Gemini, with a logged-in benchmark user."""
+        # Read at import time by gemini_client, image_store and ld_jobs
+        os.environ['GEMINI_BASE_URL'] = self.gemini_url
+        os.environ.setdefault('GEMINI_API_KEY', 'fake')
+        os.environ['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='bench-uploads-')
+        os.environ['GEMINI_FAKE_DELAY'] = '0'
+        # Keep the RL snapshot and transition logs the benchmark produces out of Backend/
+        rl_dir = tempfile.mkdtemp(prefix='bench-rl-')
+        os.environ['RL_QTABLE_PATH'] = os.path.join(rl_dir, 'rl_qtable.npz')
+        os.environ['RL_TRANSITION_LOG_DIR'] = os.path.join(rl_dir, 'transitions')
+        import logging
+        import jwt
+        import mongomock
+        import app as backend
+        from gemini_analyzer import identify_fake
+        from ld_jobs import LDAnalysisQueue
+
+        # Per-request INFO lines would dominate the terminal and the timings
+        logging.getLogger().setLevel(logging.WARNING)
+        db = mongomock.MongoClient().main_project
+        backend.mongo.db = db
+        # The LD report is a long JSON document the fake server can't produce; use the offline stand-in
+        backend.ld_analysis_queue = LDAnalysisQueue(db.assessments, identify_fake)
+        user_id = db.users.insert_one({'email': 'bench@example.com', 'username': 'bench', 'password': 'x',
+                                       'created_at': '2025-01-01T00:00:00+00:00'}).inserted_id
+        token = jwt.encode({
+            'email': 'bench@example.com', 'uid': str(user_id), 'username': 'bench',
+            'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+        }, backend.app.config['SECRET_KEY'], algorithm="HS256")
+        self.headers = {'Authorization': f'Bearer {token}'}
+        return backend
+
+    @cached_property
+    def client(self):
+        return self.app.app.test_client()
+
+    @cached_property
+    def jpeg(self):
+        ok, encoded = cv2.imencode('.jpg', synthetic_face_frame(640, 480))
+        return encoded.tobytes()
+
+    def close(self):
+        for close in self._closers:
+            close()
+
+
+def expect(response, *statuses):
+    assert response.status_code in statuses, f"{response.status_code}: {response.get_data(as_text=True)[:200]}"
+
+
+def emotion_tracking_data(n=300):
+    """What the frontend sends as emotionTrackingData for a few minutes of webcam tracking."""
+    rng = np.random.default_rng(0)
+    labels = ['Neutral', 'Happiness', 'Sadness', 'Surprise', 'Fear', 'Disgust', 'Anger']
+    return [{'timestamp': 1_700_000_000_000 + 1000 * i, 'emotion': labels[int(rng.integers(len(labels)))],
+             'confidence': float(rng.uniform(0.3, 1.0))} for i in range(n)]
+
+
+def assessment_payload(with_image=False):
+    payload = {
+        'numberComparison': {'answers': [{'left': i, 'right': i + 1, 'correct': bool(i % 3), 'ms': 900 + i}
+                                         for i in range(20)],
+                             'summary': {'accuracy': 0.65, 'averageResponseTime': 1.1}},
+        'letterArrangement': {'accuracy': 0.8, 'attempts': [{'word': 'cat', 'answer': 'act'}] * 10},
+        'handwriting': {'text': 'the quick brown fox'},
+        'completedAt': '2025-01-01T00:10:00Z',
+        'emotionTrackingData': emotion_tracking_data(),
+    }
+    if with_image:
+        crop = cv2.cvtColor(synthetic_face_crop(200), cv2.COLOR_RGB2BGR)
+        png = cv2.imencode('.png', crop)[1].tobytes()
+        payload['handwriting']['imageData'] = 'data:image/png;base64,' + base64.b64encode(png).decode()
+    return payload
+
+
+# Each setup takes the Fixtures and returns the zero-argument callable that gets timed
+
+def setup_get_box(fx):
+    from benchmarks.bench_get_box import synthetic_landmarks
+    from EmotionDetection.utlis import get_box
+    fl = synthetic_landmarks()
+    return lambda: get_box(fl, 640, 480)
+
+
+def setup_pth_processing(fx):
+    from EmotionDetection.utlis import pth_processing
+    face = synthetic_face_crop(160)
+    return lambda: pth_processing(face)
+
+
+def setup_extract_features(fx):
+    import torch
+    from EmotionDetection.model import pth_backbone_model
+    from EmotionDetection.utlis import pth_processing
+    face = pth_processing(synthetic_face_crop(160)).clone()
+
+    def run():
+        with torch.no_grad():
+            pth_backbone_model.extract_features(face)
+    return run
+
+
+def setup_lstm_forward(fx):
+    import torch
+    from EmotionDetection.model import pth_LSTM_model
+    from EmotionDetection.temporal import SEQUENCE_LENGTH
+    window = torch.randn(1, SEQUENCE_LENGTH, 512, generator=torch.Generator().manual_seed(0))
+
+    def run():
+        with torch.no_grad():
+            pth_LSTM_model(window)
+    return run
+
+
+def _rl_agent():
+    import random
+    from RL import create_rl_agent, RL_ACTIONS
+    from EmotionDetection.labels import DICT_EMO
+    random.seed(0)
+    states = list(DICT_EMO.values())
+    # The representation app.py uses (RL_Q_TABLE)
+    agent = create_rl_agent(states=states, seed=0)
+    for i in range(1000):
+        agent.update(states[i % len(states)], RL_ACTIONS[i % len(RL_ACTIONS)], random.uniform(-1, 1),
+                     states[(i * 7) % len(states)])
+    return agent, states, RL_ACTIONS
+
+
+def setup_rl_choose_action(fx):
+    agent, states, _ = _rl_agent()
+    it = iter(range(sys.maxsize))
+    return lambda: agent.choose_action(states[next(it) % len(states)])
+
+
+def setup_rl_update(fx):
+    agent, states, actions = _rl_agent()
+    it = iter(range(sys.maxsize))
+
+    def run():
+        i = next(it)
+        agent.update(states[i % len(states)], actions[i % len(actions)], 0.5, states[(i * 3) % len(states)])
+    return run
+
+
+def setup_gemini_generate(fx):
+    os.environ['GEMINI_BASE_URL'] = fx.gemini_url
+    from google.genai import types
+    from gemini_client import GeminiClient
+    client = GeminiClient(api_key='fake', base_url=fx.gemini_url)
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text="Emotional state: Happy")])]
+    return lambda: client.generate(contents, types.GenerateContentConfig(max_output_tokens=100))
+
+
+def setup_facedetection(fx):
+    client, jpeg = fx.client, fx.jpeg
+    fx.app.warm_up()
+
+    def run():
+        from io import BytesIO
+        expect(client.post('/facedetection', data={'image': (BytesIO(jpeg), 'frame.jpg'), 'session_id': 'bench'},
+                           content_type='multipart/form-data'), 200)
+    return run
+
+
+def _setup_save_assessment(fx, with_image):
+    client = fx.client
+    body = json.dumps(assessment_payload(with_image))
+    headers = {**fx.headers, 'Content-Type': 'application/json'}
+    return lambda: expect(client.post('/save-assessment', data=body, headers=headers), 202)
+
+
+def setup_save_assessment(fx):
+    return _setup_save_assessment(fx, with_image=False)
+
+
+def setup_save_assessment_image(fx):
+    return _setup_save_assessment(fx, with_image=True)
+
+
+def setup_rl_action(fx):
+    client, backend = fx.client, fx.app
+    for label in ['Happiness', 'Neutral', 'Happiness', 'Sadness', 'Happiness']:
+        backend.emotion_history.append('bench-rl', label)
+    headers = {'X-Session-Id': 'bench-rl'}
+    return lambda: expect(client.post('/rl_action', json={'context': 'Lesson 3: Addition'}, headers=headers), 200)
+
+
+# name -> (setup, default iterations)
+CASES = {
+    'get_box': (setup_get_box, 2000),
+    'pth_processing': (setup_pth_processing, 1000),
+    'backbone.extract_features': (setup_extract_features, 30),
+    'lstm.forward': (setup_lstm_forward, 500),
+    'rl.choose_action': (setup_rl_choose_action, 20000),
+    'rl.update': (setup_rl_update, 20000),
+    'gemini.generate': (setup_gemini_generate, 200),
+    'route.facedetection': (setup_facedetection, 50),
+    'route.save_assessment': (setup_save_assessment, 200),
+    'route.save_assessment_image': (setup_save_assessment_image, 100),
+    'route.rl_action': (setup_rl_action, 500),
+}
+
+
+def environment():
+    """Where the numbers came from; a baseline from another machine is only a rough guide."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    info = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+    if 'torch' in sys.modules:
+        torch = sys.modules['torch']
+        info.update(torch=torch.__version__, torch_threads=torch.get_num_threads())
+    return info
+
+
+def run_cases(names, scale, warmup, fx):
+    results = {}
+    for name in names:
+        setup, iterations = CASES[name]
+        iterations = max(5, int(iterations * scale))
+        # Some routes print() what they send to Gemini; keep that out of the table
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            fn = setup(fx)
+            results[name] = time_calls(fn, iterations, warmup=warmup)
+        s = results[name]
+        print(f"{name:<30}{s['count']:>7}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}"
+              f"{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['throughput_per_s']:>11.1f}", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms=MIN_DELTA_MS):
+    """
+    Print current vs baseline per case and return the names of the cases where p50 or p95
+    grew by more than `tolerance` (0.25 = 25% slower) and by more than `min_delta_ms`.
+    """
+    base_results = baseline.get('results', {})
+    base_env = baseline.get('environment', {})
+    current_env = environment()
+    for key in ('machine', 'cpu_count', 'python'):
+        if base_env.get(key) != current_env.get(key):
+            print(f"\nnote: baseline {key} was {base_env.get(key)!r}, this run {current_env.get(key)!r}; "
+                  f"expect differences unrelated to the code")
+
+    header = f"{'case':<30}{'base p50':>10}{'p50':>10}{'change':>9}{'base p95':>10}{'p95':>10}{'change':>9}  "
+    print(f"\nAgainst baseline from {base_env.get('created_at', '?')} (commit {base_env.get('commit', '?')}), "
+          f"tolerance {tolerance:.0%}")
+    print(header)
+    print('-' * len(header))
+    regressions = []
+    for name, current in results.items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<30}{'(new case, no baseline)':>58}")
+            continue
+        cells, regressed = [], False
+        for metric in COMPARED_METRICS:
+            change = current[metric] / base[metric] - 1.0 if base[metric] > 0 else 0.0
+            regressed = regressed or (change > tolerance and current[metric] - base[metric] > min_delta_ms)
+            cells.append(f"{base[metric]:>10.3f}{current[metric]:>10.3f}{change:>+9.1%}")
+        print(f"{name:<30}{''.join(cells)}  {'REGRESSED' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', metavar='PREFIX', help="run only cases whose name starts with one of these")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every case's iteration count")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--gemini-latency-ms', type=float, default=0.0, help="latency of the fake Gemini server")
+    parser.add_argument('--threads', type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument('--out', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against this results file (e.g. benchmarks/baseline.json)")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed p50/p95 slowdown before failing")
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_DELTA_MS,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                        help=f"store this run as the baseline (default {os.path.relpath(DEFAULT_BASELINE)})")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, iterations) in CASES.items():
+            print(f"{name:<30}{iterations:>7}")
+        return 0
+    names = [n for n in CASES if not args.only or any(n.startswith(p) for p in args.only)]
+    if not names:
+        parser.error(f"no case matches {args.only}")
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    header = f"{'case':<30}{'n':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}"
+    print(header)
+    print('-' * len(header))
+    fx = Fixtures(gemini_latency_ms=args.gemini_latency_ms)
+    try:
+        results = run_cases(names, args.scale, args.warmup, fx)
+    finally:
+        fx.close()
+
+    report = {'environment': environment(), 'settings': {'scale': args.scale, 'warmup': args.warmup,
+                                                         'gemini_latency_ms': args.gemini_latency_ms},
+              'results': results}
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PHRASE_BANK_PATH = os.getenv('PHRASE_BANK_PATH', os.path.join(BACKEND_DIR, 'phrase_bank.json'))
+DIALOGUE_CACHE_SIZE = int(os.getenv('DIALOGUE_CACHE_SIZE', 512))
+DIALOGUE_CACHE_TTL = float(os.getenv('DIALOGUE_CACHE_TTL', 6 * 60 * 60))
+# Distinct sentences kept per (action, state, context) so the avatar doesn't repeat itself
+DIALOGUE_VARIANTS = int(os.getenv('DIALOGUE_VARIANTS', 4))
+
+
+def bank_key(action, state):
+    return f"{action}|{state}"
+
+
+def load_phrase_bank(path=PHRASE_BANK_PATH):
+    """Read a phrase bank written by `python dialogue_cache.py`; {} if there is none."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read phrase bank {path}: {str(e)}")
+        return {}
+
+
+class _Entry:
+    __slots__ = ('variants', 'expires_at')
+
+    def __init__(self, variants, expires_at):
+        self.variants = variants
+        self.expires_at = expires_at
+
+
+class DialogueCache:
+    def __init__(self, generate, max_entries=DIALOGUE_CACHE_SIZE, ttl=DIALOGUE_CACHE_TTL,
+                 variants=DIALOGUE_VARIANTS, phrase_bank=None):
+        """
+        LRU + TTL cache of avatar sentences keyed by (action, state, context).
+
+        A miss calls `generate` once and caches the sentence. Hits return a random cached
+        variant immediately; while a key has fewer than `variants` sentences, one more is
+        generated in the background so variety grows without slowing any request.
+        Context-free keys are served from the pre-generated phrase bank when present.
+
+        Parameters:
+            generate (callable): (action, state, user_context) -> sentence; the Gemini call.
+            max_entries (int): Keys kept before the least recently used is evicted.
+            ttl (float): Seconds a generated sentence may be served.
+            variants (int): Target number of sentences per key.
+            phrase_bank (dict): {"action|state": [sentences]} from load_phrase_bank().
+        """
+        self.generate = generate
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = variants
+        self.phrase_bank = phrase_bank or {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refilling = set()
+        self._refill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dialogue-refill')
+        self.hits = 0
+        self.bank_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.refills = 0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(action, state, context):
+        return (action, state, (context or '').strip())
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, sentence):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                entry = _Entry([], time.monotonic() + self.ttl)
+                self._entries[key] = entry
+            if sentence not in entry.variants and len(entry.variants) < self.variants:
+                entry.variants.append(sentence)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refill(self, key):
+        action, state, context = key
+        try:
+            sentence = self.generate(action, state, context or None)
+            if sentence:
+                self._store(key, sentence)
+                with self._lock:
+                    self.refills += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.warning(f"Background dialogue generation failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def get(self, action, state, context=None):
+        """
+        A sentence for the avatar.
+
+        Raises whatever `generate` raises on a miss that the phrase bank can't cover.
+        """
+        key = self.make_key(action, state, context)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and entry.variants:
+                self.hits += 1
+                sentence = random.choice(entry.variants)
+                if len(entry.variants) < self.variants and key not in self._refilling:
+                    self._refilling.add(key)
+                    self._refill_executor.submit(self._refill, key)
+                return sentence
+            banked = self.phrase_bank.get(bank_key(action, state)) if not key[2] else None
+            if banked:
+                self.bank_hits += 1
+                return random.choice(banked)
+            self.misses += 1
+
+        start = time.perf_counter()
+        try:
+            sentence = self.generate(action, state, context)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.miss_seconds += time.perf_counter() - start
+        if sentence:
+            self._store(key, sentence)
+        return sentence
+
+    def fallback(self, action, state):
+        """A banked sentence for (action, state) when generation failed, or None."""
+        banked = self.phrase_bank.get(bank_key(action, state))
+        return random.choice(banked) if banked else None
+
+    def stats(self):
+        with self._lock:
+            entries, hits, bank_hits, misses = len(self._entries), self.hits, self.bank_hits, self.misses
+            errors, refills, miss_seconds = self.errors, self.refills, self.miss_seconds
+        lookups = hits + bank_hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'bank_hits': bank_hits,
+            'misses': misses,
+            'errors': errors,
+            'background_refills': refills,
+            'hit_rate': (hits + bank_hits) / lookups if lookups else 0.0,
+            'mean_miss_ms': 1000.0 * miss_seconds / misses if misses else 0.0,
+        }
+
+
+def pregenerate_phrase_bank(generate, actions, states, variants=DIALOGUE_VARIANTS, path=PHRASE_BANK_PATH):
+    """
+    Fill the phrase bank with `variants` sentences for every (action, state) pair, keeping
+    any sentences already banked, and write it to `path` atomically.
+    """
+    bank = load_phrase_bank(path)
+    for state in states:
+        for action in actions:
+            sentences = bank.setdefault(bank_key(action, state), [])
+            attempts = 0
+            while len(sentences) < variants and attempts < variants * 2:
+                attempts += 1
+                try:
+                    sentence = generate(action, state, None)
+                except Exception as e:
+                    logger.warning(f"Generation failed for {action!r}/{state!r}: {str(e)}")
+                    continue
+                if sentence and sentence not in sentences:
+                    sentences.append(sentence)
+            print(f"{state:<10} {action:<22} {len(sentences)} sentences")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(bank, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return bank
+
+
+if __name__ == "__main__":
+    from gemini_avatar_dialogue import generate_dialgoue_client_sdk
+    from EmotionDetection.labels import DICT_EMO
+    from RL import RL_ACTIONS
+
+    parser = argparse.ArgumentParser(description="Pre-generate the avatar phrase bank for every action/emotion pair.")
+    parser.add_argument('--variants', type=int, default=DIALOGUE_VARIANTS)
+    parser.add_argument('--out', default=PHRASE_BANK_PATH)
+    args = parser.parse_args()
+    pregenerate_phrase_bank(generate_dialgoue_client_sdk, RL_ACTIONS, list(DICT_EMO.values()), args.variants, args.out)
@@ -0,0 +1,194 @@
+import os
+import re
+
+import numpy as np
+from bson import Binary
+
+# What the LD analysis sees of emotionTrackingData: 'runs' (label runs and value ranges) or 'raw'
+EMOTION_ANALYSIS_INPUT = os.getenv('EMOTION_ANALYSIS_INPUT', 'runs').lower()
+
+CODEC = 'columnar-v1'
+# The assessment fields stored packed
+PACKED_FIELDS = ('emotions', 'emotionTrackingData')
+# Date.prototype.toISOString(), what the frontend stamps tracking entries with
+JS_ISO_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$')
+INT_DTYPES = ('<i1', '<i2', '<i4', '<i8')
+# Shorter lists are stored as they are: the codec's fixed overhead outweighs the saving
+MIN_PACKED_ENTRIES = 16
+
+
+def _pack_ints(values):
+    """An int64 array as little-endian bytes of the narrowest integer type that holds it."""
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return {'dtype': dtype, 'data': Binary(values.astype(dtype).tobytes())}
+
+
+def _unpack_array(packed):
+    return np.frombuffer(packed['data'], dtype=packed['dtype'])
+
+
+def _label_column(values):
+    """Dictionary encoding plus run lengths: one (id, length) pair per run of equal labels."""
+    index = {}
+    ids = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    lengths = np.diff(np.r_[starts, len(ids)])
+    return {'kind': 'label', 'values': list(index), 'ids': _pack_ints(ids[starts]), 'runs': _pack_ints(lengths)}
+
+
+def _delta_column(kind, values):
+    """First value plus successive differences, which stay small for timestamps at a steady rate."""
+    return {'kind': kind, 'start': int(values[0]), 'deltas': _pack_ints(np.diff(values))}
+
+
+def _pack_column(values):
+    """The packed form of one column, or None when it can't be stored losslessly."""
+    if all(type(v) is str for v in values):
+        if all(JS_ISO_TIMESTAMP.match(v) for v in values):
+            try:
+                # numpy parses naive ISO strings; the trailing Z is put back on decode
+                ms = np.array([v[:-1] for v in values], dtype='datetime64[ms]').astype(np.int64)
+                return _delta_column('iso-time', ms)
+            except ValueError:
+                pass  # e.g. a 31st of February: keep it as a label
+        return _label_column(values)
+    if all(type(v) is int for v in values):
+        try:
+            return _delta_column('int', np.array(values, dtype=np.int64))
+        except OverflowError:
+            return None
+    if all(type(v) is float for v in values):
+        floats = np.array(values, dtype=np.float64)
+        narrow = floats.astype(np.float32)
+        # float32 halves the size, but only when no value loses digits
+        packed = narrow if np.array_equal(narrow.astype(np.float64), floats) else floats
+        return {'kind': 'float', 'values': {'dtype': packed.dtype.str, 'data': Binary(packed.tobytes())}}
+    return None
+
+
+def _unpack_column(column):
+    kind = column['kind']
+    if kind == 'label':
+        vocabulary = np.array(column['values'], dtype=object)
+        return np.repeat(vocabulary[_unpack_array(column['ids'])], _unpack_array(column['runs'])).tolist()
+    if kind in ('int', 'iso-time'):
+        deltas = _unpack_array(column['deltas']).astype(np.int64)
+        values = np.concatenate(([column['start']], column['start'] + np.cumsum(deltas)))
+        if kind == 'int':
+            return values.tolist()
+        return [s + 'Z' for s in np.datetime_as_string(values.astype('datetime64[ms]'), unit='ms').tolist()]
+    if kind == 'float':
+        return _unpack_array(column['values']).tolist()
+    raise ValueError(f"Unknown packed column kind: {kind}")
+
+
+def is_packed(value):
+    return isinstance(value, dict) and value.get('codec') == CODEC
+
+
+def pack(values):
+    """
+    Columnar encoding of a list of labels (`emotions`) or of flat dicts with the same keys
+    (`emotionTrackingData`), stored as BSON binary:
+
+        strings       dictionary + run-length encoded ids
+        ISO times     epoch milliseconds, delta encoded
+        ints          delta encoded
+        floats        packed float32 when exact, else float64
+
+    Integer arrays use the narrowest type that holds them. Anything that wouldn't come
+    back exactly (None, booleans, nested values, mixed types, differing keys) is
+    returned unchanged, so pack() never loses data; so are lists shorter than
+    MIN_PACKED_ENTRIES.
+
+    Parameters:
+        values (list): The field as posted.
+
+    Returns:
+        dict | list: The packed document, or `values` itself.
+    """
+    if not isinstance(values, list) or len(values) < MIN_PACKED_ENTRIES:
+        return values
+    if all(type(v) is str for v in values):
+        return {'codec': CODEC, 'n': len(values), **_label_column(values)}
+    if not all(type(v) is dict for v in values):
+        return values
+    names = list(values[0])
+    if not all(isinstance(name, str) for name in names) or any(list(v) != names for v in values):
+        return values
+    columns = []
+    for name in names:
+        column = _pack_column([v[name] for v in values])
+        if column is None:
+            return values
+        columns.append({'name': name, **column})
+    return {'codec': CODEC, 'n': len(values), 'columns': columns}
+
+
+def unpack(value):
+    """The list pack() was given; anything not packed is returned as is."""
+    if not is_packed(value):
+        return value
+    if 'columns' not in value:
+        return _unpack_column(value)
+    names = [column['name'] for column in value['columns']]
+    columns = [_unpack_column(column) for column in value['columns']]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def pack_assessment(assessment):
+    """Pack the emotion fields of an assessment document in place."""
+    for field in PACKED_FIELDS:
+        if field in assessment:
+            assessment[field] = pack(assessment[field])
+    return assessment
+
+
+def unpack_assessment(assessment):
+    """Decode whichever packed emotion fields the document was fetched with, in place."""
+    for field in PACKED_FIELDS:
+        if is_packed(assessment.get(field)):
+            assessment[field] = unpack(assessment[field])
+    return assessment
+
+
+def summarize(value):
+    """
+    A compact JSON view of emotionTrackingData for the LD analysis prompt: runs of labels
+    as [label, count] pairs, first/last for times and ints, min/mean/max for floats.
+    Lists that can't be packed are returned as they are.
+    """
+    packed = value if is_packed(value) else pack(value)
+    if not is_packed(packed) or 'columns' not in packed:
+        return unpack(packed)
+    summary = {'entries': packed['n']}
+    for column in packed['columns']:
+        kind = column['kind']
+        if kind == 'label':
+            labels = np.array(column['values'], dtype=object)[_unpack_array(column['ids'])]
+            summary[column['name']] = [[label, int(n)] for label, n in zip(labels, _unpack_array(column['runs']))]
+        elif kind == 'float':
+            floats = _unpack_array(column['values'])
+            summary[column['name']] = {'min': float(floats.min()), 'mean': round(float(floats.mean()), 4),
+                                       'max': float(floats.max())}
+        else:
+            values = _unpack_column(column)
+            summary[column['name']] = {'first': values[0], 'last': values[-1]}
+    return summary
+
+
+def analysis_view(assessment):
+    """
+    What gemini_analyzer.identify gets for an assessment, packed or not: plain `emotions`
+    and, with EMOTION_ANALYSIS_INPUT=runs, emotionTrackingData as summarize() runs
+    instead of one JSON object per webcam frame.
+    """
+    view = dict(assessment)
+    if 'emotions' in view:
+        view['emotions'] = unpack(view['emotions'])
+    if 'emotionTrackingData' in view:
+        tracking = view['emotionTrackingData']
+        view['emotionTrackingData'] = summarize(tracking) if EMOTION_ANALYSIS_INPUT == 'runs' else unpack(tracking)
+    return view
@@ -0,0 +1,193 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+
+DEFAULT_MAX_HISTORY = int(os.getenv('EMOTION_HISTORY_MAX', 50))
+# Histories nobody has appended to for this long are dropped
+DEFAULT_HISTORY_TTL = int(os.getenv('EMOTION_HISTORY_TTL', 6 * 60 * 60))
+# Histories one process keeps in memory; the least recently appended one is dropped beyond this
+DEFAULT_MAX_KEYS = int(os.getenv('EMOTION_HISTORY_MAX_KEYS', 4096))
+
+
+class InMemoryEmotionHistoryStore:
+    def __init__(self, max_history=DEFAULT_MAX_HISTORY, ttl=DEFAULT_HISTORY_TTL, max_keys=DEFAULT_MAX_KEYS):
+        """
+        Per-user emotion histories held in bounded deques inside this process.
+
+        Keys are kept in order of their last append, so the least recently appended history
+        is dropped once there are more than `max_keys`, and histories idle for longer than
+        `ttl` seconds are pruned from the front on the next append.
+
+        Only correct with a single worker process; use the Mongo or Redis store when scaling out.
+
+        Parameters:
+            max_history (int): Labels kept per user; older ones fall off in O(1).
+            ttl (int): Seconds after the last append before the history is dropped.
+            max_keys (int): Histories kept at once.
+        """
+        self.max_history = max_history
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._histories = OrderedDict()  # key -> (last append, deque of labels)
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._histories.get(key)
+        if entry is None or now - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def append(self, key, label):
+        now = time.monotonic()
+        with self._lock:
+            history = self._live(key, now)
+            if history is None:
+                history = deque(maxlen=self.max_history)
+            history.append(label)
+            self._histories[key] = (now, history)
+            self._histories.move_to_end(key)
+            while self._histories:
+                oldest_key, (last_append, _) = next(iter(self._histories.items()))
+                if len(self._histories) <= self.max_keys and now - last_append <= self.ttl:
+                    break
+                del self._histories[oldest_key]
+
+    def recent(self, key, n):
+        """The last `n` labels for `key`, oldest first (fewer if the history is shorter)."""
+        with self._lock:
+            history = self._live(key, time.monotonic())
+            if not history:
+                return []
+            return list(islice(reversed(history), n))[::-1]
+
+    def snapshot(self, key):
+        with self._lock:
+            return list(self._live(key, time.monotonic()) or ())
+
+    def length(self, key):
+        with self._lock:
+            return len(self._live(key, time.monotonic()) or ())
+
+    def __len__(self):
+        return len(self._histories)
+
+    def clear(self, key):
+        with self._lock:
+            self._histories.pop(key, None)
+
+
+class MongoEmotionHistoryStore:
+    def __init__(self, collection, max_history=DEFAULT_MAX_HISTORY, ttl=DEFAULT_HISTORY_TTL):
+        """
+        Per-user emotion histories in a Mongo collection, shared by every worker process.
+
+        Each key is one document whose `labels` array is capped with $push/$slice, so an
+        append is a single atomic update and no worker ever reads a half-trimmed list.
+
+        Parameters:
+            collection: PyMongo collection, e.g. mongo.db.emotion_history.
+            max_history (int): Labels kept per user.
+            ttl (int): Seconds after the last append before Mongo expires the history.
+        """
+        self.collection = collection
+        self.max_history = max_history
+        try:
+            collection.create_index('updated_at', expireAfterSeconds=ttl)
+        except Exception:
+            pass  # the history still works, it just isn't expired
+
+    def append(self, key, label):
+        self.collection.update_one(
+            {'_id': key},
+            {
+                '$push': {'labels': {'$each': [label], '$slice': -self.max_history}},
+                '$set': {'updated_at': datetime.datetime.now(datetime.timezone.utc)},
+            },
+            upsert=True,
+        )
+
+    def recent(self, key, n):
+        doc = self.collection.find_one({'_id': key}, {'labels': {'$slice': -n}})
+        return doc.get('labels', []) if doc else []
+
+    def snapshot(self, key):
+        doc = self.collection.find_one({'_id': key}, {'labels': 1})
+        return doc.get('labels', []) if doc else []
+
+    def length(self, key):
+        result = list(self.collection.aggregate([
+            {'$match': {'_id': key}},
+            {'$project': {'n': {'$size': '$labels'}}},
+        ]))
+        return result[0]['n'] if result else 0
+
+    def clear(self, key):
+        self.collection.delete_one({'_id': key})
+
+
+class RedisEmotionHistoryStore:
+    def __init__(self, client, max_history=DEFAULT_MAX_HISTORY, ttl=DEFAULT_HISTORY_TTL, prefix='emotion_history:'):
+        """
+        Per-user emotion histories as capped Redis lists (RPUSH + LTRIM), shared across workers.
+
+        Parameters:
+            client: A redis-py compatible client (redis.Redis, or fakeredis for local runs).
+            max_history (int): Labels kept per user.
+            ttl (int): Seconds after the last append before the list expires.
+            prefix (str): Key namespace.
+        """
+        self.client = client
+        self.max_history = max_history
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def append(self, key, label):
+        name = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.rpush(name, label)
+        pipe.ltrim(name, -self.max_history, -1)
+        pipe.expire(name, self.ttl)
+        pipe.execute()
+
+    def _decode(self, values):
+        return [v.decode() if isinstance(v, bytes) else v for v in values]
+
+    def recent(self, key, n):
+        if n <= 0:
+            return []
+        return self._decode(self.client.lrange(self.prefix + key, -n, -1))
+
+    def snapshot(self, key):
+        return self._decode(self.client.lrange(self.prefix + key, 0, -1))
+
+    def length(self, key):
+        return self.client.llen(self.prefix + key)
+
+    def clear(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def create_emotion_history_store(backend=None, mongo_db=None, redis_url=None, max_history=DEFAULT_MAX_HISTORY):
+    """
+    Build the emotion history store named by `backend` (default: $EMOTION_HISTORY_BACKEND or 'memory').
+
+    Parameters:
+        backend (str): 'memory', 'mongo' or 'redis'.
+        mongo_db: PyMongo database, required for 'mongo'.
+        redis_url (str): Redis URL for 'redis' (default: $REDIS_URL).
+        max_history (int): Labels kept per user.
+    """
+    backend = (backend or os.getenv('EMOTION_HISTORY_BACKEND', 'memory')).lower()
+    if backend == 'memory':
+        return InMemoryEmotionHistoryStore(max_history)
+    if backend == 'mongo':
+        if mongo_db is None:
+            raise ValueError("The mongo emotion history backend needs a database")
+        return MongoEmotionHistoryStore(mongo_db.emotion_history, max_history)
+    if backend == 'redis':
+        import redis  # optional dependency, only needed for this backend
+        return RedisEmotionHistoryStore(redis.Redis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')), max_history)
+    raise ValueError(f"Unknown emotion history backend: {backend}")
@@ -0,0 +1,121 @@
+import json
+import logging
+import threading
+import time
+
+from EmotionDetection.errors import PipelineError
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameSlot:
+    def __init__(self):
+        """
+        One-frame mailbox between a WebSocket reader and its inference worker. put()
+        overwrites a frame that hasn't been taken yet, so a slow model never builds a
+        backlog: it always works on the newest frame and stale ones are dropped.
+        """
+        self._frame = None
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, frame, seq):
+        """Store `frame`; returns True if it replaced one that was never processed."""
+        with self._cond:
+            dropped = self._frame is not None
+            self._frame, self._seq = frame, seq
+            self._cond.notify()
+            return dropped
+
+    def take(self, timeout=None):
+        """(frame, seq) once one is available; (None, None) on timeout or after close()."""
+        with self._cond:
+            if self._frame is None and not self._closed:
+                self._cond.wait(timeout)
+            frame, seq = self._frame, self._seq
+            self._frame = None
+            return (frame, seq) if frame is not None else (None, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._frame = None
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class FrameStream:
+    def __init__(self, process_frame, send, on_result=None):
+        """
+        Runs the emotion pipeline for one WebSocket connection on its own worker thread.
+
+        Parameters:
+            process_frame (callable): Encoded frame bytes -> result dict or None
+                (EmotionPipeline.process_frame bound to the connection's session).
+            send (callable): Pushes a text message to the client. Only called through
+                push(), one message at a time.
+            on_result (callable): Called with each result dict, e.g. to record the emotion history.
+        """
+        self.process_frame = process_frame
+        self.send = send
+        self.on_result = on_result
+        self._send_lock = threading.Lock()
+        self.slot = LatestFrameSlot()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self._worker = threading.Thread(target=self._run, name='frame-stream', daemon=True)
+        self._worker.start()
+
+    def receive(self, frame):
+        """Hand a frame from the socket to the worker, dropping the previous one if it is still waiting."""
+        self.received += 1
+        if self.slot.put(frame, self.received):
+            self.dropped += 1
+
+    def push(self, message):
+        """Send a text message; the worker and the socket's reader loop both send through here."""
+        with self._send_lock:
+            self.send(message)
+
+    def _message(self, seq, started, **fields):
+        return json.dumps({
+            'seq': seq,
+            'latency_ms': round(1000.0 * (time.perf_counter() - started), 2),
+            'dropped': self.dropped,
+            **fields,
+        })
+
+    def _run(self):
+        while not self.slot.closed:
+            frame, seq = self.slot.take(timeout=1.0)
+            if frame is None:
+                continue
+            started = time.perf_counter()
+            try:
+                result = self.process_frame(frame)
+                if result is None:
+                    message = self._message(seq, started, type='no_face', message='No face detected')
+                else:
+                    if self.on_result:
+                        self.on_result(result)
+                    message = self._message(seq, started, type='result', **result)
+            except PipelineError as pe:
+                message = self._message(seq, started, type='error', message=pe.message, status=pe.status)
+            except Exception as e:
+                logger.exception("Error in face detection stream:")
+                message = self._message(seq, started, type='error', message=f"Server error during face detection: {str(e)}", status=500)
+            self.processed += 1
+            try:
+                self.push(message)
+            except Exception:
+                # Client went away; the reader side notices and closes the stream
+                self.slot.close()
+
+    def close(self):
+        self.slot.close()
+        self._worker.join(timeout=5)
@@ -3,8 +3,8 @@ import os
 import json
 import re
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from gemini_client import get_gemini_client
+from metrics import stage_timer
 
 load_dotenv()
 
@@ -27,9 +27,9 @@ def markdown_to_json(markdown_text):
         return None
 
 def identify(data):
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-    model = "gemini-2.0-flash"
-    
+    # The google-genai SDK is slow to import, so only processes that call Gemini load it
+    from google.genai import types
+
     # Convert data to JSON string and handle non-serializable objects (like datetime)
     json_data = json.dumps(data, default=str)
     
@@ -107,19 +107,41 @@ Ensure that all values are meaningful and backed by the given input data.
         ],
     )
 
-    response_string = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
-        print(chunk.text, end="")
-        response_string += chunk.text
+    with stage_timer('gemini.ld_analysis'):
+        response_string = get_gemini_client().generate(contents, generate_content_config, stream=True)
 
     print("\n\nData:\n", response_string)
     
-    json_object = markdown_to_json(response_string)
+    with stage_timer('gemini.ld_parse'):
+        json_object = markdown_to_json(response_string)
     print("\nConverted JSON Object:")
     print(json_object)
     
     return json_object
+
+def identify_fake(data):
+    """
+    Offline stand-in for identify(), selected with GEMINI_FAKE=1. Returns the same JSON
+    shape, derived from the input, after GEMINI_FAKE_DELAY seconds (default 1).
+    """
+    import time
+    from collections import Counter
+
+    time.sleep(float(os.environ.get("GEMINI_FAKE_DELAY", 1)))
+    emotions = Counter(data.get('emotions') or [])
+    return {
+        "studentProfile": {
+            "userID": data.get('userId'),
+            "email": data.get('userEmail'),
+            "taskPerformance": {},
+        },
+        "learningDisabilities": {
+            name: {"confidenceScore": 0.0, "indicators": []}
+            for name in ("Dyslexia", "Dysgraphia", "Dyscalculia")
+        },
+        "emotionAnalysis": {
+            "dominantEmotions": [emotion for emotion, _ in emotions.most_common(2)],
+            "emotionOccurrences": dict(emotions),
+            "graphData": [{"emotion": emotion, "count": count} for emotion, count in emotions.items()],
+        },
+    }
@@ -1,20 +1,13 @@
-from google.genai import types
-import os
 from dotenv import load_dotenv
-from google import genai
+from gemini_client import get_gemini_client
+from metrics import stage_timer
 
 load_dotenv()
 
 def generate_dialgoue_client_sdk(action, state, user_context=None):
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-    model = "gemini-2.0-flash"
-    
-    # System instruction as a single Content with role "system"
-    system_content = types.Content(
-        role="system",
-        parts=[types.Part.from_text("You are an AI assistant helping students with learning disabilities. Your task is to generate a short, encouraging sentence for an avatar to say based on the student's emotional state and the recommended action. Respond with only the sentence, no additional text or explanations.")]
-    )
-    
+    # The google-genai SDK is slow to import, so only processes that call Gemini load it
+    from google.genai import types
+
     # User prompt
     prompt = f"Emotional state: {state}\n"
     prompt += f"Recommended action: {action}\n\n"
@@ -22,7 +15,6 @@ def generate_dialgoue_client_sdk(action, state, user_context=None):
         prompt += f"Additional context: {user_context}\n\n"
     
     contents = [
-        system_content,
         types.Content(
             role="user",
             parts=[types.Part.from_text(text=prompt)],
@@ -35,12 +27,14 @@ def generate_dialgoue_client_sdk(action, state, user_context=None):
         top_k=40,
         max_output_tokens=100,
         response_mime_type="text/plain",
+        # The API only takes the system prompt here, not as a "system" role Content
+        system_instruction=[
+            types.Part.from_text(text="You are an AI assistant helping students with learning disabilities. Your task is to generate a short, encouraging sentence for an avatar to say based on the student's emotional state and the recommended action. Respond with only the sentence, no additional text or explanations."),
+        ],
     )
     
-    response = client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=config
-    )
-    print("\n\n", response.text.strip())
-    return response.text.strip()
\ No newline at end of file
+    # Short deadline: /rl_action waits on this while the student is mid-lesson
+    with stage_timer('gemini.dialogue'):
+        response_text = get_gemini_client().generate(contents, config, deadline=15)
+    print("\n\n", response_text.strip())
+    return response_text.strip()
\ No newline at end of file
@@ -0,0 +1,223 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+# Point at a local fake server (benchmarks/fake_gemini.py) for offline tests and load runs
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL') or None
+# Gemini calls in flight at once per worker process; extra callers wait for a slot
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 4))
+# Seconds a single HTTP attempt may take
+GEMINI_ATTEMPT_TIMEOUT = float(os.getenv('GEMINI_ATTEMPT_TIMEOUT', 30))
+# Seconds a whole call may take, including waiting for a slot and retries
+GEMINI_DEADLINE = float(os.getenv('GEMINI_DEADLINE', 90))
+# An attempt isn't started with less than this many seconds of the deadline left
+GEMINI_MIN_ATTEMPT_TIMEOUT = float(os.getenv('GEMINI_MIN_ATTEMPT_TIMEOUT', 1.0))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 3))
+# First retry delay in seconds; doubles per retry, plus jitter
+GEMINI_RETRY_BACKOFF = float(os.getenv('GEMINI_RETRY_BACKOFF', 0.5))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class GeminiTimeoutError(TimeoutError):
+    pass
+
+
+class GeminiClient:
+    def __init__(self, api_key=None, base_url=GEMINI_BASE_URL, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 attempt_timeout=GEMINI_ATTEMPT_TIMEOUT, deadline=GEMINI_DEADLINE,
+                 min_attempt_timeout=GEMINI_MIN_ATTEMPT_TIMEOUT, max_retries=GEMINI_MAX_RETRIES,
+                 backoff=GEMINI_RETRY_BACKOFF):
+        """
+        One genai.Client per process, shared by the LD analysis and the avatar dialogue so
+        HTTP connections and TLS sessions are reused between calls.
+
+        Every call holds a concurrency slot, is retried with exponential backoff and jitter
+        on transient errors (429, 5xx, timeouts, dropped connections) and gives up with
+        GeminiTimeoutError once its deadline has passed. Each HTTP attempt's timeout is
+        clamped to what is left of the deadline, and a stream is abandoned between chunks
+        when the deadline passes.
+
+        Parameters:
+            api_key (str): Defaults to $GEMINI_API_KEY.
+            base_url (str): Alternative endpoint, e.g. http://127.0.0.1:8765 for the fake server.
+            max_concurrency (int): Calls in flight at once.
+            attempt_timeout (float): Seconds per HTTP attempt, at most.
+            deadline (float): Default seconds per call, across waiting and retries.
+            min_attempt_timeout (float): Fail instead of starting an attempt with less time left.
+            max_retries (int): Retries after the first attempt.
+            backoff (float): Base retry delay in seconds.
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.min_attempt_timeout = min_attempt_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=1024)
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    @property
+    def client(self):
+        # The SDK's HTTP connection pool must not be shared across fork()
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    from google import genai
+                    from google.genai import types
+
+                    api_key = self.api_key or os.environ.get("GEMINI_API_KEY")
+                    if api_key is None and self.base_url:
+                        api_key = 'fake'
+                    http_options = types.HttpOptions(base_url=self.base_url, timeout=int(self.attempt_timeout * 1000))
+                    self._client = genai.Client(api_key=api_key, http_options=http_options)
+                    self._pid = os.getpid()
+        return self._client
+
+    @staticmethod
+    def is_retryable(error):
+        import httpx
+        from google.genai import errors
+
+        if isinstance(error, errors.APIError):
+            return error.code in RETRYABLE_STATUS
+        return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def _with_timeout(config, timeout):
+        """`config` with a per-request HTTP timeout (the client's own stays attempt_timeout)."""
+        from google.genai import types
+
+        http_options = types.HttpOptions(timeout=max(1, int(timeout * 1000)))
+        if config is None:
+            return types.GenerateContentConfig(http_options=http_options)
+        return config.model_copy(update={'http_options': http_options})
+
+    def _attempt(self, model, contents, config, stream, give_up_at):
+        # Built (and google.genai imported) before the budget is measured
+        client = self.client
+        remaining = give_up_at - time.monotonic()
+        if remaining < self.min_attempt_timeout:
+            raise GeminiTimeoutError(f"Only {max(0.0, remaining):.2f}s of the Gemini deadline left")
+        config = self._with_timeout(config, min(self.attempt_timeout, remaining))
+        if not stream:
+            response = client.models.generate_content(model=model, contents=contents, config=config)
+            return response.text or ""
+        text = ""
+        # The HTTP timeout bounds each read, not the whole stream
+        chunks = client.models.generate_content_stream(model=model, contents=contents, config=config)
+        try:
+            for chunk in chunks:
+                text += chunk.text or ""
+                if time.monotonic() >= give_up_at:
+                    raise GeminiTimeoutError("Gemini stream ran past its deadline")
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        return text
+
+    def generate(self, contents, config=None, model=GEMINI_MODEL, stream=False, deadline=None):
+        """
+        Run generate_content (or the streaming variant, joined) and return the response text.
+
+        Parameters:
+            contents: As for genai's generate_content.
+            config: types.GenerateContentConfig.
+            model (str): Model name.
+            stream (bool): Use generate_content_stream.
+            deadline (float): Seconds this call may take; defaults to the client's deadline.
+
+        Raises:
+            GeminiTimeoutError: No slot freed up, too little time left for an attempt, or
+                a stream ran past the deadline.
+            google.genai.errors.APIError: Non-transient API errors, or the last transient one.
+        """
+        give_up_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+        if not self._slots.acquire(timeout=max(0.0, give_up_at - time.monotonic())):
+            self._count('timeouts')
+            raise GeminiTimeoutError("No Gemini slot became free before the deadline")
+        with self._stats_lock:
+            self.in_flight += 1
+            self.calls += 1
+        start = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return self._attempt(model, contents, config, stream, give_up_at)
+                except GeminiTimeoutError:
+                    self._count('timeouts')
+                    raise
+                except Exception as e:
+                    if attempt >= self.max_retries or not self.is_retryable(e):
+                        self._count('errors')
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                    delay += random.uniform(0, delay)
+                    # The retry needs time for its own attempt, not just the sleep
+                    if time.monotonic() + delay + self.min_attempt_timeout > give_up_at:
+                        self._count('timeouts')
+                        raise GeminiTimeoutError(f"Gemini call ran past its deadline: {str(e)}") from e
+                    attempt += 1
+                    self._count('retries')
+                    logger.warning(f"Gemini call failed ({str(e)}), retry {attempt} in {delay:.2f}s")
+                    time.sleep(delay)
+        finally:
+            with self._stats_lock:
+                self._latencies.append(time.perf_counter() - start)
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(1000.0 * t for t in self._latencies)
+            counters = {'calls': self.calls, 'in_flight': self.in_flight, 'errors': self.errors,
+                        'retries': self.retries, 'timeouts': self.timeouts}
+        n = len(latencies)
+        return {
+            **counters,
+            'max_concurrency': self.max_concurrency,
+            'latency_ms_mean': sum(latencies) / n if n else 0.0,
+            'latency_ms_p50': latencies[n // 2] if n else 0.0,
+            'latency_ms_p95': latencies[min(n - 1, int(n * 0.95))] if n else 0.0,
+        }
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_gemini_client():
+    """The process-wide GeminiClient, configured from the GEMINI_* environment variables."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = GeminiClient()
+    return _shared_client
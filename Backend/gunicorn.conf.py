@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for the backend (see wsgi.py):
+
+    cd Backend && gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master, which loads the ResNet50 and LSTM weights once;
+workers are forked afterwards and share those pages copy-on-write instead of each
+holding its own copy. post_worker_init then runs app.init_worker() in every worker:
+an equal share of the CPUs for torch, FaceMesh graphs, the warm-up pass.
+"""
+import os
+
+# Models are loaded by the master and shared; 'off' makes each worker load its own
+preload_app = os.getenv('WSGI_PRELOAD', 'on').lower() in ['on', 'true', '1', 't']
+bind = os.getenv('WSGI_BIND', f"{os.getenv('FLASK_RUN_HOST', '0.0.0.0')}:{os.getenv('FLASK_RUN_PORT', 5000)}")
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+# One process per CPU by default; each gets CPUs / workers torch threads
+workers = int(os.getenv('WSGI_WORKERS', cpus))
+# Threaded workers: /ws/facedetection holds a thread per open WebSocket, and requests
+# waiting on Gemini or Mongo don't block the worker
+worker_class = 'gthread'
+threads = int(os.getenv('WSGI_THREADS', 8))
+# The first request of a worker can include loading FaceMesh graphs
+timeout = int(os.getenv('WSGI_TIMEOUT', 120))
+graceful_timeout = 30
+# FaceMesh graphs per worker (read when the app is imported): about its share of the
+# CPUs, not one per thread, since more graphs than cores only add memory
+os.environ.setdefault('FACE_MESH_POOL_SIZE', str(max(2, cpus // workers)))
+
+
+def post_worker_init(worker):
+    import app as backend
+    backend.init_worker(processes=worker.cfg.workers)
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.getcwd(), 'uploads'))
+# Largest handwriting image accepted, in bytes
+HANDWRITING_MAX_BYTES = int(os.getenv('HANDWRITING_MAX_BYTES', 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+IMAGE_FORMATS = ('png', 'jpeg', 'gif', 'webp')
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+# ab/cd/abcd...ef.png, the only paths /uploads serves
+STORED_PATH = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.(png|jpeg|gif|webp)$')
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def sniff_image_format(head):
+    """Image format from the first bytes of a file, or None if it isn't an image we store."""
+    for signature, fmt in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class ContentAddressedImageStore:
+    def __init__(self, root=UPLOAD_FOLDER, max_bytes=HANDWRITING_MAX_BYTES):
+        """
+        Images stored under their SHA-256: <root>/ab/cd/abcd...ef.png. Identical uploads
+        share one file, and the two-level shard keeps directories small.
+
+        Files written before this store existed sit directly in <root>; /uploads doesn't
+        serve them (nor the .upload-* temp files), only paths that digest_of() accepts.
+
+        Parameters:
+            root (str): Upload directory.
+            max_bytes (int): Uploads larger than this raise ImageTooLarge.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def relative_path(self, digest, fmt):
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.{fmt}"
+
+    def digest_of(self, relative):
+        """The SHA-256 a stored image path was written under, or None if it isn't such a path."""
+        match = STORED_PATH.match(relative or '')
+        if not match or not match.group(3).startswith(match.group(1) + match.group(2)):
+            return None
+        return match.group(3)
+
+    def find(self, digest):
+        """Relative path of the stored image with this SHA-256, or None."""
+        if not SHA256_HEX.match(digest or ''):
+            return None
+        shard = os.path.join(self.root, digest[:2], digest[2:4])
+        for fmt in IMAGE_FORMATS:
+            if os.path.exists(os.path.join(shard, f"{digest}.{fmt}")):
+                return self.relative_path(digest, fmt)
+        return None
+
+    def save_chunks(self, chunks):
+        """
+        Write an image arriving as an iterable of byte chunks, hashing it on the way to disk.
+
+        Returns:
+            dict: {"hash", "path" (relative to root), "size", "deduplicated"}.
+
+        Raises:
+            ImageTooLarge: More than max_bytes arrived.
+            ValueError: Empty upload, or not a PNG/JPEG/GIF/WebP.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        head = b''
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLarge(f"Image is larger than {self.max_bytes} bytes")
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    sha.update(chunk)
+                    f.write(chunk)
+            if size == 0:
+                raise ValueError("Empty image upload")
+            fmt = sniff_image_format(head)
+            if fmt is None:
+                raise ValueError("Unsupported image format")
+
+            digest = sha.hexdigest()
+            relative = self.relative_path(digest, fmt)
+            final_path = os.path.join(self.root, relative)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                return {'hash': digest, 'path': relative, 'size': size, 'deduplicated': True}
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+            return {'hash': digest, 'path': relative, 'size': size, 'deduplicated': False}
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save_bytes(self, data):
+        """save_chunks() for an image already in memory (the base64 JSON path)."""
+        return self.save_chunks(data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+
+
+def read_chunks(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def multipart_file_chunks(stream, content_type, field_name='image', chunk_size=CHUNK_SIZE):
+    """
+    Yield the bytes of one file field of a multipart/form-data body as they are read from
+    `stream`, without buffering the body in memory or spooling it to a temp file first.
+
+    Raises:
+        ValueError: No boundary, or the body has no file field called `field_name`.
+    """
+    boundary = parse_options_header(content_type)[1].get('boundary')
+    if not boundary:
+        raise ValueError("Missing multipart boundary")
+    # Only bounds what the decoder buffers between events (part headers, boundary search)
+    decoder = MultipartDecoder(boundary.encode(), max_form_memory_size=4 * chunk_size)
+    in_file = found = False
+    eof = False
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            if eof:
+                break
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                eof = True
+            decoder.receive_data(chunk or None)
+        elif isinstance(event, File):
+            in_file = event.name == field_name and not found
+            found = found or in_file
+        elif isinstance(event, Field):
+            in_file = False
+        elif isinstance(event, Data):
+            if in_file and event.data:
+                yield event.data
+            if in_file and not event.more_data:
+                in_file = False
+        elif isinstance(event, Epilogue):
+            break
+    if not found:
+        raise ValueError(f"No '{field_name}' file in the upload")
+
+
+handwriting_store = ContentAddressedImageStore()
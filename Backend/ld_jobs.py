@@ -0,0 +1,186 @@
+import datetime
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from emotion_codec import analysis_view
+
+logger = logging.getLogger(__name__)
+
+# Gemini calls running at once per worker process
+LD_ANALYSIS_WORKERS = int(os.getenv('LD_ANALYSIS_WORKERS', 2))
+# Attempts per job before it is marked failed
+LD_ANALYSIS_MAX_ATTEMPTS = int(os.getenv('LD_ANALYSIS_MAX_ATTEMPTS', 3))
+# First retry delay in seconds; doubles per attempt, plus jitter
+LD_ANALYSIS_BACKOFF = float(os.getenv('LD_ANALYSIS_BACKOFF', 2.0))
+# Seconds between sweeps for jobs left queued by a failed submit or a dead worker; 0 disables
+LD_ANALYSIS_RECOVER_INTERVAL = float(os.getenv('LD_ANALYSIS_RECOVER_INTERVAL', 300))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class LDAnalysisQueue:
+    def __init__(self, assessments, analyze, max_workers=LD_ANALYSIS_WORKERS,
+                 max_attempts=LD_ANALYSIS_MAX_ATTEMPTS, backoff=LD_ANALYSIS_BACKOFF):
+        """
+        Runs the Gemini LD analysis of saved assessments on a background thread pool.
+
+        Job state lives on the assessment document under `ld_job`, so any worker process
+        can answer a status poll, and the result is written back to `gemini_response`.
+
+        Parameters:
+            assessments: PyMongo collection holding the assessments.
+            analyze (callable): assessment dict -> LD analysis JSON (gemini_analyzer.identify).
+            max_workers (int): Analyses running concurrently in this process.
+            max_attempts (int): Tries per job before giving up.
+            backoff (float): Base retry delay in seconds (exponential, with jitter).
+        """
+        self.assessments = assessments
+        self.analyze = analyze
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._executor = None
+        self._pid = None
+        self._recovery_pid = None
+        self._lock = threading.Lock()
+        try:
+            assessments.create_index('ld_job.id', sparse=True)
+        except Exception as e:
+            logger.error(f"Error creating ld_job index: {str(e)}")
+
+    @property
+    def executor(self):
+        # Pool threads don't survive fork(), so each worker process builds its own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ld-analysis')
+                    self._pid = os.getpid()
+        return self._executor
+
+    @staticmethod
+    def new_job():
+        """The `ld_job` sub-document to store with a freshly saved assessment."""
+        return {'id': uuid.uuid4().hex, 'status': QUEUED, 'attempts': 0, 'error': None, 'updated_at': _now()}
+
+    def submit(self, job_id, assessment_data):
+        """
+        Queue the analysis of an assessment already stored with `ld_job.id == job_id`.
+
+        Parameters:
+            job_id (str): The id from new_job().
+            assessment_data (dict): What Gemini should analyse (without the job bookkeeping).
+        """
+        self.executor.submit(self._run, job_id, assessment_data)
+        return job_id
+
+    def _claim(self, job_id):
+        # Atomic, so a job resubmitted by recover_pending() never runs twice at once
+        return self.assessments.find_one_and_update(
+            {'ld_job.id': job_id, 'ld_job.status': QUEUED},
+            {'$set': {'ld_job.status': RUNNING, 'ld_job.updated_at': _now()}, '$inc': {'ld_job.attempts': 1}},
+        )
+
+    def _run(self, job_id, assessment_data):
+        while True:
+            claimed = self._claim(job_id)
+            if claimed is None:
+                return
+            attempt = claimed['ld_job'].get('attempts', 0) + 1
+            try:
+                logger.info(f"Running LD analysis job {job_id} (attempt {attempt})")
+                result = self.analyze(assessment_data)
+                if result is None:
+                    raise ValueError("LD analysis returned no parsable JSON")
+            except Exception as e:
+                logger.error(f"LD analysis job {job_id} attempt {attempt} failed: {str(e)}")
+                if attempt >= self.max_attempts:
+                    self.assessments.update_one({'ld_job.id': job_id}, {'$set': {
+                        'gemini_response': {'error': 'LD Analysis failed', 'details': str(e)},
+                        'ld_job.status': FAILED,
+                        'ld_job.error': str(e),
+                        'ld_job.updated_at': _now(),
+                    }})
+                    return
+                self.assessments.update_one({'ld_job.id': job_id}, {'$set': {
+                    'ld_job.status': QUEUED, 'ld_job.error': str(e), 'ld_job.updated_at': _now(),
+                }})
+                delay = self.backoff * 2 ** (attempt - 1)
+                time.sleep(delay + random.uniform(0, delay))
+                continue
+
+            self.assessments.update_one({'ld_job.id': job_id}, {'$set': {
+                'gemini_response': result,
+                'ld_job.status': DONE,
+                'ld_job.error': None,
+                'ld_job.updated_at': _now(),
+            }})
+            logger.info(f"LD analysis job {job_id} completed")
+            return
+
+    def status(self, job_id, user_id=None):
+        """
+        The job document for a status poll, or None if unknown (or not owned by `user_id`).
+        """
+        query = {'ld_job.id': job_id}
+        if user_id is not None:
+            query['userId'] = user_id
+        return self.assessments.find_one(query, {'ld_job': 1, 'gemini_response': 1})
+
+    def start_recovery(self, interval=LD_ANALYSIS_RECOVER_INTERVAL):
+        """
+        Call recover_pending() every `interval` seconds on a daemon thread of this process,
+        so a job whose submit() failed after its assessment was stored still runs without
+        waiting for a restart. Safe to call again, also after fork().
+        """
+        if interval <= 0:
+            return
+        with self._lock:
+            if self._recovery_pid == os.getpid():
+                return
+            self._recovery_pid = os.getpid()
+        threading.Thread(target=self._recover_periodically, args=(interval,),
+                         name='ld-analysis-recovery', daemon=True).start()
+
+    def _recover_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                recovered = self.recover_pending()
+                if recovered:
+                    logger.info(f"Requeued {recovered} unfinished LD analysis jobs")
+            except Exception as e:
+                logger.error(f"Could not requeue unfinished LD analysis jobs: {str(e)}")
+
+    def recover_pending(self, older_than=300):
+        """
+        Resubmit jobs left queued or running by a worker that died, e.g. after a restart.
+        Each job is claimed with a conditional update first, so every worker process can
+        call this at startup without two of them resubmitting the same job.
+
+        Parameters:
+            older_than (float): Only jobs untouched for this many seconds are considered stuck.
+        """
+        cutoff = _now() - datetime.timedelta(seconds=older_than)
+        stuck = {'ld_job.status': {'$in': [QUEUED, RUNNING]}, 'ld_job.updated_at': {'$lt': cutoff}}
+        count = 0
+        for doc in self.assessments.find(stuck):
+            job_id = doc['ld_job']['id']
+            claimed = self.assessments.update_one({'ld_job.id': job_id, **stuck},
+                                                  {'$set': {'ld_job.status': QUEUED, 'ld_job.updated_at': _now()}})
+            if not claimed.modified_count:
+                continue  # another process got to it first
+            # Stored emotion fields may be packed; the analysis gets the same view as on save
+            data = analysis_view({k: v for k, v in doc.items() if k not in ('_id', 'ld_job', 'gemini_response')})
+            self.submit(job_id, data)
+            count += 1
+        return count
@@ -0,0 +1,169 @@
+import bisect
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 'off' turns stage timers and request timing into no-ops; /metrics then only shows the stats gauges
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'on').lower() in ['on', 'true', '1', 't']
+# Histogram bucket upper bounds in seconds: sub-millisecond crops up to multi-second Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Prometheus histogram: cumulative bucket counts, sum and count per label combination.
+        observe() is a bisect and a few additions under a lock, cheap enough for every frame.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum]
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        """{labelvalues: (count, sum)}, for JSON summaries and tests."""
+        with self._lock:
+            return {labels: (sum(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _flatten(stats, prefix=''):
+    """Numeric leaves of a (nested) stats dict as (name, value); strings and None are skipped."""
+    for key, value in stats.items():
+        name = f"{prefix}_{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+class MetricsRegistry:
+    def __init__(self, namespace='app'):
+        """
+        The metrics of one process, rendered in the Prometheus text format by render().
+
+        Besides histograms it polls collectors: callables returning the existing stats()
+        dicts (dialogue cache, Gemini client, auth caches, ...), whose numeric values are
+        exposed as gauges named <namespace>_<collector>_<key>.
+        """
+        self.namespace = namespace
+        self._metrics = []
+        self._collectors = {}
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, collect):
+        """
+        Parameters:
+            name (str): Gauge name prefix, e.g. 'dialogue_cache'.
+            collect (callable): Returns a stats dict, or None when there is nothing to report yet.
+        """
+        self._collectors[name] = collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, collect in self._collectors.items():
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {str(e)}")
+                continue
+            for key, value in _flatten(stats or {}):
+                gauge = INVALID_NAME_CHARS.sub('_', f"{self.namespace}_{name}_{key}")
+                lines.append(f"# TYPE {gauge} gauge")
+                lines.append(f"{gauge} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram(
+    'stage_seconds', "Time spent in each processing stage (pipeline, Mongo, Gemini, auth)", ['stage'])
+request_seconds = registry.histogram(
+    'http_request_seconds', "HTTP request latency by route, method and status", ['route', 'method', 'status'])
+
+
+class stage_timer:
+    """
+    Time a block into app_stage_seconds{stage=...}:
+
+        with stage_timer('pipeline.decode'):
+            img = cv2.imdecode(...)
+
+    The time is recorded even if the block raises.
+    """
+    __slots__ = ('stage', '_start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            stage_seconds.observe(time.perf_counter() - self._start, self.stage)
+        return False
+
+
+def observe_request(route, method, status, seconds):
+    if METRICS_ENABLED:
+        request_seconds.observe(seconds, route, method, str(status))
@@ -0,0 +1,77 @@
+"""
+One-time migration: give every assessment a string `userId`.
+
+Older assessments were only stored with `userEmail` (or with `userId` as an ObjectId),
+so /assessments used to fall back to a second full query by email. This fills in
+`userId` from the users collection, then replaces the old (userId, created_at) index
+with the (userId, created_at, _id) one the paginated endpoint sorts on.
+
+Safe to re-run. Run from Backend/:
+    python -m migrations.backfill_assessment_user_id [--dry-run]
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateMany
+
+load_dotenv()
+
+OLD_INDEX = [("userId", 1), ("created_at", -1)]
+NEW_INDEX = [("userId", 1), ("created_at", -1), ("_id", -1)]
+
+
+def backfill(db, dry_run=False, batch_size=500):
+    """
+    Returns:
+        dict: Counts of assessments fixed, converted from ObjectId and left orphaned.
+    """
+    assessments = db.assessments
+    report = {'converted_object_ids': 0, 'backfilled': 0, 'orphaned': 0}
+
+    # userId stored as an ObjectId -> its string form
+    for doc in assessments.find({'userId': {'$type': 'objectId'}}, {'userId': 1}):
+        report['converted_object_ids'] += 1
+        if not dry_run:
+            assessments.update_one({'_id': doc['_id']}, {'$set': {'userId': str(doc['userId'])}})
+
+    missing = {'$or': [{'userId': {'$exists': False}}, {'userId': None}, {'userId': ''}]}
+    emails = assessments.distinct('userEmail', missing)
+    users = {u['email']: str(u['_id']) for u in db.users.find({'email': {'$in': emails}}, {'email': 1})}
+
+    requests = []
+    for email in emails:
+        count = assessments.count_documents({**missing, 'userEmail': email})
+        if email not in users:
+            report['orphaned'] += count
+            continue
+        report['backfilled'] += count
+        requests.append(UpdateMany({**missing, 'userEmail': email}, {'$set': {'userId': users[email]}}))
+        if len(requests) >= batch_size and not dry_run:
+            assessments.bulk_write(requests, ordered=False)
+            requests = []
+    if requests and not dry_run:
+        assessments.bulk_write(requests, ordered=False)
+
+    if not dry_run:
+        assessments.create_index(NEW_INDEX)
+        for name, spec in assessments.index_information().items():
+            if spec['key'] == OLD_INDEX:
+                assessments.drop_index(name)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help="only report what would change")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/main_project"))
+    report = backfill(client.get_default_database(), dry_run=args.dry_run)
+    print(("Would update: " if args.dry_run else "Updated: ") + ", ".join(f"{k}={v}" for k, v in report.items()))
+    if report['orphaned']:
+        print(f"{report['orphaned']} assessments have no matching user and were left without a userId")
+
+
+if __name__ == '__main__':
+    main()
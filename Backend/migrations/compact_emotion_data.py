@@ -0,0 +1,85 @@
+"""
+One-time migration: store `emotions` and `emotionTrackingData` of existing assessments in
+the packed columnar form new assessments are saved in (emotion_codec, EMOTION_STORAGE).
+
+Only fields that are still plain arrays are touched, and pack() keeps anything it can't
+encode losslessly as it is, so this is safe to re-run. --decode turns packed fields back
+into arrays, e.g. before rolling back to a version without emotion_codec.
+
+Run from Backend/:
+    python -m migrations.compact_emotion_data [--dry-run] [--decode] [--batch-size 200]
+"""
+import argparse
+import os
+
+import bson
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from emotion_codec import pack, unpack, CODEC, PACKED_FIELDS
+
+load_dotenv()
+
+
+def field_bytes(doc):
+    """BSON size of the emotion fields of `doc`."""
+    return len(bson.encode({field: doc[field] for field in PACKED_FIELDS if field in doc}))
+
+
+def compact(db, decode=False, dry_run=False, batch_size=200):
+    """
+    Returns:
+        dict: Documents rewritten, fields left as they were, and the BSON bytes of the
+        emotion fields before and after.
+    """
+    assessments = db.assessments
+    if decode:
+        query = {'$or': [{f'{field}.codec': CODEC} for field in PACKED_FIELDS]}
+    else:
+        query = {'$or': [{field: {'$type': 'array'}} for field in PACKED_FIELDS]}
+    projection = {field: 1 for field in PACKED_FIELDS}
+    report = {'updated': 0, 'unchanged_fields': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    requests = []
+    for doc in assessments.find(query, projection, batch_size=batch_size):
+        changes = {}
+        for field in PACKED_FIELDS:
+            if field not in doc:
+                continue
+            value = unpack(doc[field]) if decode else pack(doc[field])
+            if value is doc[field]:
+                report['unchanged_fields'] += 1
+            else:
+                changes[field] = value
+        if not changes:
+            continue
+        report['updated'] += 1
+        report['bytes_before'] += field_bytes(doc)
+        report['bytes_after'] += field_bytes({**doc, **changes})
+        requests.append(UpdateOne({'_id': doc['_id']}, {'$set': changes}))
+        if len(requests) >= batch_size and not dry_run:
+            assessments.bulk_write(requests, ordered=False)
+            requests = []
+    if requests and not dry_run:
+        assessments.bulk_write(requests, ordered=False)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help="only report what would change")
+    parser.add_argument('--decode', action='store_true', help="unpack the emotion fields back into arrays")
+    parser.add_argument('--batch-size', type=int, default=200, help="documents per bulk write")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/main_project"))
+    report = compact(client.get_default_database(), decode=args.decode, dry_run=args.dry_run,
+                     batch_size=args.batch_size)
+    print(("Would update: " if args.dry_run else "Updated: ") + ", ".join(f"{k}={v}" for k, v in report.items()))
+    if report['bytes_before']:
+        print(f"Emotion fields: {report['bytes_before'] / 1024:.0f} KB -> {report['bytes_after'] / 1024:.0f} KB "
+              f"({report['bytes_after'] / report['bytes_before']:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Most documents one insert_many() carries
+MONGO_INSERT_MAX_BATCH_SIZE = int(os.getenv('MONGO_INSERT_MAX_BATCH_SIZE', 64))
+# insert_many() round trips in flight at once; further documents queue up behind them
+MONGO_INSERT_MAX_IN_FLIGHT = int(os.getenv('MONGO_INSERT_MAX_IN_FLIGHT', 1))
+
+
+class BatchedInserter:
+    def __init__(self, collection, max_batch_size=MONGO_INSERT_MAX_BATCH_SIZE, max_in_flight=MONGO_INSERT_MAX_IN_FLIGHT):
+        """
+        Group commit for an async collection: concurrent insert() calls share insert_many()
+        round trips instead of paying one each.
+
+        A document is written right away when fewer than `max_in_flight` writes are
+        outstanding, so a lone request waits for nothing; otherwise it joins the batch
+        that goes out as soon as one of them returns. Batching therefore only kicks in
+        under load, and grows with it. Each caller gets its own document's _id back, or
+        the error the server reported for that document (the batch is unordered, so one
+        duplicate key doesn't fail the others).
+
+        Parameters:
+            collection: A pymongo AsyncCollection (or anything with an async insert_many).
+            max_batch_size (int): Most documents per insert_many().
+            max_in_flight (int): insert_many() calls outstanding at once.
+        """
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self._pending = []
+        self._in_flight = 0
+        self._scheduled = False
+        self.batches = 0
+        self.documents = 0
+        self.errors = 0
+
+    async def insert(self, document):
+        """Insert `document` (an _id is assigned if missing) and return its _id once it is written."""
+        document.setdefault('_id', ObjectId())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+        if self._in_flight < self.max_in_flight and not self._scheduled:
+            # At the end of this loop iteration, so requests resumed alongside this one join in
+            self._scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        self._scheduled = False
+        while self._pending and self._in_flight < self.max_in_flight:
+            batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            self._in_flight += 1
+            asyncio.ensure_future(self._write(batch))
+
+    async def _write(self, batch):
+        self.batches += 1
+        self.documents += len(batch)
+        failed = {}
+        try:
+            await self.collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = BulkWriteError({'writeErrors': [error], 'nInserted': 0})
+        except Exception as e:
+            logger.error(f"Batched insert of {len(batch)} documents failed: {str(e)}")
+            failed = {i: e for i in range(len(batch))}
+        self.errors += len(failed)
+        self._in_flight -= 1
+        self._flush()
+        for i, (document, future) in enumerate(batch):
+            if future.done():
+                continue  # the caller went away (request cancelled)
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(document['_id'])
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'documents': self.documents,
+            'mean_batch_size': self.documents / self.batches if self.batches else 0.0,
+            'errors': self.errors,
+            'pending': len(self._pending),
+            'in_flight': self._in_flight,
+        }
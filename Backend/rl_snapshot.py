@@ -0,0 +1,168 @@
+import contextlib
+import os
+import struct
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: merges from several processes aren't serialized
+    fcntl = None
+
+# Bumped whenever the arrays in a snapshot change meaning; read_snapshot rejects other versions
+SNAPSHOT_FORMAT_VERSION = 1
+# Map snapshots read-only instead of reading them into memory. Off on Windows, where a
+# mapped file can't be replaced and the next atomic write would fail
+RL_SNAPSHOT_MMAP = os.getenv('RL_SNAPSHOT_MMAP', 'on' if os.name == 'posix' else 'off').lower() in ['on', 'true', '1', 't']
+
+
+class QSnapshot:
+    def __init__(self, q, states, actions, generation=0, created_at=None):
+        """
+        One version of the shared Q-table: q[i, j] is Q(states[i], actions[j]).
+
+        Parameters:
+            q (np.ndarray): (len(states), len(actions)) float64 matrix; read-only when memory-mapped.
+            states (list): Row labels.
+            actions (list): Column labels.
+            generation (int): Incremented by every write, so a reader can tell versions apart.
+            created_at (float): Unix time the snapshot was written.
+        """
+        self.q = q
+        self.states = list(states)
+        self.actions = list(actions)
+        self.generation = generation
+        self.created_at = created_at
+
+    def aligned(self, actions):
+        """The matrix with its columns in the order of `actions` (unknown actions are an error)."""
+        if self.actions == list(actions):
+            return self.q
+        missing = set(self.actions) - set(actions)
+        if missing:
+            raise ValueError(f"Snapshot has actions this agent doesn't know: {sorted(missing)}")
+        q = np.zeros((len(self.states), len(actions)), dtype=np.float64)
+        q[:, [list(actions).index(action) for action in self.actions]] = self.q
+        return q
+
+    def q_table(self):
+        """The Q-values as EmotionRLAgent's {(state, action): q} dict."""
+        return {(state, action): float(self.q[i, j])
+                for i, state in enumerate(self.states) for j, action in enumerate(self.actions)}
+
+
+def _encode_labels(labels):
+    # UTF-8 bytes: a str array would spend 4 bytes per character
+    return np.array([label.encode('utf-8') for label in labels], dtype=np.bytes_)
+
+
+def _decode_labels(array):
+    return [label.decode('utf-8') for label in array.tolist()]
+
+
+def write_snapshot(path, snapshot):
+    """
+    Write `snapshot` to `path` as an uncompressed .npz and rename it into place, so readers
+    see the old file or the new one, never a partial one. Stored uncompressed so the
+    matrix can be memory-mapped straight out of the archive.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rl_qtable-', suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f,
+                     format_version=np.int64(SNAPSHOT_FORMAT_VERSION),
+                     generation=np.int64(snapshot.generation),
+                     created_at=np.float64(snapshot.created_at or time.time()),
+                     states=_encode_labels(snapshot.states),
+                     actions=_encode_labels(snapshot.actions),
+                     q=np.ascontiguousarray(snapshot.q, dtype=np.float64))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _mmap_member(path, name):
+    """A stored (uncompressed) .npy member of an .npz as a read-only np.memmap, or None."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, 'rb') as f:
+        # The data follows the member's local header: 30 fixed bytes, then name and extra field
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = struct.unpack('<HH', f.read(4))
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def read_snapshot(path, mmap=RL_SNAPSHOT_MMAP):
+    """
+    Load a snapshot written by write_snapshot(). Nothing is unpickled (allow_pickle=False).
+
+    Parameters:
+        path (str): The .npz file.
+        mmap (bool): Map the Q-matrix read-only instead of copying it into memory; every
+            process mapping the same file shares its pages.
+
+    Returns:
+        QSnapshot
+    """
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data['format_version'])
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"{path} is snapshot format {version}, expected {SNAPSHOT_FORMAT_VERSION}")
+        states, actions = _decode_labels(data['states']), _decode_labels(data['actions'])
+        generation, created_at = int(data['generation']), float(data['created_at'])
+        q = _mmap_member(path, 'q') if mmap else None
+        if q is None:
+            q = data['q']
+    if q.shape != (len(states), len(actions)):
+        raise ValueError(f"{path}: Q-matrix shape {q.shape} doesn't match {len(states)} states x {len(actions)} actions")
+    return QSnapshot(q, states, actions, generation, created_at)
+
+
+@contextlib.contextmanager
+def snapshot_lock(path):
+    """
+    Exclusive lock for read-modify-write cycles on the snapshot at `path` (an flock on
+    `path`.lock), held by workers merging their deltas and by rl_train.py replacing it.
+    Plain readers don't need it: writes are atomic renames.
+    """
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def next_generation(path):
+    """Generation for the next write to `path` (call under snapshot_lock)."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return int(data['generation']) + 1
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return 1
@@ -0,0 +1,141 @@
+"""
+Rebuild the RL tutor's Q-table offline by replaying the logged /rl_action transitions.
+
+Reads every transitions-*.tsv written by the workers (RL_TRANSITION_LOG_DIR), encodes
+states and actions to integer ids once, then replays them in vectorized batches
+(DenseEmotionRLAgent.update_indices) for a number of shuffled epochs. The result
+replaces the shared snapshot at RL_QTABLE_PATH atomically, as its next generation
+(a .pkl --out writes the old pickle format instead); running workers notice the new
+file and rebase onto it (RL_QTABLE_RELOAD_INTERVAL), no restart needed.
+
+Run from Backend/:
+    python rl_train.py
+    python rl_train.py rl_transitions/ old_logs/ --epochs 5 --batch-size 4096 --out rl_qtable.npz
+    python rl_train.py --reward emotion      # recompute rewards with the current EMOTION_REWARDS
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from EmotionDetection.labels import DICT_EMO
+from RL import DenseEmotionRLAgent, RL_ACTIONS, RL_QTABLE_PATH, emotion_reward
+from rl_snapshot import next_generation, snapshot_lock, write_snapshot
+from rl_transitions import RL_TRANSITION_LOG_DIR, read_transitions
+
+logger = logging.getLogger(__name__)
+
+
+def load_encoded(agent, paths, reward='logged'):
+    """
+    All logged transitions as integer arrays for `agent`.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray, np.ndarray): state ids, action ids, rewards, next-state ids.
+    """
+    s_parts, a_parts, r_parts, n_parts = [], [], [], []
+    unknown = 0
+    for states, actions, next_states, rewards in read_transitions(paths):
+        a = np.fromiter((agent.action_ids.get(action, -1) for action in actions), dtype=np.intp, count=len(actions))
+        # Actions renamed or removed since they were logged can't be replayed
+        known = a >= 0
+        unknown += int((~known).sum())
+        if reward == 'emotion':
+            r = np.fromiter((emotion_reward(n) for n in next_states), dtype=np.float64, count=len(next_states))
+        else:
+            r = np.asarray(rewards, dtype=np.float64)
+        s_parts.append(agent.state_indices(states)[known])
+        n_parts.append(agent.state_indices(next_states)[known])
+        a_parts.append(a[known])
+        r_parts.append(r[known])
+    if unknown:
+        logger.warning(f"Skipped {unknown} transitions with actions not in RL_ACTIONS")
+    if not s_parts:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0), empty
+    return np.concatenate(s_parts), np.concatenate(a_parts), np.concatenate(r_parts), np.concatenate(n_parts)
+
+
+def train(agent, s, a, r, n, epochs=3, batch_size=1024, shuffle=True, seed=0):
+    """Replay the encoded transitions through agent.update_indices; returns transitions replayed."""
+    rng = np.random.default_rng(seed)
+    replayed = 0
+    for epoch in range(epochs):
+        order = rng.permutation(len(s)) if shuffle else np.arange(len(s))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            agent.update_indices(s[batch], a[batch], r[batch], n[batch])
+            replayed += len(batch)
+        logger.info(f"Epoch {epoch + 1}/{epochs}: {len(s)} transitions replayed")
+    return replayed
+
+
+def save_atomically(agent, path):
+    """
+    Write the Q-table next to `path` and rename it into place, so readers never see a partial file.
+    A .npz snapshot gets the next generation number, under the lock workers merge with.
+    """
+    if path.endswith('.npz'):
+        with snapshot_lock(path):
+            write_snapshot(path, agent.snapshot(generation=next_generation(path)))
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rl_qtable-')
+    os.close(fd)
+    try:
+        agent.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*', default=[RL_TRANSITION_LOG_DIR],
+                        help="transition log files or directories (default: RL_TRANSITION_LOG_DIR)")
+    parser.add_argument('--out', default=RL_QTABLE_PATH)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=1024, help="transitions per vectorized update")
+    parser.add_argument('--learning-rate', type=float, default=0.1)
+    parser.add_argument('--discount-factor', type=float, default=0.95)
+    parser.add_argument('--reward', choices=['logged', 'emotion'], default='logged',
+                        help="use the logged rewards, or recompute them from the next state")
+    parser.add_argument('--init', help="start from this Q-table instead of zeros")
+    parser.add_argument('--no-shuffle', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    agent = DenseEmotionRLAgent(RL_ACTIONS, learning_rate=args.learning_rate, discount_factor=args.discount_factor,
+                                states=list(DICT_EMO.values()), seed=args.seed)
+    if args.init:
+        agent.load(args.init)
+
+    start = time.perf_counter()
+    s, a, r, n = load_encoded(agent, args.logs, reward=args.reward)
+    loaded = time.perf_counter()
+    if len(s) == 0:
+        parser.error(f"no transitions found in {args.logs}")
+    logger.info(f"Loaded {len(s)} transitions over {len(agent.states)} states in {loaded - start:.1f}s")
+
+    replayed = train(agent, s, a, r, n, epochs=args.epochs, batch_size=args.batch_size,
+                     shuffle=not args.no_shuffle, seed=args.seed)
+    trained = time.perf_counter()
+    save_atomically(agent, args.out)
+    logger.info(f"Replayed {replayed} transitions in {trained - loaded:.1f}s "
+                f"({replayed / max(trained - loaded, 1e-9):,.0f}/s); Q-table written to {args.out}")
+
+    print(f"\n{'state':<12}{'transitions':>12}  greedy action (Q)")
+    counts = np.bincount(s, minlength=len(agent.states))
+    for state, i in agent.state_ids.items():
+        row = agent.q[i]
+        print(f"{state:<12}{counts[i]:>12}  {agent.actions[int(np.argmax(row))]} ({row.max():.3f})")
+
+
+if __name__ == '__main__':
+    main()
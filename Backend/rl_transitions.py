@@ -0,0 +1,230 @@
+import atexit
+import glob
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from RL import emotion_reward
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# 'off' stops recording RL transitions
+RL_TRANSITION_LOGGING = os.getenv('RL_TRANSITION_LOGGING', 'on').lower() in ['on', 'true', '1', 't']
+RL_TRANSITION_LOG_DIR = os.getenv('RL_TRANSITION_LOG_DIR', os.path.join(BACKEND_DIR, 'rl_transitions'))
+# Buffered transitions are appended once this many are waiting, or every flush interval
+RL_TRANSITION_FLUSH_SIZE = int(os.getenv('RL_TRANSITION_FLUSH_SIZE', 256))
+RL_TRANSITION_FLUSH_INTERVAL = float(os.getenv('RL_TRANSITION_FLUSH_INTERVAL', 5.0))
+# Emotion labels observed after an action that make up its next state
+RL_NEXT_STATE_WINDOW = int(os.getenv('RL_NEXT_STATE_WINDOW', 5))
+# An action whose next state hasn't been observed within this many seconds is dropped
+RL_TRANSITION_MAX_AGE = float(os.getenv('RL_TRANSITION_MAX_AGE', 10 * 60))
+# Actions awaiting their next state, per worker
+RL_MAX_PENDING = 10000
+# 'off' stops workers from updating their Q-table with the transitions they complete
+RL_ONLINE_LEARNING = os.getenv('RL_ONLINE_LEARNING', 'on').lower() in ['on', 'true', '1', 't']
+
+# One transition per line: unix time, state, action, next state, reward (tab-separated)
+FIELDS = ('timestamp', 'state', 'action', 'next_state', 'reward')
+
+
+def format_transition(timestamp, state, action, next_state, reward):
+    return f"{timestamp:.3f}\t{state}\t{action}\t{next_state}\t{reward:.6g}\n"
+
+
+class TransitionLog:
+    def __init__(self, directory=RL_TRANSITION_LOG_DIR, flush_size=RL_TRANSITION_FLUSH_SIZE,
+                 flush_interval=RL_TRANSITION_FLUSH_INTERVAL):
+        """
+        Append-only log of (state, action, next_state, reward) transitions for offline training.
+
+        Transitions are buffered in memory and appended in bulk, one write() per flush, to
+        transitions-<host>-<pid>.tsv in `directory`, so every worker process has its own file
+        and writers never interleave. `python rl_train.py` replays all the files.
+        """
+        self.directory = directory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.write_errors = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._wake = threading.Event()
+        atexit.register(self.flush)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"transitions-{socket.gethostname()}-{os.getpid()}.tsv")
+
+    def _ensure_flusher(self):
+        # Threads don't survive fork(), so each worker process starts its own flusher
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._buffer = []
+            threading.Thread(target=self._flush_periodically, name='rl-transition-log', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def append(self, state, action, next_state, reward, timestamp=None):
+        line = format_transition(timestamp or time.time(), state, action, next_state, reward)
+        with self._lock:
+            self._ensure_flusher()
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Append everything buffered so far; returns the number of transitions written."""
+        with self._flush_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return 0
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(lines))
+            except OSError as e:
+                self.write_errors += 1
+                logger.error(f"Could not write {len(lines)} RL transitions to {self.path}: {str(e)}")
+                return 0
+            self.written += len(lines)
+            return len(lines)
+
+    def stats(self):
+        return {'written': self.written, 'buffered': len(self._buffer), 'write_errors': self.write_errors}
+
+
+class _Pending:
+    __slots__ = ('state', 'action', 'started', 'observed')
+
+    def __init__(self, state, action, started):
+        self.state = state
+        self.action = action
+        self.started = started
+        self.observed = []
+
+
+class TransitionTracker:
+    def __init__(self, log, window=RL_NEXT_STATE_WINDOW, max_age=RL_TRANSITION_MAX_AGE,
+                 max_pending=RL_MAX_PENDING, reward=emotion_reward, on_transition=None):
+        """
+        Turns /rl_action decisions and the emotions detected afterwards into transitions.
+
+        record_action() remembers the (state, action) /rl_action chose for a session. The
+        emotion labels that session produces next (/facedetection or the WebSocket stream)
+        are passed to observe(); after `window` of them, their most common label is the next
+        state and the transition goes to the log. If /rl_action acts again first, the
+        labels seen so far decide the next state; with none, the old action is dropped.
+
+        Parameters:
+            log (TransitionLog): Where finished transitions go, or None to not log them.
+            window (int): Labels that make up the next state.
+            max_age (float): Seconds after which an unfinished action is dropped.
+            max_pending (int): Sessions tracked at once; the oldest are dropped first.
+            reward (callable): next_state -> reward.
+            on_transition (callable): Also called with (state, action, reward, next_state) for
+                every finished transition, e.g. SharedRLAgent.update for online learning.
+        """
+        self.log = log
+        self.window = window
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.reward = reward
+        self.on_transition = on_transition
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.expired = 0
+
+    def _finish(self, pending):
+        next_state = Counter(pending.observed).most_common(1)[0][0]
+        reward = self.reward(next_state)
+        if self.log is not None:
+            self.log.append(pending.state, pending.action, next_state, reward)
+        if self.on_transition is not None:
+            self.on_transition(pending.state, pending.action, reward, next_state)
+        self.recorded += 1
+
+    def record_action(self, session_id, state, action):
+        now = time.monotonic()
+        with self._lock:
+            previous = self._pending.pop(session_id, None)
+            if previous is not None and previous.observed and now - previous.started <= self.max_age:
+                self._finish(previous)
+            self._pending[session_id] = _Pending(state, action, now)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.expired += 1
+
+    def observe(self, session_id, label):
+        """An emotion detected for `session_id`; completes its pending transition once the window is full."""
+        if session_id not in self._pending:
+            return
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is None:
+                return
+            if time.monotonic() - pending.started > self.max_age:
+                del self._pending[session_id]
+                self.expired += 1
+                return
+            pending.observed.append(label)
+            if len(pending.observed) >= self.window:
+                del self._pending[session_id]
+                self._finish(pending)
+
+    def stats(self):
+        return {'recorded': self.recorded, 'pending': len(self._pending), 'expired': self.expired,
+                **(self.log.stats() if self.log is not None else {})}
+
+
+def read_transitions(paths, chunk_size=1_000_000):
+    """
+    Parse transition logs in chunks.
+
+    Parameters:
+        paths (list): .tsv files, or directories whose transitions-*.tsv files are read.
+        chunk_size (int): Transitions per yielded chunk.
+
+    Yields:
+        (list, list, list, list): states, actions, next_states, rewards of up to chunk_size transitions.
+    """
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, 'transitions-*.tsv'))) if os.path.isdir(path) else [path])
+    states, actions, next_states, rewards = [], [], [], []
+    skipped = 0
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != len(FIELDS):
+                    # A worker killed mid-write can leave a torn last line
+                    skipped += 1
+                    continue
+                try:
+                    rewards.append(float(parts[4]))
+                except ValueError:
+                    skipped += 1
+                    continue
+                states.append(parts[1])
+                actions.append(parts[2])
+                next_states.append(parts[3])
+                if len(states) >= chunk_size:
+                    yield states, actions, next_states, rewards
+                    states, actions, next_states, rewards = [], [], [], []
+    if states:
+        yield states, actions, next_states, rewards
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed transition lines")
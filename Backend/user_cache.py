@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a cached user document is trusted; bounds staleness across worker processes
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 2048))
+# Build current_user from the token's uid/username claims on read-only routes, no database lookup
+AUTH_TRUST_CLAIMS = os.getenv('AUTH_TRUST_CLAIMS', 'False').lower() in ['true', '1', 't']
+
+
+class TTLCache:
+    def __init__(self, max_entries, ttl):
+        """
+        Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored.
+
+        Parameters:
+            max_entries (int): Entries kept before the least recently used is evicted.
+            ttl (float): Seconds an entry may be served.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, expires_at=None):
+        """Store `value`; `expires_at` (time.monotonic() based) can shorten the default TTL."""
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._entries[key] = (value, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class UserCache:
+    def __init__(self, load_user, decode_token, max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        """
+        What token_required needs per request: the verified claims of a JWT (cached by
+        token, until the token expires) and the user document (cached by email).
+
+        Call invalidate(email) whenever a user document changes; other workers see the
+        change once their copy's TTL runs out.
+
+        Parameters:
+            load_user (callable): email -> user document or None (the Mongo lookup).
+            decode_token (callable): token -> claims; raises jwt errors like jwt.decode.
+            max_entries (int): Users (and, separately, tokens) kept.
+            ttl (float): Seconds a cached user document is served.
+        """
+        self.load_user = load_user
+        self.decode_token = decode_token
+        self.users = TTLCache(max_entries, ttl)
+        self.tokens = TTLCache(max_entries, ttl)
+
+    def claims(self, token):
+        """Verified claims of `token`; raises like jwt.decode when it is invalid or expired."""
+        claims = self.tokens.get(token)
+        if claims is None:
+            claims = self.decode_token(token)
+            expires_at = None
+            if 'exp' in claims:
+                expires_at = time.monotonic() + (claims['exp'] - time.time())
+            self.tokens.put(token, claims, expires_at)
+        return claims
+
+    def user(self, email):
+        """The user document for `email`, or None. Unknown emails are not cached."""
+        user = self.users.get(email)
+        if user is None:
+            user = self.load_user(email)
+            if user is not None:
+                self.users.put(email, user)
+        # Routes get their own copy, so nothing they do leaks into the cache
+        return dict(user) if user is not None else None
+
+    def invalidate(self, email):
+        self.users.pop(email)
+
+    def stats(self):
+        return {'users': self.users.stats(), 'tokens': self.tokens.stats()}
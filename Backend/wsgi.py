@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production serving:
+
+    cd Backend && gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master, so the model weights loaded by
+create_app() are shared by all forked workers. A server that doesn't fork should
+import `create_app` and call create_app(prefork=False) instead.
+"""
+from app import create_app
+
+app = create_app()
@@ -89,10 +89,12 @@ const AdaptiveLessonFlow = ({
         timestamp: new Date().toISOString()
       };
 
+      const token = localStorage.getItem('token');
       fetch('http://localhost:5000/rl_action', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(token ? { 'Authorization': `Bearer ${token}` } : {}),
         },
         body: JSON.stringify(postData),
       })
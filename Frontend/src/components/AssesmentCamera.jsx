@@ -7,6 +7,8 @@ const AssessmentCamera = ({ onEmotionCapture }) => {
   const [emotion, setEmotion] = useState(null);
   const [minimized, setMinimized] = useState(false);
   const [isCapturing, setIsCapturing] = useState(true);
+  // Frames go over one persistent WebSocket when it is open, else as HTTP posts
+  const socketRef = useRef(null);
 
   useEffect(() => {
     const startVideo = async () => {
@@ -27,6 +29,7 @@ const AssessmentCamera = ({ onEmotionCapture }) => {
 
     if (isCapturing) {
       startVideo();
+      openSocket();
     }
 
     const intervalId = setInterval(() => {
@@ -37,12 +40,44 @@ const AssessmentCamera = ({ onEmotionCapture }) => {
 
     return () => {
       clearInterval(intervalId);
+      if (socketRef.current) {
+        socketRef.current.close();
+        socketRef.current = null;
+      }
       if (videoRef.current?.srcObject) {
         videoRef.current.srcObject.getTracks().forEach(track => track.stop());
       }
     };
   }, [isCapturing, minimized]);
 
+  const reportEmotion = (detectedEmotion) => {
+    setEmotion(detectedEmotion);
+    if (onEmotionCapture) {
+      onEmotionCapture(detectedEmotion);
+    }
+  };
+
+  const openSocket = () => {
+    const token = localStorage.getItem('token');
+    const query = token ? `?token=${encodeURIComponent(token)}` : '';
+    const socket = new WebSocket(`ws://localhost:5000/ws/facedetection${query}`);
+    socket.binaryType = 'arraybuffer';
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'result') {
+        reportEmotion(message.emotion);
+      } else if (message.type === 'error') {
+        console.error('Error processing emotion detection:', message.message);
+      }
+    };
+    socket.onclose = () => {
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+      }
+    };
+    socketRef.current = socket;
+  };
+
   const captureImage = () => {
     if (!videoRef.current || !videoRef.current.videoWidth) return null;
     
@@ -59,20 +94,30 @@ const AssessmentCamera = ({ onEmotionCapture }) => {
     if (!imageData) return;
 
     const blob = await fetch(imageData).then(res => res.blob());
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      // The server only runs the newest frame, so sending never builds a backlog
+      socket.send(blob);
+      return;
+    }
+
     const formData = new FormData();
     formData.append('image', blob, 'capture.jpg');
     
+    // Logged-in frames go into this user's emotion history on the server
+    const token = localStorage.getItem('token');
+    const headers = { 'Content-Type': 'multipart/form-data' };
+    if (token) {
+      headers['Authorization'] = `Bearer ${token}`;
+    }
+
     try {
       const response = await axios.post('http://localhost:5000/facedetection',
         formData,
-        { headers: { 'Content-Type': 'multipart/form-data' } }
+        { headers }
       );
       
-      const detectedEmotion = response.data.emotion;
-      setEmotion(detectedEmotion);
-      if (onEmotionCapture) {
-        onEmotionCapture(detectedEmotion);
-      }
+      reportEmotion(response.data.emotion);
     } catch (error) {
       console.error('Error processing emotion detection:', error);
     }
@@ -108,17 +108,40 @@ const DiagnosticAssessmentPanel = () => {
         }
     };
 
+    const uploadHandwriting = async () => {
+        const token = localStorage.getItem('token');
+        if (!handwritingImg || !token) {
+            return { imageData: handwritingImg };
+        }
+        try {
+            const blob = await (await fetch(handwritingImg)).blob();
+            const formData = new FormData();
+            formData.append('image', blob, 'handwriting.png');
+            const response = await axios.post('http://localhost:5000/handwriting', formData, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            return { imageHash: response.data.imageHash };
+        } catch (error) {
+            console.error('Handwriting upload failed, sending it inline instead:', error);
+            return { imageData: handwritingImg };
+        }
+    };
+
     // Send data to Flask, including emotion data
     const sendDataToFlask = async () => {
         try {
             setIsLoading(true);
             
+            // Upload the handwriting canvas as a binary file first; the assessment then
+            // references it by hash. Falls back to the inline base64 image if that fails.
+            const handwritingImage = await uploadHandwriting();
+
             // Prepare data to send to Flask, now including emotion data
             const assessmentData = {
                 numberComparison: assessmentResults.numberComparison,
                 handwriting: {
                     ...assessmentResults.handwriting,
-                    imageData: handwritingImg
+                    ...handwritingImage
                 },
                 letterArrangement: assessmentResults.letterArrangement,
                 emotionTrackingData: emotionData,
@@ -144,7 +167,8 @@ const DiagnosticAssessmentPanel = () => {
                   }
                 );
             
-                if (response.status === 201) {
+                // 202: saved, LD analysis still running in the background
+                if (response.status === 201 || response.status === 202) {
                   setDataSent(true);
                   navigate('/profile');
                 }
@@ -9,12 +9,54 @@ import {
   RadarChart, PolarGrid, PolarAngleAxis, PolarRadiusAxis, Radar
 } from 'recharts';
 
+// Only the fields this page renders; the raw emotion arrays can be large
+const ASSESSMENT_FIELDS = 'userEmail,completedAt,numberComparison,handwriting,letterArrangement,gemini_response,ld_job';
+
+// The LD analysis runs after the save: poll its job until it is done or failed
+const LD_JOB_POLL_MS = 3000;
+const PENDING_LD_JOB = ['queued', 'running'];
+
+const fetchAssessments = (token, cursor) => axios.get('http://localhost:5000/assessments', {
+  headers: {
+    Authorization: `Bearer ${token}`
+  },
+  params: cursor ? { fields: ASSESSMENT_FIELDS, cursor } : { fields: ASSESSMENT_FIELDS }
+});
+
+// /uploads needs the bearer token, which an <img src> can't send: fetch the image and show a blob URL
+const AuthImage = ({ path, alt, ...props }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+    axios.get(`http://localhost:5000/uploads/${path}`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+      responseType: 'blob'
+    }).then(response => {
+      if (!cancelled) {
+        objectUrl = URL.createObjectURL(response.data);
+        setSrc(objectUrl);
+      }
+    }).catch(err => console.error('Error fetching handwriting image:', err));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [path]);
+
+  return src ? <img src={src} alt={alt} {...props} /> : null;
+};
+
 const ProfilePage = () => {
   const [profile, setProfile] = useState({});
   const [assessments, setAssessments] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [learningDisabilities, setLearningDisabilities] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [ldPollRound, setLdPollRound] = useState(0);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -37,16 +79,13 @@ const ProfilePage = () => {
 
         setProfile(profileResponse.data);
 
-        // Fetch user assessments
-        const assessmentsResponse = await axios.get('http://localhost:5000/assessments', {
-          headers: {
-            Authorization: `Bearer ${token}`
-          }
-        });
+        // Fetch the first page of user assessments
+        const assessmentsResponse = await fetchAssessments(token);
 
         // Set assessments and extract learning disabilities data if available
         const assessmentData = assessmentsResponse.data;
         setAssessments(assessmentData);
+        setNextCursor(assessmentsResponse.headers['x-next-cursor'] || null);
         
         // Check if there's Gemini response with learning disabilities analysis
         if (assessmentData.length > 0 && assessmentData[0].gemini_response && 
@@ -65,6 +104,67 @@ const ProfilePage = () => {
     fetchProfileData();
   }, [navigate]);
 
+  // Fill in the LD analysis of assessments saved moments ago once their job finishes
+  useEffect(() => {
+    const pending = assessments.filter(a => a.ld_job && PENDING_LD_JOB.includes(a.ld_job.status));
+    const token = localStorage.getItem('token');
+    if (pending.length === 0 || !token) return undefined;
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const finished = {};
+      await Promise.all(pending.map(async (assessment) => {
+        try {
+          const response = await axios.get(`http://localhost:5000/ld-jobs/${assessment.ld_job.id}`, {
+            headers: {
+              Authorization: `Bearer ${token}`
+            }
+          });
+          if (!PENDING_LD_JOB.includes(response.data.status)) {
+            finished[response.data.assessmentId] = response.data;
+          }
+        } catch (err) {
+          console.error('Error polling LD analysis job:', err);
+        }
+      }));
+      if (cancelled) return;
+      if (Object.keys(finished).length === 0) {
+        setLdPollRound(round => round + 1);
+        return;
+      }
+      setAssessments(previous => previous.map(a => finished[a._id] ? {
+        ...a,
+        ld_job: { ...a.ld_job, status: finished[a._id].status },
+        gemini_response: finished[a._id].ld_analysis
+      } : a));
+      const latest = assessments[0] && finished[assessments[0]._id];
+      if (latest && latest.ld_analysis && latest.ld_analysis.learningDisabilities) {
+        setLearningDisabilities(latest.ld_analysis.learningDisabilities);
+      }
+    }, LD_JOB_POLL_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [assessments, ldPollRound]);
+
+  // Older assessments are fetched page by page via the X-Next-Cursor header
+  const loadMoreAssessments = async () => {
+    const token = localStorage.getItem('token');
+    if (!token || !nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await fetchAssessments(token, nextCursor);
+      setAssessments((previous) => [...previous, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (err) {
+      console.error('Error fetching more assessments:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // Format date for display
   const formatDate = (dateString) => {
     const date = new Date(dateString);
@@ -418,8 +518,8 @@ const ProfilePage = () => {
               <div className="md:w-1/3 mb-4 md:mb-0 md:mr-4">
                 {assessment.handwriting.imageData && (
                   <div className="border rounded p-2">
-                    <img 
-                      src={`http://localhost:5000/uploads/${assessment.handwriting.imageData}`} 
+                    <AuthImage 
+                      path={assessment.handwriting.imageData} 
                       alt="Handwriting sample" 
                       className="w-full h-auto" 
                     />
@@ -663,8 +763,8 @@ const ProfilePage = () => {
                       {assessment.handwriting.imageData && (
                         <div className="mb-4">
                           <p className="text-xs text-gray-500 mb-2">Writing Sample</p>
-                          <img 
-                            src={`http://localhost:5000/uploads/${assessment.handwriting.imageData}`} 
+                          <AuthImage 
+                            path={assessment.handwriting.imageData} 
                             alt="Handwriting sample" 
                             className="max-w-full h-auto border rounded" 
                           />
@@ -729,6 +829,17 @@ const ProfilePage = () => {
                 )}
               </div>
             ))}
+            {nextCursor && (
+              <div className="text-center mb-6">
+                <button
+                  onClick={loadMoreAssessments}
+                  disabled={loadingMore}
+                  className="px-4 py-2 bg-blue-600 text-white rounded hover:bg-blue-700 transition duration-200 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load older assessments'}
+                </button>
+              </div>
+            )}
           </div>
         ) : (
           <div className="bg-white rounded-lg shadow-md p-6 text-center">